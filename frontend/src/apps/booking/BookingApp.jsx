@@ -2,7 +2,6 @@ import { useEffect, useState } from 'react';
 import { Calendar, MapPin, Clock, Trash2 } from 'lucide-react';
 import { useBookingData } from '../../hooks/useBookingData';
 import { bookingService } from '../../services/bookingService';
-import { roomLayoutService } from '../../services/roomLayoutService';
 import { useAuth } from '../../context/AuthContext';
 import RoomLayoutViewer from './components/RoomLayoutViewer';
 
@@ -155,6 +154,7 @@ export default function BookingApp() {
   const {
     rooms,
     desks,
+    roomLayout,
     bookings,
     selectedRoom,
     setSelectedRoom,
@@ -170,7 +170,6 @@ export default function BookingApp() {
   const [actionLoading, setActionLoading] = useState(false);
   const [actionError, setActionError] = useState(null);
   const [successMessage, setSuccessMessage] = useState(null);
-  const [roomLayout, setRoomLayout] = useState(null);
   const [mapState, setMapState] = useState('noRoomSelected');
   const [mapMessage, setMapMessage] = useState('Select a room to view layout');
   const [mapDate, setMapDate] = useState('');
@@ -225,54 +224,36 @@ export default function BookingApp() {
     }
   }, [selectedDesk]);
 
+  // The layout arrives with the room's desks, see useBookingData
   useEffect(() => {
-    let cancelled = false;
-
-    const loadRoomLayout = async () => {
-      if (!selectedRoom) {
-        setRoomLayout(null);
-        setDeskStatusById({});
-        setMapState('noRoomSelected');
-        setMapMessage('Select a room to view layout');
-        return;
-      }
+    if (!selectedRoom) {
+      setDeskStatusById({});
+      setMapState('noRoomSelected');
+      setMapMessage('Select a room to view layout');
+      return;
+    }
 
+    if (roomLayout === undefined) {
       setMapState('layoutLoading');
       setMapMessage('Loading room layout...');
       setDeskStatusById({});
+      return;
+    }
 
-      try {
-        const layout = await roomLayoutService.getRoomLayout(selectedRoom);
-        if (cancelled) return;
-
-        setRoomLayout(layout);
-        const objects = layout?.layout_json?.objects || [];
-        const deskObjects = objects.filter((obj) => obj.type === 'desk');
-
-        if (deskObjects.length === 0) {
-          setMapState('layoutMissing');
-          setMapMessage('No room map available yet. Use desk dropdown for now.');
-          return;
-        }
-
-        if (!mapDate || !mapPeriod) {
-          setMapState('dateNotSelected');
-          setMapMessage('Pick a date and period to check live desk availability.');
-        }
-      } catch (err) {
-        if (cancelled) return;
-        setRoomLayout(null);
-        setMapState('layoutMissing');
-        setMapMessage('No room map available yet. Use desk dropdown for now.');
-      }
-    };
+    const objects = roomLayout?.layout_json?.objects || [];
+    const deskObjects = objects.filter((obj) => obj.type === 'desk');
 
-    loadRoomLayout();
+    if (deskObjects.length === 0) {
+      setMapState('layoutMissing');
+      setMapMessage('No room map available yet. Use desk dropdown for now.');
+      return;
+    }
 
-    return () => {
-      cancelled = true;
-    };
-  }, [selectedRoom]);
+    if (!mapDate || !mapPeriod) {
+      setMapState('dateNotSelected');
+      setMapMessage('Pick a date and period to check live desk availability.');
+    }
+  }, [selectedRoom, roomLayout]);
 
   useEffect(() => {
     let cancelled = false;
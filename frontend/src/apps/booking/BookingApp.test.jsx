@@ -8,6 +8,14 @@ import { vi } from 'vitest';
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
 
+// GET /rooms/{id}/bootstrap/ response for a room without a saved layout
+const roomBootstrap = (desks) => ({
+  room: { id: 1, name: 'Room A', number_of_desks: desks.length },
+  desks,
+  layout: null,
+  availability: null,
+});
+
 const renderBookingApp = () =>
   render(
     <AuthProvider>
@@ -24,16 +32,14 @@ describe('BookingApp', () => {
           { id: 2, name: 'Room B', number_of_desks: 1 },
         ])
       ),
-      http.get(`${API_BASE_URL}/desks/`, ({ request }) => {
-        const url = new URL(request.url);
-        const roomId = url.searchParams.get('room');
-        if (roomId === '1') {
-          return HttpResponse.json([
+      http.get(`${API_BASE_URL}/rooms/:roomId/bootstrap/`, ({ params }) => {
+        if (params.roomId === '1') {
+          return HttpResponse.json(roomBootstrap([
             { id: 10, desk_number: 1, location_description: 'Window' },
             { id: 11, desk_number: 2, location_description: 'Desk 2' },
-          ]);
+          ]));
         }
-        return HttpResponse.json([]);
+        return HttpResponse.json(roomBootstrap([]));
       }),
       http.get(`${API_BASE_URL}/bookings/`, () =>
         HttpResponse.json({ results: [] })
@@ -58,8 +64,8 @@ describe('BookingApp', () => {
       http.get(`${API_BASE_URL}/rooms/`, () =>
         HttpResponse.json([{ id: 1, name: 'Room A', number_of_desks: 1 }])
       ),
-      http.get(`${API_BASE_URL}/desks/`, () =>
-        HttpResponse.json([{ id: 10, desk_number: 1 }])
+      http.get(`${API_BASE_URL}/rooms/:roomId/bootstrap/`, () =>
+        HttpResponse.json(roomBootstrap([{ id: 10, desk_number: 1 }]))
       ),
       http.get(`${API_BASE_URL}/bookings/`, () =>
         HttpResponse.json({ results: [] })
@@ -92,8 +98,8 @@ describe('BookingApp', () => {
       http.get(`${API_BASE_URL}/rooms/`, () =>
         HttpResponse.json([{ id: 1, name: 'Room A', number_of_desks: 1 }])
       ),
-      http.get(`${API_BASE_URL}/desks/`, () =>
-        HttpResponse.json([{ id: 10, desk_number: 1 }])
+      http.get(`${API_BASE_URL}/rooms/:roomId/bootstrap/`, () =>
+        HttpResponse.json(roomBootstrap([{ id: 10, desk_number: 1 }]))
       ),
       http.get(`${API_BASE_URL}/bookings/`, () =>
         HttpResponse.json({ results: [] })
@@ -132,8 +138,8 @@ describe('BookingApp', () => {
       http.get(`${API_BASE_URL}/rooms/`, () =>
         HttpResponse.json([{ id: 1, name: 'Room A', number_of_desks: 1 }])
       ),
-      http.get(`${API_BASE_URL}/desks/`, () =>
-        HttpResponse.json([{ id: 10, desk_number: 1 }])
+      http.get(`${API_BASE_URL}/rooms/:roomId/bootstrap/`, () =>
+        HttpResponse.json(roomBootstrap([{ id: 10, desk_number: 1 }]))
       ),
       http.get(`${API_BASE_URL}/bookings/`, () =>
         HttpResponse.json({ results: [] })
@@ -189,8 +195,8 @@ describe('BookingApp', () => {
       http.get(`${API_BASE_URL}/rooms/`, () =>
         HttpResponse.json([{ id: 1, name: 'Room A', number_of_desks: 1 }])
       ),
-      http.get(`${API_BASE_URL}/desks/`, () =>
-        HttpResponse.json([{ id: 10, desk_number: 1 }])
+      http.get(`${API_BASE_URL}/rooms/:roomId/bootstrap/`, () =>
+        HttpResponse.json(roomBootstrap([{ id: 10, desk_number: 1 }]))
       ),
       http.get(`${API_BASE_URL}/bookings/`, () =>
         HttpResponse.json({ results: [] })
@@ -237,8 +243,8 @@ describe('BookingApp', () => {
       http.get(`${API_BASE_URL}/rooms/`, () =>
         HttpResponse.json([{ id: 1, name: 'Room A', number_of_desks: 1 }])
       ),
-      http.get(`${API_BASE_URL}/desks/`, () =>
-        HttpResponse.json([{ id: 10, desk_number: 1 }])
+      http.get(`${API_BASE_URL}/rooms/:roomId/bootstrap/`, () =>
+        HttpResponse.json(roomBootstrap([{ id: 10, desk_number: 1 }]))
       ),
       http.get(`${API_BASE_URL}/bookings/`, () =>
         HttpResponse.json({ results: [] })
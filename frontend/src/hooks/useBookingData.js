@@ -1,11 +1,12 @@
 import { useState, useEffect } from 'react';
 import { roomService } from '../services/roomService';
-import { deskService } from '../services/deskService';
 import { bookingService } from '../services/bookingService';
 
 export function useBookingData() {
   const [rooms, setRooms] = useState([]);
   const [desks, setDesks] = useState([]);
+  // undefined until the selected room's layout has loaded, null if it has none
+  const [roomLayout, setRoomLayout] = useState(undefined);
   const [bookings, setBookings] = useState([]);
   const [selectedRoom, setSelectedRoom] = useState('');
   const [selectedDesk, setSelectedDesk] = useState('');
@@ -21,16 +22,22 @@ export function useBookingData() {
     loadRooms();
   }, []);
 
-  // Load desks when room changes
+  // Load the room's desks, layout and bookings when room changes
   useEffect(() => {
+    let cancelled = false;
+    setRoomLayout(undefined);
     if (selectedRoom) {
-      loadDesks(selectedRoom);
+      loadRoom(selectedRoom, () => cancelled);
       loadBookings(selectedRoom);
     } else {
       setDesks([]);
       setBookings([]);
     }
     setSelectedDesk(''); // Reset desk selection
+
+    return () => {
+      cancelled = true;
+    };
   }, [selectedRoom]);
 
   const loadRooms = async () => {
@@ -46,12 +53,17 @@ export function useBookingData() {
     }
   };
 
-  const loadDesks = async (roomId) => {
+  // Desks and layout come from one request: GET /api/rooms/{id}/bootstrap/
+  const loadRoom = async (roomId, isCancelled = () => false) => {
     setLoading(prev => ({ ...prev, desks: true }));
     try {
-      const data = await deskService.getDesksByRoom(roomId);
-      setDesks(data);
+      const data = await roomService.getRoomBootstrap(roomId);
+      if (isCancelled()) return;
+      setDesks(data.desks);
+      setRoomLayout(data.layout);
     } catch (err) {
+      if (isCancelled()) return;
+      setRoomLayout(null);
       setError('Failed to load desks');
       console.error(err);
     } finally {
@@ -88,6 +100,7 @@ export function useBookingData() {
   return {
     rooms,
     desks,
+    roomLayout,
     bookings,
     selectedRoom,
     setSelectedRoom,
@@ -98,7 +111,7 @@ export function useBookingData() {
     refresh: () => {
       loadRooms();
       if (selectedRoom) {
-        loadDesks(selectedRoom);
+        loadRoom(selectedRoom);
         loadBookings(selectedRoom);
       }
     },
@@ -7,6 +7,10 @@ export const roomService = {
   // GET /api/rooms/{id}/
   getRoom: (id) => api.get(`/rooms/${id}/`),
   
+  // GET /api/rooms/{id}/bootstrap/?date=&period=
+  // Room, active desks, saved layout (null if none) and optional availability
+  getRoomBootstrap: (id, params) => api.get(`/rooms/${id}/bootstrap/`, params),
+  
   // POST /api/rooms/ (with image)
   createRoom: (formData) => {
     // formData should be FormData object for file upload
@@ -0,0 +1,670 @@
+"""
+Booking rollups for analytics.
+
+BookingDailyStat counts bookings per (date, room, period, department) and
+BookingUserMonthlyStat counts them per (month, user, department), with the
+department stored on each booking. Both are kept up to date
+incrementally by the Booking signal receivers and the bulk paths in
+services, and can be rebuilt or checked for drift with
+`python manage.py booking_stats`.
+
+On PostgreSQL the same aggregates also exist as materialized views
+(BookingDailyView, BookingUserMonthlyView), refreshed on a schedule by
+`python manage.py analytics_views refresh --every N`. Reads switch to them
+with settings.ANALYTICS_SOURCE = 'views' and fall back to the rollup tables
+while the views are missing or not yet populated.
+"""
+import operator
+from collections import Counter, namedtuple
+from datetime import date, timedelta
+from functools import reduce
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import ExtractWeekDay, TruncDay, TruncMonth, TruncWeek
+
+from .models import (
+    Booking, BookingDailyStat, BookingDailyView, BookingUserMonthlyStat, BookingUserMonthlyView, Desk, Room,
+)
+
+User = get_user_model()
+
+StatRow = namedtuple('StatRow', ['date', 'room_id', 'period', 'department', 'user_id'])
+
+STAT_ROW_FIELDS = ('date', 'desk__room_id', 'period', 'department', 'user_id')
+
+ANALYTICS_VIEWS = (BookingDailyView, BookingUserMonthlyView)
+ANALYTICS_VIEWS_CHECK_TIMEOUT = 60
+
+TIME_SERIES_GRANULARITIES = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+# Longest range each granularity may cover, bounding the number of points
+TIME_SERIES_MAX_SPAN_DAYS = {'day': 366, 'week': 366 * 3, 'month': 366 * 10}
+TIME_SERIES_LABELS = {'day': '%b %d', 'week': '%b %d', 'month': '%b %Y'}
+# Windows analytics_overview() can compare a range with, see comparison_window()
+COMPARISONS = ('previous', 'year_ago')
+
+WEEKDAYS = {
+    1: 'Sunday', 2: 'Monday', 3: 'Tuesday', 4: 'Wednesday',
+    5: 'Thursday', 6: 'Friday', 7: 'Saturday'
+}
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def booking_stat_row(booking):
+    """
+    Rollup key of a saved booking, using its cached desk when loaded. The
+    department is the one stored on the booking, so later department
+    changes of its user don't move it to another rollup row.
+    """
+    if Booking.desk.is_cached(booking):
+        room_id = booking.desk.room_id
+    else:
+        room_id = Desk.objects.filter(pk=booking.desk_id).values_list('room_id', flat=True).first()
+    return StatRow(booking.date, room_id, booking.period, booking.department, booking.user_id)
+
+
+def stored_stat_row(booking_id):
+    """Rollup key of a booking as currently stored, or None"""
+    row = Booking.objects.filter(pk=booking_id).values_list(*STAT_ROW_FIELDS).first()
+    return StatRow(*row) if row else None
+
+
+def _upsert(model, key_fields, deltas):
+    """
+    Add `deltas` ({key tuple: n}) to the `bookings` column with one
+    INSERT ... ON CONFLICT DO UPDATE (PostgreSQL and SQLite). Keys are
+    written in sorted order so concurrent writers lock rows in the same order.
+    """
+    deltas = sorted((key, delta) for key, delta in deltas.items() if delta)
+    if not deltas:
+        return
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = [connection.ops.quote_name(model._meta.get_field(name).column) for name in key_fields]
+    bookings = connection.ops.quote_name('bookings')
+    placeholders = ', '.join(['(' + ', '.join(['%s'] * (len(columns) + 1)) + ')'] * len(deltas))
+    params = [value for key, delta in deltas for value in (*key, delta)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}, {bookings}) VALUES {placeholders} "
+            f"ON CONFLICT ({', '.join(columns)}) "
+            f"DO UPDATE SET {bookings} = {table}.{bookings} + EXCLUDED.{bookings}",
+            params,
+        )
+
+
+def record_booking_stats(added=(), removed=(), users=True):
+    """
+    Apply added/removed StatRows to the rollups in at most two statements.
+    users=False skips the per-user rollup (used when the user itself is
+    being deleted and its rows are going away anyway).
+    """
+    daily = Counter()
+    monthly = Counter()
+    for rows, sign in ((added, 1), (removed, -1)):
+        for row in rows:
+            if row.room_id is None:
+                continue
+            daily[(row.date, row.room_id, row.period, row.department)] += sign
+            monthly[(month_start(row.date), row.user_id, row.department)] += sign
+
+    _upsert(BookingDailyStat, ['date', 'room', 'period', 'department'], daily)
+    if users:
+        _upsert(BookingUserMonthlyStat, ['month', 'user', 'department'], monthly)
+
+
+def _fresh_daily(start=None, end=None):
+    bookings = Booking.objects.all()
+    if start:
+        bookings = bookings.filter(date__gte=start)
+    if end:
+        bookings = bookings.filter(date__lte=end)
+    return {
+        (row['date'], row['desk__room_id'], row['period'], row['department']): row['bookings']
+        for row in bookings.values('date', 'desk__room_id', 'period', 'department')
+        .annotate(bookings=Count('id')).order_by()
+    }
+
+
+def _fresh_monthly(start=None, end=None):
+    bookings = Booking.objects.all()
+    if start:
+        bookings = bookings.filter(date__gte=month_start(start))
+    if end:
+        bookings = bookings.filter(date__lt=(month_start(end) + timedelta(days=32)).replace(day=1))
+    return {
+        (row['month'], row['user_id'], row['department']): row['bookings']
+        for row in bookings.annotate(month=TruncMonth('date')).values('month', 'user_id', 'department')
+        .annotate(bookings=Count('id')).order_by()
+    }
+
+
+def _stored(model, key_fields, filters):
+    return {
+        tuple(row[:-1]): row[-1]
+        for row in model.objects.filter(**filters).values_list(*key_fields, 'bookings')
+        if row[-1]
+    }
+
+
+def _scopes(start=None, end=None):
+    daily_filters, monthly_filters = {}, {}
+    if start:
+        daily_filters['date__gte'] = start
+        monthly_filters['month__gte'] = month_start(start)
+    if end:
+        daily_filters['date__lte'] = end
+        monthly_filters['month__lte'] = month_start(end)
+    return daily_filters, monthly_filters
+
+
+def rebuild_booking_stats(start=None, end=None):
+    """
+    Recompute the rollups from Booking for a date range (everything by
+    default). The per-user rollup is rebuilt for whole months.
+    Returns (daily rows, monthly rows) written.
+    """
+    daily_filters, monthly_filters = _scopes(start, end)
+    daily = _fresh_daily(start, end)
+    monthly = _fresh_monthly(start, end)
+
+    with transaction.atomic():
+        BookingDailyStat.objects.filter(**daily_filters).delete()
+        BookingUserMonthlyStat.objects.filter(**monthly_filters).delete()
+        BookingDailyStat.objects.bulk_create([
+            BookingDailyStat(date=day, room_id=room_id, period=period, department=department, bookings=count)
+            for (day, room_id, period, department), count in daily.items()
+        ], batch_size=1000)
+        BookingUserMonthlyStat.objects.bulk_create([
+            BookingUserMonthlyStat(month=month, user_id=user_id, department=department, bookings=count)
+            for (month, user_id, department), count in monthly.items()
+        ], batch_size=1000)
+    return len(daily), len(monthly)
+
+
+def booking_stats_drift(start=None, end=None):
+    """
+    Compare the rollups with a fresh aggregate of Booking.
+    Returns {'daily': [(key, stored, actual)], 'monthly': [...]} of mismatches.
+    """
+    daily_filters, monthly_filters = _scopes(start, end)
+    drift = {}
+    for name, model, key_fields, fresh, filters in (
+        ('daily', BookingDailyStat, ['date', 'room_id', 'period', 'department'], _fresh_daily(start, end), daily_filters),
+        ('monthly', BookingUserMonthlyStat, ['month', 'user_id', 'department'], _fresh_monthly(start, end), monthly_filters),
+    ):
+        stored = _stored(model, key_fields, filters)
+        drift[name] = sorted(
+            (key, stored.get(key, 0), fresh.get(key, 0))
+            for key in stored.keys() | fresh.keys()
+            if stored.get(key, 0) != fresh.get(key, 0)
+        )
+    return drift
+
+
+def analytics_views_populated():
+    """Whether both materialized views exist and hold data (PostgreSQL only)"""
+    if connection.vendor != 'postgresql':
+        return False
+    names = [model._meta.db_table for model in ANALYTICS_VIEWS]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT COUNT(*) FROM pg_matviews WHERE matviewname = ANY(%s) AND ispopulated', [names],
+        )
+        return cursor.fetchone()[0] == len(names)
+
+
+def stat_models():
+    """
+    (daily, user-monthly) models analytics read from: the materialized
+    views when settings.ANALYTICS_SOURCE is 'views' and they are usable,
+    the rollup tables otherwise. The check is cached for a minute.
+    """
+    if getattr(settings, 'ANALYTICS_SOURCE', 'rollups') == 'views':
+        usable = cache.get('analytics_views_populated')
+        if usable is None:
+            usable = analytics_views_populated()
+            cache.set('analytics_views_populated', usable, ANALYTICS_VIEWS_CHECK_TIMEOUT)
+        if usable:
+            return ANALYTICS_VIEWS
+    return BookingDailyStat, BookingUserMonthlyStat
+
+
+def refresh_analytics_views(concurrently=True):
+    """
+    Recompute the materialized views (PostgreSQL only). CONCURRENTLY keeps
+    them readable during the refresh; a view that has never been populated
+    can only be refreshed plainly. Returns the refreshed view names.
+    """
+    if connection.vendor != 'postgresql':
+        return []
+    names = [model._meta.db_table for model in ANALYTICS_VIEWS]
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT matviewname, ispopulated FROM pg_matviews WHERE matviewname = ANY(%s)', [names])
+        populated = dict(cursor.fetchall())
+        for name in names:
+            if name not in populated:
+                continue
+            mode = 'CONCURRENTLY ' if concurrently and populated[name] else ''
+            cursor.execute(f'REFRESH MATERIALIZED VIEW {mode}{connection.ops.quote_name(name)}')
+    cache.delete('analytics_views_populated')
+    return [name for name in names if name in populated]
+
+
+def _full_months(start, end):
+    """First and last day of the whole calendar months inside [start, end], or None"""
+    first = start if start.day == 1 else (month_start(start) + timedelta(days=32)).replace(day=1)
+    after_end = end + timedelta(days=1)
+    last = end if after_end.day == 1 else month_start(end) - timedelta(days=1)
+    if first > last:
+        return None
+    return first, last
+
+
+def user_booking_counts(start, end, department=None):
+    """
+    Bookings per user id between start and end: whole months come from
+    the user-monthly rollup, the partial months at either end from Booking
+    """
+    return window_user_booking_counts([(start, end)], department)[0]
+
+
+def window_user_booking_counts(windows, department=None):
+    """
+    user_booking_counts() for several (start, end) windows at once, as a
+    list of Counters. Each query carries one conditional sum per window, so
+    the query count does not grow with the windows. Whole months come from
+    the rollup when the first window has any.
+    """
+    month_spans = [_full_months(start, end) for start, end in windows]
+    if month_spans[0] is None:
+        month_spans = [None] * len(windows)
+    monthly_windows = {}
+    edge_windows = {}
+    for index, ((start, end), months) in enumerate(zip(windows, month_spans)):
+        edge_windows[f'window_{index}'] = Q(date__gte=start, date__lte=end)
+        if months:
+            first, last = months
+            monthly_windows[f'window_{index}'] = Q(month__gte=first, month__lte=last)
+            edge_windows[f'window_{index}'] &= ~Q(date__gte=first, date__lte=last)
+
+    counts = [Counter() for _ in windows]
+
+    def add(rows):
+        for row in rows:
+            for index, window in enumerate(counts):
+                window[row['user_id']] += row.get(f'window_{index}') or 0
+
+    if monthly_windows:
+        monthly = stat_models()[1].objects.filter(reduce(operator.or_, monthly_windows.values()))
+        if department is not None:
+            monthly = monthly.filter(department=department)
+        add(monthly.values('user_id').annotate(**{
+            name: Sum('bookings', filter=condition) for name, condition in monthly_windows.items()
+        }).order_by())
+
+    edges = Booking.objects.filter(reduce(operator.or_, edge_windows.values()))
+    if department is not None:
+        edges = edges.filter(department=department)
+    add(edges.values('user_id').annotate(**{
+        name: Count('id', filter=condition) for name, condition in edge_windows.items()
+    }).order_by())
+
+    return [+window for window in counts]
+
+
+def daily_stats(start=None, end=None, department=None):
+    """Daily rollup rows in range, optionally for one department"""
+    stats = stat_models()[0].objects.filter(bookings__gt=0)
+    if start:
+        stats = stats.filter(date__gte=start)
+    if end:
+        stats = stats.filter(date__lte=end)
+    if department is not None:
+        stats = stats.filter(department=department)
+    return stats
+
+
+def bookings_by_weekday(stats):
+    by_day = {
+        'Monday': 0, 'Tuesday': 0, 'Wednesday': 0, 'Thursday': 0,
+        'Friday': 0, 'Saturday': 0, 'Sunday': 0
+    }
+    for row in stats.annotate(weekday=ExtractWeekDay('date')).values('weekday').annotate(
+        count=Sum('bookings')
+    ).order_by():
+        by_day[WEEKDAYS[row['weekday']]] = row['count']
+    return by_day
+
+
+def bookings_by_period(stats):
+    periods = dict(Booking.PERIOD_CHOICES)
+    return {
+        periods.get(row['period'], row['period']): row['count']
+        for row in stats.values('period').annotate(count=Sum('bookings')).order_by('period')
+    }
+
+
+def bookings_by_room(stats, limit=None):
+    rows = stats.values('room_id', 'room__name').annotate(count=Sum('bookings')).order_by('-count', 'room__name')
+    if limit:
+        rows = rows[:limit]
+    return list(rows)
+
+
+def bucket_start(day, granularity):
+    """Start of the day/week (Monday)/month bucket containing `day`"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return month_start(day)
+    return day
+
+
+def next_bucket(day, granularity):
+    if granularity == 'week':
+        return day + timedelta(weeks=1)
+    if granularity == 'month':
+        return (day + timedelta(days=32)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def auto_granularity(start, end):
+    """Finest granularity that can cover [start, end]"""
+    span = (end - start).days + 1
+    if span <= 92:
+        return 'day'
+    if span <= TIME_SERIES_MAX_SPAN_DAYS['week']:
+        return 'week'
+    return 'month'
+
+
+def check_time_series(start, end, granularity):
+    """Raise ValueError for an unknown granularity or a span over TIME_SERIES_MAX_SPAN_DAYS"""
+    if granularity not in TIME_SERIES_GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(TIME_SERIES_GRANULARITIES)}")
+    max_span = TIME_SERIES_MAX_SPAN_DAYS[granularity]
+    if (end - start).days + 1 > max_span:
+        raise ValueError(f'A {granularity} series can span at most {max_span} days')
+
+
+def fill_time_series(counts, start, end, granularity):
+    """[(bucket start date, count)] for every bucket in range, from {bucket: count}"""
+    series = []
+    bucket = bucket_start(start, granularity)
+    while bucket <= end:
+        series.append((bucket, counts.get(bucket, 0)))
+        bucket = next_bucket(bucket, granularity)
+    return series
+
+
+def booking_time_series(start, end, granularity='day', department=None):
+    """
+    Bookings per day, week or month between start and end (inclusive) with
+    one GROUP BY over the daily rollup. Buckets without bookings are filled
+    with zeros. Partial buckets at either end only count days in range.
+
+    Returns [(bucket start date, count)]. Raises ValueError for an unknown
+    granularity or a range longer than TIME_SERIES_MAX_SPAN_DAYS allows.
+    """
+    check_time_series(start, end, granularity)
+    trunc = TIME_SERIES_GRANULARITIES[granularity]
+    counts = {
+        row['bucket']: row['count']
+        for row in daily_stats(start, end, department)
+        .annotate(bucket=trunc('date'))
+        .values('bucket')
+        .annotate(count=Sum('bookings'))
+        .order_by()
+    }
+    return fill_time_series(counts, start, end, granularity)
+
+
+# Facets of daily_facets(), in GROUPING() argument order
+FACETS = ('weekday', 'room_id', 'period', 'department', 'bucket')
+
+
+def daily_facets(stats, granularity='day', windows=None):
+    """
+    Every facet of the analytics overview from one statement over `stats`
+    (a daily_stats() queryset): totals per weekday, room, period, department
+    and time-series bucket, plus the grand total.
+
+    PostgreSQL aggregates all of them in a single scan with GROUPING SETS;
+    other databases get the same rows from a UNION ALL of one GROUP BY per
+    facet over a shared CTE.
+
+    Returns {'weekday': {name: n}, 'room_id': {id: n}, 'period': {code: n},
+    'department': {name: n}, 'bucket': {date: n}, 'total': n}. Given
+    `windows`, a list of (start, end) ranges, the rows of `stats` inside
+    them are summed per window with conditional aggregation - still one
+    statement - and a list of those dicts is returned, one per window.
+    """
+    if windows is None:
+        return daily_facets(stats, granularity, [(None, None)])[0]
+
+    sums = {}
+    for index, (start, end) in enumerate(windows):
+        if start is None:
+            sums[f'window_{index}'] = F('bookings')
+        else:
+            sums[f'window_{index}'] = Case(
+                When(date__gte=start, date__lte=end, then=F('bookings')), default=Value(0), output_field=IntegerField(),
+            )
+    if windows[0][0] is not None:
+        stats = stats.filter(reduce(operator.or_, (Q(date__gte=start, date__lte=end) for start, end in windows)))
+    rows = stats.annotate(
+        weekday=ExtractWeekDay('date'),
+        bucket=TIME_SERIES_GRANULARITIES[granularity]('date'),
+        **sums,
+    ).values(*FACETS, *sums).order_by()
+    sql, params = rows.query.sql_with_params()
+    columns = ', '.join(FACETS)
+    totals = ', '.join(f'SUM({name})' for name in sums)
+    # GROUPING() bit per facet, leftmost argument most significant; 1 = not grouped
+    all_bits = (1 << len(FACETS)) - 1
+    facet_of = {all_bits ^ (1 << (len(FACETS) - 1 - index)): facet for index, facet in enumerate(FACETS)}
+
+    if connection.vendor == 'postgresql':
+        query = (
+            f'SELECT {columns}, {totals}, GROUPING({columns}) FROM ({sql}) s '
+            f"GROUP BY GROUPING SETS ({', '.join(f'({facet})' for facet in FACETS)}, ())"
+        )
+    else:
+        selects = [
+            f"SELECT {', '.join(name if name == facet else 'NULL' for name in FACETS)}, {totals}, {bits} "
+            f'FROM s GROUP BY {facet}'
+            for bits, facet in facet_of.items()
+        ]
+        selects.append(f"SELECT {', '.join(['NULL'] * len(FACETS))}, {totals}, {all_bits} FROM s")
+        query = f'WITH s AS ({sql}) ' + ' UNION ALL '.join(selects)
+
+    results = []
+    for _ in windows:
+        facets = {facet: {} for facet in FACETS}
+        facets['total'] = 0
+        results.append(facets)
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        for row in cursor.fetchall():
+            keys, window_totals, grouping = row[:len(FACETS)], row[len(FACETS):-1], row[-1]
+            if grouping == all_bits:
+                for facets, bookings in zip(results, window_totals):
+                    facets['total'] = int(bookings or 0)
+                continue
+            facet = facet_of[grouping]
+            key = keys[FACETS.index(facet)]
+            # Raw rows skip the ORM's converters: weekdays may come back as
+            # numerics and buckets as timestamps or text
+            if facet == 'weekday':
+                key = int(key)
+            elif facet == 'bucket':
+                key = date.fromisoformat(str(key)[:10])
+            for facets, bookings in zip(results, window_totals):
+                if bookings:
+                    facets[facet][key] = int(bookings)
+
+    periods = dict(Booking.PERIOD_CHOICES)
+    for facets in results:
+        facets['weekday'] = {
+            name: facets['weekday'].get(number, 0)
+            for number, name in sorted(WEEKDAYS.items(), key=lambda item: (item[0] + 5) % 7)
+        }
+        facets['period'] = {periods.get(code, code): count for code, count in sorted(facets['period'].items())}
+        facets['department'] = dict(sorted(facets['department'].items()))
+    return results
+
+
+def time_series_points(series, granularity):
+    """API representation of booking_time_series() output"""
+    label = TIME_SERIES_LABELS[granularity]
+    return [
+        {'date': bucket.strftime(label), 'fullDate': bucket.isoformat(), 'count': count}
+        for bucket, count in series
+    ]
+
+
+def month_chunks(start, end, months):
+    """Split [start, end] into consecutive ranges of `months` calendar months"""
+    chunks = []
+    while start <= end:
+        chunk_end = start
+        for _ in range(months):
+            chunk_end = (chunk_end + timedelta(days=32)).replace(day=1)
+        chunk_end = min(month_start(chunk_end) - timedelta(days=1), end)
+        chunks.append((start, chunk_end))
+        start = chunk_end + timedelta(days=1)
+    return chunks
+
+
+def comparison_window(start, end, compare):
+    """
+    The window `compare` ('previous' or 'year_ago') compares [start, end]
+    with: the same number of days right before it, or the same days a year
+    earlier (365 or 366 days back, keeping the weekday mix within a day).
+    """
+    if compare == 'previous':
+        shift = (end - start).days + 1
+    elif compare == 'year_ago':
+        try:
+            shift = (start - start.replace(year=start.year - 1)).days
+        except ValueError:
+            # 29 February
+            shift = 366
+    else:
+        raise ValueError(f"Unknown comparison '{compare}'. Use one of: {', '.join(COMPARISONS)}.")
+    return start - timedelta(days=shift), end - timedelta(days=shift)
+
+
+def _change(current, previous):
+    """Delta of a metric against the comparison window, with the percentage change (None from 0)"""
+    return {
+        'current': current,
+        'previous': previous,
+        'delta': round(current - previous, 1),
+        'percent': round((current - previous) / previous * 100, 1) if previous else None,
+    }
+
+
+def analytics_overview(start, end, department=None, granularity='day', chunk_months=None, progress=None, compare=None):
+    """
+    The analytics overview payload (GET /api/analytics/) for [start, end].
+
+    By default the range is read in one pass. With chunk_months the facets
+    and per-user counts are read one month-aligned chunk at a time and
+    summed - every facet is additive - calling progress(done, total) after
+    each chunk; background jobs use this to report progress.
+
+    With compare ('previous' or 'year_ago') a `comparison` entry holds
+    every metric's change against comparison_window(). Both windows are
+    aggregated by the same queries, so the query count is unchanged.
+    """
+    windows = [(start, end)]
+    if compare:
+        windows.append(comparison_window(start, end, compare))
+    # The comparison window is read in step with the chunks, shifted alike
+    shifts = [start - window_start for window_start, _ in windows]
+    chunks = month_chunks(start, end, chunk_months) if chunk_months else [(start, end)]
+    facets = [{facet: Counter() for facet in FACETS} for _ in windows]
+    totals = [0 for _ in windows]
+    user_counts = [Counter() for _ in windows]
+    for done, (chunk_start, chunk_end) in enumerate(chunks, 1):
+        chunk_windows = [(chunk_start - shift, chunk_end - shift) for shift in shifts]
+        stats = daily_stats(department=department)
+        for index, (chunk, users) in enumerate(zip(
+            daily_facets(stats, granularity, chunk_windows),
+            window_user_booking_counts(chunk_windows, department),
+        )):
+            for facet in FACETS:
+                facets[index][facet].update(chunk[facet])
+            totals[index] += chunk['total']
+            user_counts[index].update(users)
+        if progress:
+            progress(done, len(chunks))
+
+    top_users = user_counts[0].most_common(10)
+    usernames = dict(User.objects.filter(pk__in=[user_id for user_id, _ in top_users]).values_list('pk', 'username'))
+    room_names = dict(Room.objects.values_list('pk', 'name'))
+    top_rooms = sorted(facets[0]['room_id'].items(), key=lambda item: (-item[1], room_names.get(item[0], '')))[:10]
+    days_in_range = (end - start).days + 1
+    trend = fill_time_series(facets[0]['bucket'], start, end, granularity)
+
+    overview = {
+        'bookingsByDay': dict(facets[0]['weekday']),
+        'bookingsByUser': [{'username': usernames.get(user_id), 'count': count} for user_id, count in top_users],
+        'bookingsByRoom': [{'name': room_names.get(room_id), 'count': count} for room_id, count in top_rooms],
+        'bookingsByPeriod': dict(facets[0]['period']),
+        'bookingsByDepartment': dict(sorted(facets[0]['department'].items())),
+        'bookingTrend': time_series_points(trend, granularity),
+        'trendGranularity': granularity,
+        'totalBookings': totals[0],
+        'totalUsers': len(user_counts[0]),
+        'totalRooms': len(room_names),
+        'averageBookingsPerDay': round(totals[0] / days_in_range, 1),
+        'startDate': start.isoformat(),
+        'endDate': end.isoformat(),
+    }
+    if not compare:
+        return overview
+
+    previous_start, previous_end = windows[1]
+    previous = facets[1]
+    # Trend buckets pair up by position; a bucket the comparison window lacks counts 0
+    previous_trend = fill_time_series(previous['bucket'], previous_start, previous_end, granularity)
+    previous_trend += [(None, 0)] * (len(trend) - len(previous_trend))
+    overview['comparison'] = {
+        'compare': compare,
+        'startDate': previous_start.isoformat(),
+        'endDate': previous_end.isoformat(),
+        'bookingsByDay': {
+            name: _change(count, previous['weekday'][name]) for name, count in overview['bookingsByDay'].items()
+        },
+        'bookingsByUser': [
+            {'username': usernames.get(user_id), **_change(count, user_counts[1][user_id])}
+            for user_id, count in top_users
+        ],
+        'bookingsByRoom': [
+            {'name': room_names.get(room_id), **_change(count, previous['room_id'].get(room_id, 0))}
+            for room_id, count in top_rooms
+        ],
+        **{
+            key: {
+                name: _change(overview[key].get(name, 0), previous[facet].get(name, 0))
+                for name in sorted(overview[key].keys() | previous[facet].keys())
+            }
+            for key, facet in (('bookingsByPeriod', 'period'), ('bookingsByDepartment', 'department'))
+        },
+        'bookingTrend': [
+            {'fullDate': point['fullDate'], 'previousDate': bucket and bucket.isoformat(), **_change(point['count'], count)}
+            for point, (bucket, count) in zip(overview['bookingTrend'], previous_trend)
+        ],
+        'totalBookings': _change(totals[0], totals[1]),
+        'totalUsers': _change(len(user_counts[0]), len(user_counts[1])),
+        'averageBookingsPerDay': _change(overview['averageBookingsPerDay'], round(totals[1] / days_in_range, 1)),
+    }
+    return overview
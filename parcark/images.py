@@ -0,0 +1,153 @@
+"""
+Room photo renditions.
+
+Uploads are stored as-is under content-hashed names (parcark.storage).
+`manage.py image_worker` picks up every room whose `image` differs from
+`rendered_image` and writes resized copies (thumb, card, full) next to
+the original, each in the original format plus WebP and AVIF, recording
+them in `Room.image_variants`. Rendition
+names derive from the original's, e.g. rooms/<sha256>.jpg gives
+rooms/<sha256>.card.webp, so they are content-addressed as well.
+"""
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
+from PIL import Image, ImageOps, features
+
+from .models import Room
+
+logger = logging.getLogger(__name__)
+
+# Rendition name -> maximum width; smaller originals are not upscaled
+RENDITION_WIDTHS = {
+    'thumb': 160,
+    'card': 480,
+    'full': 1600,
+}
+# Pillow format -> (extension, MIME type, save options)
+IMAGE_FORMATS = {
+    'JPEG': ('jpg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'PNG': ('png', 'image/png', {'optimize': True}),
+    'WEBP': ('webp', 'image/webp', {'quality': 80, 'method': 4}),
+    'AVIF': ('avif', 'image/avif', {'quality': 60}),
+}
+# Formats every rendition is also written in, when Pillow can encode them
+VARIANT_FORMATS = ('WEBP', 'AVIF')
+
+
+def rendition_formats(source_format):
+    """The original's format first, then the modern formats available"""
+    formats = [source_format if source_format in IMAGE_FORMATS else 'JPEG']
+    formats += [name for name in VARIANT_FORMATS if name not in formats and features.check(name.lower())]
+    return formats
+
+
+def rendition_name(image_name, rendition, image_format):
+    root, _ = os.path.splitext(image_name)
+    return f'{root}.{rendition}.{IMAGE_FORMATS[image_format][0]}'
+
+
+def rendition_names(image_name, variants=None):
+    """
+    Every file a rendition of `image_name` may be stored under, plus the
+    ones recorded in `variants`.
+    """
+    names = {
+        rendition_name(image_name, rendition, image_format)
+        for rendition in RENDITION_WIDTHS
+        for image_format in IMAGE_FORMATS
+    }
+    for rendition in (variants or {}).get('renditions', {}).values():
+        names.update(rendition['files'].values())
+    return names
+
+
+def delete_room_image(room):
+    """
+    Remove a room's image file and all of its renditions, unless another
+    room uses the same (deduplicated) file
+    """
+    if not room.image or Room.objects.filter(image=room.image.name).exclude(pk=room.pk).exists():
+        return
+    storage = room.image.storage
+    for name in [room.image.name, *sorted(rendition_names(room.image.name, room.image_variants))]:
+        storage.delete(name)
+
+
+def _encode(image, image_format):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA')
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **IMAGE_FORMATS[image_format][2])
+    return buffer.getvalue()
+
+
+def render_image(field):
+    """
+    Write the renditions of an image field's file and return them as
+    {'renditions': {rendition: {'width', 'height', 'files': {MIME type: name}}}}
+    """
+    storage = field.storage
+    with storage.open(field.name, 'rb') as source:
+        original = Image.open(source)
+        source_format = original.format
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    formats = rendition_formats(source_format)
+    renditions = {}
+    for rendition, max_width in RENDITION_WIDTHS.items():
+        image = original.copy()
+        image.thumbnail((max_width, max_width * 4), Image.Resampling.LANCZOS)
+        files = {}
+        for image_format in formats:
+            name = rendition_name(field.name, rendition, image_format)
+            # Same name on every run, so a new upload overwrites the old files
+            storage.delete(name)
+            files[IMAGE_FORMATS[image_format][1]] = storage.save(name, ContentFile(_encode(image, image_format)))
+        renditions[rendition] = {'width': image.width, 'height': image.height, 'files': files}
+    return {'renditions': renditions}
+
+
+def render_next_room_image():
+    """
+    Render the images of one room whose upload has no renditions yet and
+    return it, or None when there is none. The room stays locked while
+    rendering, so several workers can run side by side and an upload
+    replacing it waits for the write.
+    """
+    with transaction.atomic():
+        room = (
+            Room.objects
+            .select_for_update(skip_locked=True)
+            .exclude(image='')
+            .exclude(image__isnull=True)
+            .exclude(rendered_image=F('image'))
+            .order_by('updated_at')
+            .first()
+        )
+        if room is None:
+            return None
+        # Rooms sharing a deduplicated image share its renditions too
+        rendered = (
+            Room.objects
+            .filter(rendered_image=room.image.name)
+            .exclude(image_variants={})
+            .values_list('image_variants', flat=True)
+            .first()
+        )
+        try:
+            room.image_variants = rendered or render_image(room.image)
+        except Exception:
+            # Not retried: the upload stays served as the original only
+            logger.exception('Rendering the image of room %s failed', room.pk)
+            room.image_variants = {}
+        room.rendered_image = room.image.name
+        room.save(update_fields=['image_variants', 'rendered_image', 'updated_at'])
+    return room
@@ -0,0 +1,145 @@
+"""
+Background analytics jobs.
+
+AnalyticsJob rows are the queue: POST /api/analytics/jobs/ enqueues one,
+`python manage.py analytics_worker` claims queued jobs with
+SELECT ... FOR UPDATE SKIP LOCKED (so several workers can run side by side)
+and writes progress and the result back to the row. Finished results are
+reused by identical requests for ANALYTICS_JOB_REUSE_FOR.
+
+Every progress report is also a heartbeat. A running job without one for
+ANALYTICS_JOB_STALE_AFTER has lost its worker and is claimed again, up to
+ANALYTICS_JOB_MAX_ATTEMPTS claims in all; after that it fails.
+"""
+import hashlib
+import json
+import logging
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .analytics import analytics_overview
+from .models import AnalyticsJob
+
+logger = logging.getLogger(__name__)
+
+# Month-aligned chunk read per progress step
+ANALYTICS_JOB_CHUNK_MONTHS = 3
+ANALYTICS_JOB_REUSE_FOR = timedelta(hours=1)
+# A running job without a heartbeat for this long has lost its worker
+ANALYTICS_JOB_STALE_AFTER = timedelta(minutes=15)
+# Claims of a job before it is failed instead of retried
+ANALYTICS_JOB_MAX_ATTEMPTS = 3
+ANALYTICS_JOB_RETENTION = timedelta(days=7)
+
+
+def _stored_params(params):
+    return {name: value.isoformat() if isinstance(value, date) else value for name, value in params.items()}
+
+
+def analytics_job_key(kind, params):
+    """
+    Identical requests share a key. Today's date is part of it, as for the
+    analytics response cache, because default ranges are relative to it.
+    """
+    payload = json.dumps([kind, _stored_params(params), date.today().isoformat()], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def enqueue_analytics_job(user, kind, params):
+    """
+    Queue a job for validated params, or return the identical job that is
+    already queued, running or finished recently.
+    Returns (job, created).
+    """
+    key = analytics_job_key(kind, params)
+    existing = (
+        AnalyticsJob.objects
+        .select_related('created_by')
+        .filter(key=key)
+        .filter(Q(status__in=['queued', 'running']) | Q(status='done', finished_at__gte=timezone.now() - ANALYTICS_JOB_REUSE_FOR))
+        .order_by('-created_at')
+        .first()
+    )
+    if existing is not None:
+        return existing, False
+    job = AnalyticsJob.objects.create(kind=kind, params=_stored_params(params), key=key, created_by=user)
+    return job, True
+
+
+class AnalyticsJobLost(Exception):
+    """The job was claimed again by another worker while this one ran it"""
+
+
+def claim_analytics_job():
+    """
+    Mark the oldest queued (or stale running) job as running and return it,
+    or None. Stale jobs out of attempts are failed instead.
+    """
+    now = timezone.now()
+    stale = Q(status='running', heartbeat_at__lt=now - ANALYTICS_JOB_STALE_AFTER)
+    with transaction.atomic():
+        AnalyticsJob.objects.filter(stale, attempts__gte=ANALYTICS_JOB_MAX_ATTEMPTS).update(
+            status='failed',
+            error=f'The worker running it stopped responding {ANALYTICS_JOB_MAX_ATTEMPTS} times',
+            finished_at=now,
+        )
+        job = (
+            AnalyticsJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(Q(status='queued') | stale)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'running'
+        job.progress = 0
+        job.started_at = job.heartbeat_at = now
+        job.attempts += 1
+        job.save(update_fields=['status', 'progress', 'started_at', 'heartbeat_at', 'attempts'])
+    return job
+
+
+def _claimed(job):
+    """The job's row, as long as this worker's claim on it still holds"""
+    return AnalyticsJob.objects.filter(pk=job.pk, status='running', attempts=job.attempts)
+
+
+def run_analytics_job(job):
+    """
+    Compute a claimed job, recording progress and a heartbeat as each chunk
+    finishes. Stops without writing once another worker has reclaimed it.
+    """
+    def progress(done, total):
+        if not _claimed(job).update(progress=done * 100 // total, heartbeat_at=timezone.now()):
+            raise AnalyticsJobLost(job.pk)
+
+    params = dict(job.params)
+    params['start'] = date.fromisoformat(params['start'])
+    params['end'] = date.fromisoformat(params['end'])
+    try:
+        job.result = analytics_overview(**params, chunk_months=ANALYTICS_JOB_CHUNK_MONTHS, progress=progress)
+    except AnalyticsJobLost:
+        logger.warning('Analytics job %s was claimed by another worker', job.pk)
+        return job
+    except Exception as e:
+        logger.exception('Analytics job %s failed', job.pk)
+        job.status = 'failed'
+        job.error = str(e)
+    else:
+        job.status = 'done'
+        job.progress = 100
+    job.finished_at = timezone.now()
+    _claimed(job).update(
+        status=job.status, progress=job.progress, result=job.result, error=job.error, finished_at=job.finished_at,
+    )
+    return job
+
+
+def delete_expired_analytics_jobs():
+    """Drop jobs finished more than ANALYTICS_JOB_RETENTION ago; returns how many"""
+    deleted, _ = AnalyticsJob.objects.filter(finished_at__lt=timezone.now() - ANALYTICS_JOB_RETENTION).delete()
+    return deleted
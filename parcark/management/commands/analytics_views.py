@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from parcark.analytics import analytics_views_populated, refresh_analytics_views
+from parcark.services import invalidate_analytics
+
+
+class Command(BaseCommand):
+    help = 'Refresh the PostgreSQL materialized views analytics can read from (settings.ANALYTICS_SOURCE = "views")'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['refresh', 'status'], help='refresh the views or report whether they are usable')
+        parser.add_argument('--every', type=int, metavar='SECONDS', help='With refresh: keep refreshing on this interval')
+        parser.add_argument('--no-concurrent', action='store_true', help='Lock readers out instead of refreshing concurrently')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Materialized views need PostgreSQL')
+
+        if options['action'] == 'status':
+            if analytics_views_populated():
+                self.stdout.write(self.style.SUCCESS('Analytics views are populated'))
+            else:
+                raise CommandError('Analytics views are missing or empty; run `analytics_views refresh`')
+            return
+
+        if options['every'] is not None and options['every'] <= 0:
+            raise CommandError('--every must be a positive number of seconds')
+
+        while True:
+            self.refresh(concurrently=not options['no_concurrent'])
+            if not options['every']:
+                return
+            time.sleep(options['every'])
+            # Long-running: don't hold on to a dead or expired connection
+            close_old_connections()
+
+    def refresh(self, concurrently):
+        started = time.perf_counter()
+        names = refresh_analytics_views(concurrently=concurrently)
+        if not names:
+            raise CommandError('Analytics views not found; run `manage.py migrate`')
+        invalidate_analytics()
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed {', '.join(names)} in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from parcark.jobs import claim_analytics_job, delete_expired_analytics_jobs, run_analytics_job
+
+
+class Command(BaseCommand):
+    help = 'Run queued analytics jobs (POST /api/analytics/jobs/). Several workers can run side by side.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds to wait between polls of an empty queue')
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_analytics_job()
+            if job is not None:
+                started = time.perf_counter()
+                run_analytics_job(job)
+                self.stdout.write(f'{job} in {time.perf_counter() - started:.1f}s')
+                continue
+
+            deleted = delete_expired_analytics_jobs()
+            if deleted:
+                self.stdout.write(f'Deleted {deleted} expired jobs')
+            if options['once']:
+                return
+            time.sleep(options['poll'])
+            # Long-running: don't hold on to a dead or expired connection
+            close_old_connections()
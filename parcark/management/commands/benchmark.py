@@ -0,0 +1,646 @@
+import os
+import random
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q, Sum
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from parcark.analytics import (
+    booking_time_series, bookings_by_period, bookings_by_room, bookings_by_weekday, daily_facets, daily_stats,
+    rebuild_booking_stats,
+)
+from parcark.models import Room, Desk, Booking
+from parcark.partitions import (
+    add_months, archive_booking_partitions, booking_partitions, bookings_partitioned, create_booking_partitions,
+)
+from parcark.serializers import BookingSerializer, BookingRowSerializer
+from parcark.utilization import load_occupancy, utilization_report
+from parcark.views import AnalyticsViewSet, BookingViewSet
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark API hot paths against a seeded dataset (all data is rolled back afterwards)'
+
+    scenarios = [
+        'analytics-facets', 'auto-assign', 'availability-matrix', 'concurrent-create', 'export', 'list-serializer',
+        'partitions', 'slot-mask', 'utilization',
+    ]
+    # Scenarios using worker threads need committed data and clean up after themselves
+    committed_scenarios = ['auto-assign', 'concurrent-create']
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=self.scenarios, help='Scenario to run')
+        parser.add_argument('--rooms', type=int, default=50, help='Number of rooms to seed')
+        parser.add_argument('--desks', type=int, default=20, help='Desks per room')
+        parser.add_argument('--days', type=int, default=30, help='Number of days to seed and query')
+        parser.add_argument('--users', type=int, default=2000, help='Number of users to seed')
+        parser.add_argument('--fill', type=float, default=0.6, help='Fraction of desk/days booked')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed repetitions per measurement')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+        parser.add_argument('--workers', type=int, default=16, help='Concurrent clients for threaded scenarios')
+        parser.add_argument('--rows', type=int, default=2_000_000, help='Bookings to generate for large-table scenarios')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.factory = APIRequestFactory()
+        random.seed(options['seed'])
+
+        bench = getattr(self, 'bench_' + options['scenario'].replace('-', '_'))
+        if options['scenario'] in self.committed_scenarios:
+            bench()
+            return
+
+        with transaction.atomic():
+            bench()
+            transaction.set_rollback(True)
+
+    # Helpers
+
+    def seed(self):
+        """Create rooms, desks, users and bookings starting today"""
+        opts = self.options
+        started = time.perf_counter()
+
+        users = User.objects.bulk_create([
+            User(username=f'bench_user_{i}', email=f'bench_user_{i}@example.com')
+            for i in range(opts['users'])
+        ])
+        rooms = [
+            Room.objects.create(name=f'Bench Room {i:03d}', number_of_desks=opts['desks'])
+            for i in range(opts['rooms'])
+        ]
+        desks = list(Desk.objects.filter(room__in=rooms))
+
+        bookings = []
+        start = date.today()
+        for offset in range(opts['days']):
+            day = start + timedelta(days=offset)
+            # Slots each user already holds that day; users can't double book
+            held = {}
+            for desk in desks:
+                if random.random() >= opts['fill']:
+                    continue
+                for period in random.choice([['full'], ['am'], ['pm'], ['am', 'pm']]):
+                    mask = Booking.PERIOD_SLOT_MASKS[period]
+                    user = next(
+                        (user for user in random.sample(users, min(8, len(users)))
+                         if not held.get(user.pk, 0) & mask),
+                        None,
+                    )
+                    if user is None:
+                        continue
+                    held[user.pk] = held.get(user.pk, 0) | mask
+                    bookings.append(Booking(user=user, desk=desk, date=day, period=period))
+        Booking.objects.bulk_create(bookings, batch_size=5000)
+
+        if connection.vendor == 'postgresql':
+            # Fresh tables have no planner statistics inside this transaction
+            with connection.cursor() as cursor:
+                for model in (User, Room, Desk, Booking):
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+        self.stdout.write(
+            f'Seeded {len(rooms)} rooms, {len(desks)} desks, {len(users)} users, '
+            f'{len(bookings)} bookings in {time.perf_counter() - started:.1f}s'
+        )
+        return users, rooms, desks
+
+    def seed_large(self, future_days=None):
+        """
+        Generate about `rows` bookings with one INSERT ... SELECT (PostgreSQL only).
+        Each desk gets its own user so the generated rows never clash.
+        The dates run up to `future_days` past today, half the range by default.
+        """
+        if connection.vendor != 'postgresql':
+            raise CommandError('This scenario needs PostgreSQL')
+
+        opts = self.options
+        started = time.perf_counter()
+        rooms = [
+            Room.objects.create(name=f'Bench Room {i:03d}', number_of_desks=opts['desks'])
+            for i in range(opts['rooms'])
+        ]
+        desk_total = opts['rooms'] * opts['desks']
+        User.objects.bulk_create([
+            User(username=f'bench_user_{i}', email=f'bench_user_{i}@example.com')
+            for i in range(desk_total)
+        ])
+        days = max(1, round(opts['rows'] / (desk_total * opts['fill'])))
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH d AS (
+                    SELECT id, row_number() OVER (ORDER BY id) AS rn
+                    FROM {Desk._meta.db_table} WHERE room_id = ANY(%s)
+                ), u AS (
+                    SELECT id, row_number() OVER (ORDER BY id) AS rn
+                    FROM {User._meta.db_table} WHERE username LIKE 'bench\\_user\\_%%'
+                )
+                INSERT INTO {Booking._meta.db_table} (user_id, desk_id, date, period, created_at, updated_at)
+                SELECT u.id, d.id, CURRENT_DATE - %s + g.day,
+                       (ARRAY['am', 'pm', 'full'])[1 + floor(random() * 3)::int], now(), now()
+                FROM d JOIN u ON u.rn = d.rn
+                CROSS JOIN generate_series(0, %s - 1) AS g(day)
+                WHERE random() < %s
+                """,
+                [[room.id for room in rooms], days // 2 if future_days is None else days - future_days, days, opts['fill']],
+            )
+            rows = cursor.rowcount
+            # Fire the deferred FK checks now so later DDL in this transaction is allowed
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            for model in (User, Room, Desk, Booking):
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+        self.stdout.write(
+            f'Seeded {len(rooms)} rooms, {desk_total} desks, {rows} bookings over {days} days '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+        return rooms, days
+
+    def call(self, viewset, actions, user, method='get', path='/', data=None):
+        # Apply @action options (permissions, renderers) as the router does
+        view = viewset.as_view(actions, **getattr(getattr(viewset, actions[method]), 'kwargs', {}))
+        request = getattr(self.factory, method)(path, data, format='json' if method != 'get' else None)
+        force_authenticate(request, user=user)
+        response = view(request)
+        if not response.streaming:
+            response.render()
+        return response
+
+    def measure(self, label, fn, repeat=None):
+        """Run fn `repeat` times, reporting query count and latency"""
+        timings = []
+        counter = {'queries': 0}
+
+        def count_queries(execute, sql, params, many, context):
+            counter['queries'] += 1
+            return execute(sql, params, many, context)
+
+        for _ in range(repeat or self.options['repeat']):
+            counter['queries'] = 0
+            with connection.execute_wrapper(count_queries):
+                started = time.perf_counter()
+                fn()
+                timings.append((time.perf_counter() - started) * 1000)
+        queries = counter['queries']
+
+        timings.sort()
+        median = timings[len(timings) // 2]
+        self.stdout.write(
+            f'{label:<40} queries={queries:<6} median={median:9.1f}ms max={timings[-1]:9.1f}ms'
+        )
+        return median
+
+    def profile(self, label, fn, repeat=None):
+        """Run fn `repeat` times, reporting CPU time and peak Python allocations"""
+        cpu = []
+        peaks = []
+        for _ in range(repeat or self.options['repeat']):
+            started = time.process_time()
+            fn()
+            cpu.append((time.process_time() - started) * 1000)
+
+            # Separate run: tracing allocations skews the timings
+            tracemalloc.start()
+            fn()
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024 / 1024)
+            tracemalloc.stop()
+
+        cpu.sort()
+        self.stdout.write(
+            f'{label:<40} cpu median={cpu[len(cpu) // 2]:8.1f}ms max={cpu[-1]:8.1f}ms '
+            f'peak alloc={max(peaks):7.1f}MB'
+        )
+
+    # Scenarios
+
+    def bench_availability_matrix(self):
+        users, rooms, desks = self.seed()
+        user = users[0]
+        start = date.today()
+        end = start + timedelta(days=self.options['days'] - 1)
+        periods = ['am', 'pm']
+
+        def per_cell():
+            for room in rooms:
+                for offset in range(self.options['days']):
+                    day = (start + timedelta(days=offset)).isoformat()
+                    for period in periods:
+                        self.call(BookingViewSet, {'get': 'availability'}, user, data={
+                            'room': room.id, 'date': day, 'period': period,
+                        })
+
+        def matrix():
+            response = self.call(BookingViewSet, {'get': 'availability_matrix'}, user, data={
+                'rooms': ','.join(str(room.id) for room in rooms),
+                'start_date': start.isoformat(),
+                'end_date': end.isoformat(),
+                'periods': ','.join(periods),
+            })
+            assert response.status_code == 200, response.data
+
+        cells = len(rooms) * self.options['days'] * len(periods)
+        self.measure(f'availability x {cells} calls', per_cell, repeat=1)
+        self.measure('availability-matrix (1 call)', matrix)
+
+    def bench_list_serializer(self):
+        """
+        Serialize the bookings of a 20-day window (the room view) through
+        BookingSerializer on model instances and BookingRowSerializer on
+        values() rows. Both include fetching the rows.
+        """
+        users, rooms, desks = self.seed()
+        start = date.today()
+        bookings = Booking.objects.filter(
+            date__gte=start, date__lt=start + timedelta(days=min(self.options['days'], 20)),
+        ).order_by('date', 'period', 'id')
+        context = {'request': SimpleNamespace(user=users[0])}
+
+        def models():
+            queryset = bookings.select_related('user', 'desk', 'desk__room')
+            return BookingSerializer(list(queryset), many=True, context=context).data
+
+        def rows():
+            return BookingRowSerializer(list(BookingRowSerializer.values(bookings)), context=context).data
+
+        data = rows()
+        assert [dict(item) for item in models()] == data
+        self.stdout.write(f'{len(data)} bookings per call')
+        self.profile('BookingSerializer (models)', models)
+        self.profile('BookingRowSerializer (values)', rows)
+
+    def bench_concurrent_create(self):
+        """
+        Workers race to book a small pool of desk slots. Compares the old
+        read-then-write validation against the constraint-backed INSERT.
+        """
+        opts = self.options
+        workers = opts['workers']
+        attempts = opts['days'] * 4
+        day = date.today() + timedelta(days=1)
+
+        users = User.objects.bulk_create([
+            User(username=f'bench_racer_{i}', email=f'bench_racer_{i}@example.com')
+            for i in range(workers)
+        ])
+        room = Room.objects.create(name='Bench Race Room', number_of_desks=opts['desks'])
+        desks = list(room.desks.all())
+
+        def legacy(user, desk, booking_date, period):
+            # Previous path: conflict read in the serializer, then full_clean + INSERT
+            overlapping = Booking.objects.filter(user=user, date=booking_date)
+            if period != 'full':
+                overlapping = overlapping.filter(Q(period='full') | Q(period=period))
+            if overlapping.exists():
+                return 'rejected'
+            try:
+                Booking(user=user, desk=desk, date=booking_date, period=period).save()
+            except IntegrityError:
+                # Passed the read check but lost the race: a double booking
+                # before the database constraints existed
+                return 'raced'
+            except Exception:
+                return 'rejected'
+            return 'created'
+
+        def constrained(user, desk, booking_date, period):
+            response = self.call(BookingViewSet, {'post': 'create'}, user, method='post', data={
+                'desk': desk.id, 'date': booking_date.isoformat(), 'period': period,
+            })
+            return 'created' if response.status_code == 201 else 'rejected'
+
+        def run(label, create):
+            Booking.objects.filter(desk__room=room).delete()
+            rng = random.Random(opts['seed'])
+            plans = [
+                [
+                    (rng.choice(desks), day + timedelta(days=rng.randrange(opts['days'])),
+                     rng.choice(['am', 'pm', 'full']))
+                    for _ in range(attempts)
+                ]
+                for _ in range(workers)
+            ]
+
+            def worker(index):
+                outcomes = []
+                try:
+                    for desk, booking_date, period in plans[index]:
+                        outcomes.append(create(users[index], desk, booking_date, period))
+                finally:
+                    connection.close()
+                return outcomes
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outcomes = [outcome for result in pool.map(worker, range(workers)) for outcome in result]
+            elapsed = time.perf_counter() - started
+
+            self.stdout.write(
+                f'{label:<28} requests={len(outcomes):<6} {len(outcomes) / elapsed:8.1f} req/s  '
+                f'created={outcomes.count("created")} rejected={outcomes.count("rejected")} '
+                f'raced={outcomes.count("raced")} double_booked={self.double_bookings(room)}'
+            )
+
+        try:
+            run('read-then-write (old)', legacy)
+            run('constraint INSERT (new)', constrained)
+        finally:
+            Booking.objects.filter(desk__room=room).delete()
+            Room.objects.filter(pk=room.pk).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def bench_analytics_facets(self):
+        """
+        The analytics overview facets (weekday, room, period, department,
+        trend, total) as one GROUPING SETS statement against one GROUP BY
+        per facet, then the whole uncached endpoint. Use --days 365.
+        """
+        users, rooms, desks = self.seed()
+        rebuild_booking_stats()
+        start = date.today()
+        end = start + timedelta(days=self.options['days'] - 1)
+        stats = daily_stats(start, end)
+
+        def per_facet():
+            bookings_by_weekday(stats)
+            bookings_by_room(stats)
+            bookings_by_period(stats)
+            list(stats.values('department').annotate(count=Sum('bookings')).order_by())
+            booking_time_series(start, end, 'week')
+
+        def endpoint():
+            response = self.call(AnalyticsViewSet, {'get': 'list'}, users[0], data={
+                'start_date': start.isoformat(), 'end_date': end.isoformat(),
+            })
+            assert response.status_code == 200, response.data
+
+        self.stdout.write(f'{stats.count()} daily rollup rows in range')
+        self.measure('one GROUP BY per facet', per_facet)
+        self.measure('daily_facets (one statement)', lambda: daily_facets(stats, 'week'))
+        with override_settings(ANALYTICS_CACHE_TIMEOUTS={'list': 0}):
+            self.measure('GET /api/analytics/', endpoint)
+
+    def bench_auto_assign(self):
+        """
+        Morning rush: every user wants any desk in one room on the same day.
+        Compares picking from availability then booking (retrying on
+        conflict) with a single auto-assign call per user.
+        """
+        opts = self.options
+        workers = opts['workers']
+        desk_count = opts['desks'] * 5
+        max_retries = 20
+
+        users = User.objects.bulk_create([
+            User(username=f'bench_rusher_{i}', email=f'bench_rusher_{i}@example.com')
+            for i in range(desk_count)
+        ])
+        room = Room.objects.create(name='Bench Rush Room', number_of_desks=desk_count)
+
+        def pick_then_book(user, day, rng):
+            retries = 0
+            while True:
+                available = self.call(BookingViewSet, {'get': 'availability'}, user, data={
+                    'room': room.id, 'date': day.isoformat(), 'period': 'am',
+                }).data['desks']
+                if not available:
+                    return False, retries
+                response = self.call(BookingViewSet, {'post': 'create'}, user, method='post', data={
+                    'desk': rng.choice(available)['id'], 'date': day.isoformat(), 'period': 'am',
+                })
+                if response.status_code == 201:
+                    return True, retries
+                retries += 1
+                if retries >= max_retries:
+                    return False, retries
+
+        def auto_assign(user, day, rng):
+            response = self.call(BookingViewSet, {'post': 'auto_assign'}, user, method='post', data={
+                'room': room.id, 'date': day.isoformat(), 'period': 'am',
+            })
+            return response.status_code == 201, 0
+
+        def run(label, book, day):
+            def worker(index):
+                rng = random.Random(opts['seed'] + index)
+                results = []
+                try:
+                    for user in users[index::workers]:
+                        started = time.perf_counter()
+                        booked, retries = book(user, day, rng)
+                        results.append((booked, retries, (time.perf_counter() - started) * 1000))
+                finally:
+                    connection.close()
+                return results
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = [result for chunk in pool.map(worker, range(workers)) for result in chunk]
+            elapsed = time.perf_counter() - started
+
+            latencies = sorted(latency for _, _, latency in results)
+            p50 = latencies[len(latencies) // 2]
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            self.stdout.write(
+                f'{label:<24} users={len(results):<5} booked={sum(booked for booked, _, _ in results):<5} '
+                f'retries={sum(retries for _, retries, _ in results):<6} '
+                f'p50={p50:7.1f}ms p99={p99:7.1f}ms total={elapsed:6.2f}s '
+                f'double_booked={self.double_bookings(room)}'
+            )
+
+        try:
+            for attempt in range(opts['repeat']):
+                # A fresh day per round so both flows start from an empty room
+                run('pick-then-book', pick_then_book, date.today() + timedelta(days=1 + attempt * 2))
+                run('auto-assign', auto_assign, date.today() + timedelta(days=2 + attempt * 2))
+        finally:
+            Booking.objects.filter(desk__room=room).delete()
+            Room.objects.filter(pk=room.pk).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def double_bookings(self, room):
+        """Count half-day slots held by more than one booking on a desk or for a user"""
+        seen_desk = set()
+        seen_user = set()
+        clashes = 0
+        for desk_id, user_id, booking_date, period in Booking.objects.filter(
+            desk__room=room
+        ).values_list('desk_id', 'user_id', 'date', 'period'):
+            for half in (['am', 'pm'] if period == 'full' else [period]):
+                for seen, key in ((seen_desk, (desk_id, booking_date, half)), (seen_user, (user_id, booking_date, half))):
+                    if key in seen:
+                        clashes += 1
+                    seen.add(key)
+        return clashes
+
+    def bench_slot_mask(self):
+        """
+        Availability lookups using the old period-string predicates against
+        the slot-mask overlap on a large bookings table.
+        """
+        rooms, days = self.seed_large()
+        rng = random.Random(self.options['seed'])
+        start = date.today() - timedelta(days=days // 2)
+        samples = [
+            (rng.choice(rooms).id, start + timedelta(days=rng.randrange(days)), rng.choice(['am', 'pm', 'full']))
+            for _ in range(200)
+        ]
+
+        # The index the string predicates used before slot_mask existed
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE INDEX bench_booking_date_period ON {Booking._meta.db_table} (date, period)')
+            cursor.execute(f'ANALYZE {Booking._meta.db_table}')
+
+        def by_period():
+            for room_id, day, period in samples:
+                query = Q(date=day)
+                if period != 'full':
+                    query &= Q(period=period) | Q(period='full')
+                list(Booking.objects.filter(query, desk__room_id=room_id).values_list('desk_id', flat=True))
+
+        def by_slot_mask():
+            for room_id, day, period in samples:
+                list(Booking.objects.filter(
+                    date=day,
+                    slot_mask__overlaps=Booking.PERIOD_SLOT_MASKS[period],
+                    desk__room_id=room_id,
+                ).values_list('desk_id', flat=True))
+
+        self.measure(f'period strings x {len(samples)} lookups', by_period)
+        self.measure(f'slot mask x {len(samples)} lookups', by_slot_mask)
+
+    def bench_partitions(self):
+        """
+        Hot booking queries with every booking in one table - the DEFAULT
+        partition, indexed like the table was before partitioning - and
+        again after splitting it into monthly partitions, with the index
+        sizes involved.
+        """
+        if not bookings_partitioned():
+            raise CommandError('This scenario needs the partitioned bookings table (PostgreSQL, migration 0020)')
+        # Fold the month partitions away so every generated row lands in DEFAULT
+        with connection.cursor() as cursor:
+            for partition in booking_partitions():
+                if partition.start:
+                    cursor.execute(f'DROP TABLE {partition.name}')
+        # Years of history, bookings open two months ahead
+        rooms, days = self.seed_large(future_days=60)
+
+        # Compare freshly built indexes on both sides; the partitions are built by copying
+        with connection.cursor() as cursor:
+            cursor.execute(f'REINDEX TABLE {booking_partitions()[-1].name}')
+
+        rng = random.Random(self.options['seed'])
+        users = list(User.objects.filter(username__startswith='bench_user_').order_by('?')[:20])
+        samples = [
+            (rng.choice(rooms).id, date.today() + timedelta(days=rng.randrange(20)), rng.choice(['am', 'pm', 'full']))
+            for _ in range(200)
+        ]
+        matrix_rooms = ','.join(str(room.id) for room in rooms[:5])
+
+        def availability():
+            for room_id, day, period in samples:
+                list(Booking.objects.filter(
+                    date=day,
+                    slot_mask__overlaps=Booking.PERIOD_SLOT_MASKS[period],
+                    desk__room_id=room_id,
+                ).values_list('desk_id', flat=True))
+
+        def listing(action):
+            # Page links are built from the request host
+            @override_settings(ALLOWED_HOSTS=['testserver'])
+            def run():
+                for user in users:
+                    response = self.call(BookingViewSet, {'get': action}, user)
+                    assert response.status_code == 200, response.data
+            return run
+
+        def matrix():
+            response = self.call(BookingViewSet, {'get': 'availability_matrix'}, users[0], data={'rooms': matrix_rooms})
+            assert response.status_code == 200, response.data
+
+        def run(label):
+            partitions = booking_partitions()
+            hot_months = {date.today().replace(day=1), (date.today() + timedelta(days=20)).replace(day=1)}
+            hot = [partition for partition in partitions if partition.start in hot_months] or partitions
+            self.stdout.write(
+                f'{label}: {len(partitions)} partitions, indexes {sum(p.index_bytes for p in partitions) / 1024 / 1024:.1f}MB, '
+                f'{sum(p.index_bytes for p in hot) / 1024 / 1024:.1f}MB in the partitions covering the next 20 days'
+            )
+            self.measure(f'{label}: availability x {len(samples)}', availability)
+            self.measure(f'{label}: my-bookings x {len(users)}', listing('my_bookings'))
+            self.measure(f'{label}: my-past-bookings x {len(users)}', listing('my_past_bookings'))
+            self.measure(f'{label}: availability-matrix 5 rooms', matrix)
+
+        run('single table')
+        first_day = date.today() - timedelta(days=days - 60)
+        started = time.perf_counter()
+        created = create_booking_partitions(first_day, date.today() + timedelta(days=60))
+        self.stdout.write(f'Moved the bookings into {len(created)} monthly partitions in {time.perf_counter() - started:.1f}s')
+        run('monthly')
+        # Long ranges plan and scan every attached partition; archiving
+        # bounds that to the months kept
+        archived = archive_booking_partitions(add_months(date.today(), -12))
+        self.stdout.write(f'Archived {len(archived)} partitions')
+        run('12 months attached')
+
+    def bench_export(self):
+        """
+        Stream every booking of a large table through /api/bookings/export/
+        as CSV and NDJSON, sampling resident memory between blocks.
+        """
+        self.seed_large()
+        admin = User.objects.create(username='bench_admin', is_staff=True)
+
+        def resident_mb():
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+        for export_format in ('csv', 'ndjson'):
+            started = time.perf_counter()
+            response = self.call(BookingViewSet, {'get': 'export'}, admin, data={'format': export_format})
+            assert response.status_code == 200, response.data
+            baseline = peak = resident_mb()
+            size = 0
+            for block in response.streaming_content:
+                size += len(block)
+                peak = max(peak, resident_mb())
+            self.stdout.write(
+                f'export {export_format:<7} {size / 1024 / 1024:8.1f}MB in {time.perf_counter() - started:6.1f}s '
+                f'resident growth={peak - baseline:6.1f}MB'
+            )
+
+    def bench_utilization(self):
+        """
+        Utilization report over the seeded range, e.g. a year across 1000
+        desks with `--days 365`. Loading the occupancy array (queries plus
+        filling it) and the vectorized cuts are timed separately, then the
+        whole uncached endpoint.
+        """
+        users, rooms, desks = self.seed()
+        start = date.today()
+        end = start + timedelta(days=self.options['days'] - 1)
+        occupancy = load_occupancy(start, end)
+        self.stdout.write(f'Occupancy array {occupancy.booked.shape} ({occupancy.booked.nbytes / 1024 / 1024:.1f}MB)')
+
+        def endpoint():
+            response = self.call(AnalyticsViewSet, {'get': 'utilization'}, users[0], data={
+                'start_date': start.isoformat(), 'end_date': end.isoformat(),
+            })
+            assert response.status_code == 200, response.data
+
+        self.measure('load_occupancy', lambda: load_occupancy(start, end))
+        self.measure('utilization_report', lambda: utilization_report(occupancy))
+        with override_settings(ANALYTICS_CACHE_TIMEOUTS={'utilization': 0}):
+            self.measure('GET /api/analytics/utilization/', endpoint)
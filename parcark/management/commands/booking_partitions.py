@@ -0,0 +1,66 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from parcark.partitions import (
+    PARTITION_MONTHS_AHEAD, add_months, archive_booking_partitions, archived_booking_partitions, booking_partitions,
+    bookings_partitioned, create_booking_partitions,
+)
+from parcark.services import invalidate_analytics
+
+
+def _mb(size):
+    return f'{size / 1024 / 1024:.1f}MB'
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly partitions of the bookings table, archive old ones, or list them (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['create', 'archive', 'status'], help='create, archive or list partitions')
+        parser.add_argument(
+            '--start', type=date.fromisoformat,
+            help='With create: first month (YYYY-MM-DD) to create, default: this month. '
+                 'Earlier months move their bookings out of the DEFAULT partition.',
+        )
+        parser.add_argument(
+            '--ahead', type=int, default=PARTITION_MONTHS_AHEAD,
+            help=f'With create: months past this one to create (default {PARTITION_MONTHS_AHEAD})',
+        )
+        parser.add_argument('--keep-months', type=int, help='With archive: months before this one to keep attached')
+        parser.add_argument('--drop', action='store_true', help='With archive: drop old partitions instead of keeping them')
+
+    def handle(self, *args, **options):
+        if not bookings_partitioned():
+            raise CommandError('The bookings table is not partitioned (PostgreSQL only, see migration 0020)')
+        this_month = date.today().replace(day=1)
+
+        if options['action'] == 'create':
+            if options['ahead'] < 0:
+                raise CommandError('--ahead cannot be negative')
+            start = options['start'] or this_month
+            created = create_booking_partitions(start, add_months(this_month, options['ahead']))
+            self.stdout.write(self.style.SUCCESS(
+                f"Created {', '.join(created)}" if created else 'All partitions already exist'
+            ))
+            return
+
+        if options['action'] == 'archive':
+            if options['keep_months'] is None or options['keep_months'] < 0:
+                raise CommandError('archive needs --keep-months (0 or more)')
+            archived = archive_booking_partitions(add_months(this_month, -options['keep_months']), drop=options['drop'])
+            invalidate_analytics()
+            verb = 'Dropped' if options['drop'] else 'Archived'
+            self.stdout.write(self.style.SUCCESS(
+                f"{verb} {', '.join(archived)}" if archived else 'Nothing to archive'
+            ))
+            return
+
+        for partition in booking_partitions():
+            span = f'{partition.start} - {partition.end}' if partition.start else 'DEFAULT'
+            self.stdout.write(
+                f'{partition.name:<32} {span:<25} rows~{partition.rows:<10} '
+                f'table={_mb(partition.table_bytes):<10} indexes={_mb(partition.index_bytes)}'
+            )
+        for name, month in archived_booking_partitions():
+            self.stdout.write(f'{name:<32} archived {month:%Y-%m}')
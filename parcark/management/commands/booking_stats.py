@@ -0,0 +1,58 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from parcark.analytics import booking_stats_drift, rebuild_booking_stats
+from parcark.partitions import archived_before, bookings_partitioned
+from parcark.services import invalidate_analytics
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the analytics booking rollups or check them for drift against the bookings table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['rebuild', 'check'], help='rebuild the rollups or report drift')
+        parser.add_argument('--start', type=date.fromisoformat, help='First date (YYYY-MM-DD), default: all')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last date (YYYY-MM-DD), default: all')
+        parser.add_argument('--fix', action='store_true', help='With check: rebuild when drift is found')
+
+    def handle(self, *args, **options):
+        start, end = options['start'], options['end']
+        if start and end and start > end:
+            raise CommandError('--start cannot be after --end')
+
+        # Archived months are gone from the bookings table but still counted
+        # in the rollups; leave them out rather than report or rebuild them
+        cutoff = archived_before() if bookings_partitioned() else None
+        if cutoff and (start is None or start < cutoff):
+            if end and end < cutoff:
+                raise CommandError(f'Bookings before {cutoff} are archived')
+            start = cutoff
+            self.stdout.write(f'Bookings before {cutoff} are archived; starting there')
+
+        if options['action'] == 'rebuild':
+            daily, monthly = rebuild_booking_stats(start, end)
+            invalidate_analytics()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {daily} daily and {monthly} user-monthly rows'))
+            return
+
+        drift = booking_stats_drift(start, end)
+        if not drift['daily'] and not drift['monthly']:
+            self.stdout.write(self.style.SUCCESS('Rollups match the bookings table'))
+            return
+
+        for name, rows in drift.items():
+            for key, stored, actual in rows[:20]:
+                self.stdout.write(f'{name} {key}: stored={stored} actual={actual}')
+            if len(rows) > 20:
+                self.stdout.write(f'... {len(rows) - 20} more {name} rows')
+
+        if options['fix']:
+            daily, monthly = rebuild_booking_stats(start, end)
+            invalidate_analytics()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {daily} daily and {monthly} user-monthly rows'))
+        else:
+            raise CommandError(
+                f"Drift in {len(drift['daily'])} daily and {len(drift['monthly'])} user-monthly rows; "
+                'run with --fix or `booking_stats rebuild`'
+            )
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from parcark.images import render_next_room_image
+
+
+class Command(BaseCommand):
+    help = 'Render resized WebP/AVIF copies of uploaded room images. Several workers can run side by side.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when every image is rendered')
+        parser.add_argument('--poll', type=float, default=5.0, help='Seconds to wait between polls when idle')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            room = render_next_room_image()
+            if room is not None:
+                renditions = len(room.image_variants.get('renditions', {}))
+                self.stdout.write(f'{room.name}: {renditions} renditions in {time.perf_counter() - started:.1f}s')
+                continue
+
+            if options['once']:
+                return
+            time.sleep(options['poll'])
+            # Long-running: don't hold on to a dead or expired connection
+            close_old_connections()
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from parcark.models import Room
+from parcark.services import invalidate_analytics, provision_desks
+
+
+class Command(BaseCommand):
+    help = 'Resize rooms and add or remove their desks in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('rooms', nargs='*', type=int, help='Room ids, default: every room')
+        parser.add_argument('--desks', type=int, help='New number of desks for the rooms (1-100)')
+
+    def handle(self, *args, **options):
+        desks = options['desks']
+        if desks is not None and not 1 <= desks <= 100:
+            raise CommandError('--desks must be between 1 and 100')
+
+        with transaction.atomic():
+            rooms = Room.objects.select_for_update().order_by('pk')
+            if options['rooms']:
+                rooms = rooms.filter(pk__in=options['rooms'])
+                missing = set(options['rooms']) - set(rooms.values_list('pk', flat=True))
+                if missing:
+                    raise CommandError(f"No room with id {', '.join(map(str, sorted(missing)))}")
+            if desks is not None:
+                # A queryset update skips Room.save and its post_save receivers
+                rooms.update(number_of_desks=desks, updated_at=timezone.now())
+                invalidate_analytics()
+            rooms = list(rooms)
+            created, removed = provision_desks(rooms)
+
+        self.stdout.write(self.style.SUCCESS(f'{len(rooms)} rooms: {created} desks added, {removed} removed'))
+        booked = (
+            Room.objects
+            .filter(pk__in=[room.pk for room in rooms])
+            .annotate(desk_count=Count('desks'))
+            .filter(desk_count__gt=F('number_of_desks'))
+        )
+        for room in booked:
+            self.stdout.write(f'{room.name}: keeps {room.desk_count} desks, surplus desks have bookings')
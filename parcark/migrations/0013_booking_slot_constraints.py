@@ -0,0 +1,94 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:38
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+SLOT_GROUPS = [
+    ('desk', ['am', 'full']),
+    ('desk', ['pm', 'full']),
+    ('user', ['am', 'full']),
+    ('user', ['pm', 'full']),
+]
+
+
+# Clashing bookings listed when the migration refuses to run
+MAX_LISTED_CLASHES = 50
+
+
+def check_overlapping_bookings(apps, schema_editor):
+    """
+    Desk overlaps (e.g. a full day on top of an AM booking) were never
+    checked and racing requests could double book a user. The new
+    constraints can't be built over such bookings, and which one of a
+    clashing pair to keep is not this migration's call: stop and list them
+    so they can be resolved (e.g. in the Django shell) before migrating again.
+    """
+    Booking = apps.get_model('parcark', 'Booking')
+
+    clashing = set()
+    for owner, periods in SLOT_GROUPS:
+        clashes = (
+            Booking.objects
+            .filter(period__in=periods)
+            .values(owner, 'date')
+            .annotate(total=Count('id'))
+            .filter(total__gt=1)
+        )
+        for clash in list(clashes):
+            clashing.update(
+                Booking.objects
+                .filter(period__in=periods, date=clash['date'], **{owner: clash[owner]})
+                .values_list('id', flat=True)
+            )
+    if not clashing:
+        return
+
+    bookings = (
+        Booking.objects
+        .filter(id__in=clashing)
+        .order_by('date', 'desk_id', 'id')
+        .values_list('id', 'user__username', 'desk__room__name', 'desk__desk_number', 'date', 'period')
+    )
+    lines = [
+        f'  booking {pk}: user {username}, {room} desk {number}, {day} ({period})'
+        for pk, username, room, number, day, period in bookings[:MAX_LISTED_CLASHES]
+    ]
+    if len(clashing) > MAX_LISTED_CLASHES:
+        lines.append(f'  ... and {len(clashing) - MAX_LISTED_CLASHES} more')
+    raise RuntimeError(
+        f'{len(clashing)} bookings overlap another booking of the same desk or user and would '
+        'violate the new booking constraints. Delete or move them, then run migrate again:\n'
+        + '\n'.join(lines)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcark', '0012_set_roomlayout_size_800'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_overlapping_bookings, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='booking',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('period__in', ['am', 'full'])), fields=('desk', 'date'), name='booking_desk_am_unique', violation_error_message='This desk is already booked for the morning.'),
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('period__in', ['pm', 'full'])), fields=('desk', 'date'), name='booking_desk_pm_unique', violation_error_message='This desk is already booked for the afternoon.'),
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('period__in', ['am', 'full'])), fields=('user', 'date'), name='booking_user_am_unique', violation_error_message='You already have a booking for the morning.'),
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('period__in', ['pm', 'full'])), fields=('user', 'date'), name='booking_user_pm_unique', violation_error_message='You already have a booking for the afternoon.'),
+        ),
+    ]
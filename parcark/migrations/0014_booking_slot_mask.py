@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:51
+
+import parcark.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcark', '0013_booking_slot_constraints'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='parcark_boo_date_dc6514_idx',
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='slot_mask',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(period='am', then=models.Value(1)), models.When(period='pm', then=models.Value(2)), models.When(period='full', then=models.Value(3)), default=models.Value(0)), help_text='Slots held by this booking, derived from period', output_field=parcark.models.SlotMaskField()),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['date', 'slot_mask'], name='booking_date_slots_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['desk', 'date', 'slot_mask'], name='booking_desk_date_slots_idx'),
+        ),
+    ]
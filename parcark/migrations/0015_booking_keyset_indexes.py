@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcark', '0014_booking_slot_mask'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='parcark_boo_user_id_3155b6_idx',
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['date', 'period', 'id'], name='booking_date_period_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'date', 'period', 'id'], name='booking_user_keyset_idx'),
+        ),
+    ]
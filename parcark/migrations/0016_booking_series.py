@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcark', '0015_booking_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('am', 'Morning (AM)'), ('pm', 'Afternoon (PM)'), ('full', 'Full Day')], help_text='Time period for each booking', max_length=4)),
+                ('weekdays', models.JSONField(help_text='Weekdays to book, 0 = Monday ... 6 = Sunday')),
+                ('interval', models.PositiveSmallIntegerField(default=1, help_text='Repeat every N weeks')),
+                ('start_date', models.DateField(help_text='First day of the series')),
+                ('end_date', models.DateField(blank=True, help_text='Last day of the series (or use count)', null=True)),
+                ('count', models.PositiveSmallIntegerField(blank=True, help_text='Number of occurrences (or use end_date)', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('desk', models.ForeignKey(help_text='Booked desk', on_delete=django.db.models.deletion.CASCADE, related_name='booking_series', to='parcark.desk')),
+                ('user', models.ForeignKey(help_text='User who owns the series', on_delete=django.db.models.deletion.CASCADE, related_name='booking_series', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Booking Series',
+                'verbose_name_plural': 'Booking Series',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='series',
+            field=models.ForeignKey(blank=True, help_text='Recurring series this booking was created from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bookings', to='parcark.bookingseries'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.7 on 2026-10-16 23:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+
+
+def populate_booking_stats(apps, schema_editor):
+    """Fill the rollups from the existing bookings"""
+    Booking = apps.get_model('parcark', 'Booking')
+    BookingDailyStat = apps.get_model('parcark', 'BookingDailyStat')
+    BookingUserMonthlyStat = apps.get_model('parcark', 'BookingUserMonthlyStat')
+
+    daily = (
+        Booking.objects
+        .values('date', 'desk__room_id', 'period', 'user__department')
+        .annotate(bookings=Count('id'))
+        .order_by()
+    )
+    BookingDailyStat.objects.bulk_create([
+        BookingDailyStat(
+            date=row['date'], room_id=row['desk__room_id'], period=row['period'],
+            department=row['user__department'], bookings=row['bookings'],
+        )
+        for row in daily
+    ], batch_size=1000)
+
+    monthly = (
+        Booking.objects
+        .annotate(month=TruncMonth('date'))
+        .values('month', 'user_id')
+        .annotate(bookings=Count('id'))
+        .order_by()
+    )
+    BookingUserMonthlyStat.objects.bulk_create([
+        BookingUserMonthlyStat(month=row['month'], user_id=row['user_id'], bookings=row['bookings'])
+        for row in monthly
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcark', '0016_booking_series'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('period', models.CharField(choices=[('am', 'Morning (AM)'), ('pm', 'Afternoon (PM)'), ('full', 'Full Day')], max_length=4)),
+                ('department', models.CharField(blank=True, help_text="Booking user's department at booking time", max_length=100)),
+                ('bookings', models.IntegerField(default=0)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='parcark.room')),
+            ],
+            options={
+                'verbose_name': 'Booking Daily Stat',
+                'verbose_name_plural': 'Booking Daily Stats',
+                'ordering': ['date', 'room', 'period'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'room', 'period', 'department'), name='booking_daily_stat_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BookingUserMonthlyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('bookings', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_booking_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Booking User Monthly Stat',
+                'verbose_name_plural': 'Booking User Monthly Stats',
+                'ordering': ['month', 'user'],
+                'constraints': [models.UniqueConstraint(fields=('month', 'user'), name='booking_user_monthly_stat_key')],
+            },
+        ),
+        migrations.RunPython(populate_booking_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:05
+
+from django.db import migrations, models
+
+# Created empty; `manage.py analytics_views refresh` fills them. The unique
+# indexes are what REFRESH MATERIALIZED VIEW CONCURRENTLY requires.
+CREATE_VIEWS = [
+    """
+    CREATE MATERIALIZED VIEW parcark_booking_daily_mv AS
+    SELECT b.date, d.room_id, b.period, u.department, COUNT(*)::integer AS bookings
+    FROM parcark_booking b
+    JOIN parcark_desk d ON d.id = b.desk_id
+    JOIN parcark_user u ON u.id = b.user_id
+    GROUP BY b.date, d.room_id, b.period, u.department
+    WITH NO DATA
+    """,
+    'CREATE UNIQUE INDEX parcark_booking_daily_mv_key ON parcark_booking_daily_mv (date, room_id, period, department)',
+    """
+    CREATE MATERIALIZED VIEW parcark_booking_user_monthly_mv AS
+    SELECT date_trunc('month', b.date)::date AS month, b.user_id, COUNT(*)::integer AS bookings
+    FROM parcark_booking b
+    GROUP BY 1, b.user_id
+    WITH NO DATA
+    """,
+    'CREATE UNIQUE INDEX parcark_booking_user_monthly_mv_key ON parcark_booking_user_monthly_mv (month, user_id)',
+]
+
+DROP_VIEWS = [
+    'DROP MATERIALIZED VIEW IF EXISTS parcark_booking_user_monthly_mv',
+    'DROP MATERIALIZED VIEW IF EXISTS parcark_booking_daily_mv',
+]
+
+
+def create_views(apps, schema_editor):
+    """PostgreSQL only; elsewhere analytics keep reading the rollup tables"""
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in CREATE_VIEWS:
+            schema_editor.execute(sql)
+
+
+def drop_views(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in DROP_VIEWS:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcark', '0017_booking_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingDailyView',
+            fields=[
+                ('pk', models.CompositePrimaryKey('date', 'room', 'period', 'department', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('period', models.CharField(choices=[('am', 'Morning (AM)'), ('pm', 'Afternoon (PM)'), ('full', 'Full Day')], max_length=4)),
+                ('department', models.CharField(blank=True, max_length=100)),
+                ('bookings', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'parcark_booking_daily_mv',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='BookingUserMonthlyView',
+            fields=[
+                ('pk', models.CompositePrimaryKey('month', 'user', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('month', models.DateField()),
+                ('bookings', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'parcark_booking_user_monthly_mv',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_views, drop_views),
+    ]
@@ -0,0 +1,141 @@
+from datetime import date
+from importlib import import_module
+
+from django.db import migrations
+
+TABLE = 'parcark_booking'
+OLD_TABLE = 'parcark_booking_unpartitioned'
+# Monthly partitions created up front past the current month; later ones
+# come from `manage.py booking_partitions create`
+MONTHS_AHEAD = 3
+
+# The materialized views read parcark_booking and have to be rebuilt with it
+analytics_views = import_module('parcark.migrations.0018_analytics_views')
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _columns(cursor, table):
+    """Column names of a table, without generated columns"""
+    cursor.execute(
+        'SELECT column_name FROM information_schema.columns '
+        "WHERE table_name = %s AND is_generated = 'NEVER' ORDER BY ordinal_position",
+        [table],
+    )
+    return ', '.join(row[0] for row in cursor.fetchall())
+
+
+def _definitions(cursor, table):
+    """CREATE INDEX statements and foreign keys of a table, excluding the primary key"""
+    cursor.execute(
+        'SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s',
+        [table, f'{TABLE}_pkey'],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    return indexes, cursor.fetchall()
+
+
+def _copy(cursor, source, target):
+    columns = _columns(cursor, source)
+    cursor.execute(f'INSERT INTO {target} ({columns}) SELECT {columns} FROM {source}')
+
+
+def partition_bookings(apps, schema_editor):
+    """
+    Rebuild parcark_booking as a table range-partitioned by month on `date`
+    (PostgreSQL only). The primary key becomes (id, date), as partitioned
+    unique keys must hold the partition column, and `id` switches from an
+    identity column (not allowed on partitioned tables before PostgreSQL 17)
+    to a sequence default. Indexes and constraints keep their names.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        for sql in analytics_views.DROP_VIEWS:
+            cursor.execute(sql)
+        indexes, foreign_keys = _definitions(cursor, TABLE)
+        cursor.execute(f'SELECT MIN(date) FROM {TABLE}')
+        first_date = cursor.fetchone()[0]
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}')
+
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {OLD_TABLE} INCLUDING GENERATED) PARTITION BY RANGE (date)')
+        this_month = date.today().replace(day=1)
+        month = min(first_date.replace(day=1), this_month) if first_date else this_month
+        while month <= add_months(this_month, MONTHS_AHEAD):
+            cursor.execute(
+                f"CREATE TABLE {TABLE}_y{month:%Y}m{month:%m} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            )
+            month = add_months(month, 1)
+        cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+        _copy(cursor, OLD_TABLE, TABLE)
+        cursor.execute(f'SELECT MAX(id) FROM {OLD_TABLE}')
+        last_id = cursor.fetchone()[0]
+        cursor.execute(f'DROP TABLE {OLD_TABLE}')
+
+        cursor.execute(f'CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id')
+        if last_id:
+            cursor.execute(f"SELECT setval('{TABLE}_id_seq', %s)", [last_id])
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')")
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, date)')
+        # The definitions were read before the rename, so they already point
+        # at parcark_booking, and their names were freed by the DROP TABLE
+        for sql in indexes:
+            cursor.execute(sql)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+
+        for sql in analytics_views.CREATE_VIEWS:
+            cursor.execute(sql)
+
+
+def unpartition_bookings(apps, schema_editor):
+    """Back to a single table; archived partitions are left alone"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        for sql in analytics_views.DROP_VIEWS:
+            cursor.execute(sql)
+        indexes, foreign_keys = _definitions(cursor, TABLE)
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}')
+
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {OLD_TABLE} INCLUDING GENERATED)')
+        _copy(cursor, OLD_TABLE, TABLE)
+        cursor.execute(f'SELECT MAX(id) FROM {OLD_TABLE}')
+        last_id = cursor.fetchone()[0]
+        cursor.execute(f'DROP TABLE {OLD_TABLE}')
+
+        cursor.execute(f'ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+        if last_id:
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), %s)", [last_id])
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)')
+        # As above, read before the rename; indexes of a partitioned table
+        # are defined ON ONLY the parent, which a plain table has no use for
+        for sql in indexes:
+            cursor.execute(sql.replace(f' ON ONLY public.{TABLE} ', f' ON public.{TABLE} '))
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+
+        for sql in analytics_views.CREATE_VIEWS:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcark', '0019_analytics_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_bookings, unpartition_bookings),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcark', '0020_booking_partitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized copies of the image by size and format, written by `manage.py image_worker`'),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='rendered_image',
+            field=models.CharField(blank=True, editable=False, help_text='The image image_variants were made from; differs from image while renditions are pending', max_length=100),
+        ),
+    ]
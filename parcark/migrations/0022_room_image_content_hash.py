@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:30
+
+import os
+import re
+
+import django.core.validators
+import parcark.models
+import parcark.storage
+from django.db import migrations, models
+
+HASHED_NAME = re.compile(r'^rooms/[0-9a-f]{64}\.\w+$')
+
+
+def rename_room_images(apps, schema_editor):
+    """
+    Move existing room images to content-hashed names. Their renditions
+    are deleted and the image worker renders them again under the new names.
+    """
+    Room = apps.get_model('parcark', 'Room')
+    for room in Room.objects.exclude(image='').exclude(image__isnull=True):
+        storage = room.image.storage
+        old_name = room.image.name
+        if HASHED_NAME.match(old_name) or not storage.exists(old_name):
+            continue
+        with storage.open(old_name, 'rb') as image:
+            new_name = f"rooms/{parcark.storage.content_hash(image)}{os.path.splitext(old_name)[1].lower()}"
+            storage.save(new_name, image)
+
+        directory, filename = os.path.split(old_name)
+        prefix = f'{os.path.splitext(filename)[0]}.'
+        _, files = storage.listdir(directory)
+        # The original and its renditions, e.g. room_1_a.jpg and room_1_a.card.webp
+        for name in files:
+            if name.startswith(prefix):
+                storage.delete(os.path.join(directory, name))
+
+        room.image = new_name
+        room.rendered_image = ''
+        room.image_variants = {}
+        room.save(update_fields=['image', 'rendered_image', 'image_variants'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcark', '0021_room_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='room',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Room photo (max 2MB, JPG/PNG/WebP)', null=True, storage=parcark.storage.ContentAddressedStorage(), upload_to=parcark.models.room_image_upload_path, validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'webp'], message='Only JPG, PNG, and WebP images are allowed.'), parcark.models.validate_image_size]),
+        ),
+        migrations.RunPython(rename_room_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:49
+
+from importlib import import_module
+
+import parcark.models
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+analytics_views = import_module('parcark.migrations.0018_analytics_views')
+
+# The daily view groups by the department stored on each booking
+CREATE_DAILY_VIEW = [
+    """
+    CREATE MATERIALIZED VIEW parcark_booking_daily_mv AS
+    SELECT b.date, d.room_id, b.period, b.department, COUNT(*)::integer AS bookings
+    FROM parcark_booking b
+    JOIN parcark_desk d ON d.id = b.desk_id
+    GROUP BY b.date, d.room_id, b.period, b.department
+    WITH NO DATA
+    """,
+    'CREATE UNIQUE INDEX parcark_booking_daily_mv_key ON parcark_booking_daily_mv (date, room_id, period, department)',
+]
+DROP_DAILY_VIEW = ['DROP MATERIALIZED VIEW IF EXISTS parcark_booking_daily_mv']
+
+
+def copy_user_departments(apps, schema_editor):
+    """
+    Existing bookings get their user's current department, the best record
+    there is of it. Rollup rows written before a department change may not
+    match; `manage.py booking_stats check --fix` reconciles them.
+    """
+    Booking = apps.get_model('parcark', 'Booking')
+    User = apps.get_model('parcark', 'User')
+    Booking.objects.update(department=Subquery(User.objects.filter(pk=OuterRef('user_id')).values('department')[:1]))
+
+
+def _replace_daily_view(schema_editor, create):
+    """Recreate the daily view (PostgreSQL only), refilling it if it held data"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT ispopulated FROM pg_matviews WHERE matviewname = 'parcark_booking_daily_mv'")
+        row = cursor.fetchone()
+        for sql in DROP_DAILY_VIEW + create:
+            cursor.execute(sql)
+        if row and row[0]:
+            cursor.execute('REFRESH MATERIALIZED VIEW parcark_booking_daily_mv')
+
+
+def use_booking_departments(apps, schema_editor):
+    _replace_daily_view(schema_editor, CREATE_DAILY_VIEW)
+
+
+def use_user_departments(apps, schema_editor):
+    _replace_daily_view(schema_editor, analytics_views.CREATE_VIEWS[:2])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcark', '0022_room_image_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='department',
+            field=parcark.models.BookingDepartmentField(blank=True, editable=False, help_text="User's department when the booking was made", max_length=100),
+        ),
+        migrations.RunPython(copy_user_departments, migrations.RunPython.noop),
+        migrations.RunPython(use_booking_departments, use_user_departments),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcark', '0023_booking_department'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analyticsjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Times a worker has claimed it'),
+        ),
+        migrations.AddField(
+            model_name='analyticsjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Last progress report of the worker running it', null=True),
+        ),
+    ]
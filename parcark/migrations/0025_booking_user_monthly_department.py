@@ -0,0 +1,115 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:16
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+
+analytics_views = import_module('parcark.migrations.0018_analytics_views')
+
+# The monthly view groups by the department stored on each booking
+CREATE_MONTHLY_VIEW = [
+    """
+    CREATE MATERIALIZED VIEW parcark_booking_user_monthly_mv AS
+    SELECT date_trunc('month', b.date)::date AS month, b.user_id, b.department, COUNT(*)::integer AS bookings
+    FROM parcark_booking b
+    GROUP BY 1, b.user_id, b.department
+    WITH NO DATA
+    """,
+    'CREATE UNIQUE INDEX parcark_booking_user_monthly_mv_key '
+    'ON parcark_booking_user_monthly_mv (month, user_id, department)',
+]
+DROP_MONTHLY_VIEW = ['DROP MATERIALIZED VIEW IF EXISTS parcark_booking_user_monthly_mv']
+
+
+def split_monthly_stats(apps, schema_editor):
+    """
+    Recount the per-user rollup by department for every month the bookings
+    table holds. Rows of archived months (see parcark.partitions) can't be
+    recounted and keep an empty department.
+    """
+    Booking = apps.get_model('parcark', 'Booking')
+    BookingUserMonthlyStat = apps.get_model('parcark', 'BookingUserMonthlyStat')
+
+    monthly = list(
+        Booking.objects
+        .annotate(month=TruncMonth('date'))
+        .values('month', 'user_id', 'department')
+        .annotate(bookings=Count('id'))
+        .order_by()
+    )
+    BookingUserMonthlyStat.objects.filter(month__in={row['month'] for row in monthly}).delete()
+    BookingUserMonthlyStat.objects.bulk_create([
+        BookingUserMonthlyStat(
+            month=row['month'], user_id=row['user_id'], department=row['department'], bookings=row['bookings'],
+        )
+        for row in monthly
+    ], batch_size=1000)
+
+
+def merge_monthly_stats(apps, schema_editor):
+    """Sum the department rows back into one row per user and month"""
+    BookingUserMonthlyStat = apps.get_model('parcark', 'BookingUserMonthlyStat')
+
+    monthly = list(
+        BookingUserMonthlyStat.objects
+        .values('month', 'user_id')
+        .annotate(total=models.Sum('bookings'))
+        .order_by()
+    )
+    BookingUserMonthlyStat.objects.all().delete()
+    BookingUserMonthlyStat.objects.bulk_create([
+        BookingUserMonthlyStat(month=row['month'], user_id=row['user_id'], bookings=row['total'])
+        for row in monthly
+    ], batch_size=1000)
+    # Fire the deferred foreign key checks now; the constraint changes
+    # that follow in reverse refuse to run with trigger events pending
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+def _replace_monthly_view(schema_editor, create):
+    """Recreate the monthly view (PostgreSQL only), refilling it if it held data"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT ispopulated FROM pg_matviews WHERE matviewname = 'parcark_booking_user_monthly_mv'")
+        row = cursor.fetchone()
+        for sql in DROP_MONTHLY_VIEW + create:
+            cursor.execute(sql)
+        if row and row[0]:
+            cursor.execute('REFRESH MATERIALIZED VIEW parcark_booking_user_monthly_mv')
+
+
+def use_monthly_departments(apps, schema_editor):
+    _replace_monthly_view(schema_editor, CREATE_MONTHLY_VIEW)
+
+
+def drop_monthly_departments(apps, schema_editor):
+    _replace_monthly_view(schema_editor, analytics_views.CREATE_VIEWS[2:])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parcark', '0024_analytics_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='bookingusermonthlystat',
+            name='booking_user_monthly_stat_key',
+        ),
+        migrations.AddField(
+            model_name='bookingusermonthlystat',
+            name='department',
+            field=models.CharField(blank=True, help_text="Booking user's department at booking time", max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='bookingusermonthlystat',
+            constraint=models.UniqueConstraint(fields=('month', 'user', 'department'), name='booking_user_monthly_stat_key'),
+        ),
+        migrations.RunPython(split_monthly_stats, merge_monthly_stats),
+        migrations.RunPython(use_monthly_departments, drop_monthly_departments),
+    ]
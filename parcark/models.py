@@ -2,14 +2,15 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
-from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator, FileExtensionValidator
 from django.core.exceptions import ValidationError
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from cryptography.fernet import Fernet
 import uuid
 import os
 
+from .storage import content_hash, room_image_storage
+
 class User(AbstractUser):
     """
     Custom user model that works with both local and LDAP authentication
@@ -49,19 +50,13 @@ def validate_image_size(image):
         raise ValidationError(f'Image file too large. Maximum size is {limit_mb}MB.')
 
 def room_image_upload_path(instance, filename):
-    """Generate upload path for room images"""
-    # Extract file extension
+    """
+    Name room images after their content (see parcark.storage), e.g.
+    rooms/<sha256>.jpg: identical uploads share one file and a new image
+    always gets a new URL
+    """
     ext = filename.split('.')[-1].lower()
-    # Generate clean filename using room name or UUID
-    if instance.id:
-        # Use room ID and slugified name
-        clean_name = slugify(instance.name)[:50]  # Limit length
-        filename = f'room_{instance.id}_{clean_name}.{ext}'
-    else:
-        # For new rooms without ID yet, use UUID
-        filename = f'room_{uuid.uuid4().hex[:8]}.{ext}'
-    
-    return os.path.join('rooms', filename)
+    return os.path.join('rooms', f'{content_hash(instance.image)}.{ext}')
 
 class Room(models.Model):
     name = models.CharField(max_length=100, help_text="Name of the room")
@@ -74,7 +69,7 @@ class Room(models.Model):
         help_text="Total number of desks in this room"
     )
 
-    image = models.ImageField(upload_to=room_image_upload_path, null=True, blank=True,
+    image = models.ImageField(upload_to=room_image_upload_path, storage=room_image_storage, null=True, blank=True,
         validators=[
             FileExtensionValidator(
                 allowed_extensions=['jpg', 'jpeg', 'png', 'webp'],
@@ -84,6 +79,14 @@ class Room(models.Model):
         ],
         help_text="Room photo (max 2MB, JPG/PNG/WebP)"
     )
+    image_variants = models.JSONField(
+        default=dict, blank=True, editable=False,
+        help_text="Resized copies of the image by size and format, written by `manage.py image_worker`",
+    )
+    rendered_image = models.CharField(
+        max_length=100, blank=True, editable=False,
+        help_text="The image image_variants were made from; differs from image while renditions are pending",
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -95,6 +98,14 @@ class Room(models.Model):
 
     def __str__(self):
         return f"{self.name} ({self.number_of_desks} desks)"
+
+    def save(self, *args, **kwargs):
+        if not self.image or not self.image._committed:
+            # Removed, or a new upload (possibly under the old name) that
+            # `manage.py image_worker` will render
+            self.image_variants = {}
+            self.rendered_image = ''
+        super().save(*args, **kwargs)
     
     def delete(self, *args, **kwargs):
         """Override delete to check for bookings"""
@@ -110,10 +121,10 @@ class Room(models.Model):
                 "Please cancel all bookings first or set desks to inactive."
             )
         
-        # Delete associated image if it exists
+        # Delete associated image and its renditions if they exist
         if self.image:
-            if os.path.isfile(self.image.path):
-                os.remove(self.image.path)
+            from .images import delete_room_image  # Import here to avoid circular import
+            delete_room_image(self)
         
         super().delete(*args, **kwargs)
 
@@ -173,29 +184,130 @@ class RoomLayout(models.Model):
     def __str__(self):
         return f"Layout for {self.room.name}"
 
+class SlotsOverlap(models.Lookup):
+    """`slot_mask__overlaps=mask` - true when any of the bits in mask are held"""
+    lookup_name = 'overlaps'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'({lhs} & {rhs}) <> 0', (*lhs_params, *rhs_params)
+
+
+class SlotMaskField(models.PositiveSmallIntegerField):
+    """Bitmask of the time slots a booking holds (one bit per slot)"""
+
+
+class BookingDepartmentField(models.CharField):
+    """
+    The booking user's department, copied when the booking is inserted -
+    by save() and bulk_create() alike, as auto_now_add does - and kept
+    when the user later moves to another department
+    """
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.attname)
+        if add and not value and model_instance.user_id is not None:
+            value = model_instance.user.department
+            setattr(model_instance, self.attname, value)
+        return value
+
+
+SlotMaskField.register_lookup(SlotsOverlap)
+
+
 class Booking(models.Model):
-    """Desk booking"""
+    """
+    Desk booking. On PostgreSQL the table is partitioned by month on `date`
+    (migration 0020, see parcark.partitions), so its database primary key
+    is (id, date); ids still come from a single sequence.
+    """
     PERIOD_CHOICES = [
         ('am', 'Morning (AM)'),
         ('pm', 'Afternoon (PM)'),
         ('full', 'Full Day'),
     ]
 
+    # Slot bits - finer slots (e.g. hourly) only need more bits, not more predicates
+    SLOT_AM = 1
+    SLOT_PM = 2
+    SLOTS = (SLOT_AM, SLOT_PM)
+    PERIOD_SLOT_MASKS = {
+        'am': SLOT_AM,
+        'pm': SLOT_PM,
+        'full': SLOT_AM | SLOT_PM,
+    }
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings', help_text="User who made the booking")
     desk = models.ForeignKey(Desk, on_delete=models.CASCADE, related_name='bookings', help_text="Booked desk")
     date = models.DateField(help_text="Date of booking")
     period = models.CharField(max_length=4, choices=PERIOD_CHOICES, help_text="Time period for booking")
+    department = BookingDepartmentField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        help_text="User's department when the booking was made",
+    )
+    slot_mask = models.GeneratedField(
+        expression=models.Case(
+            *[models.When(period=period, then=models.Value(mask)) for period, mask in PERIOD_SLOT_MASKS.items()],
+            default=models.Value(0),
+        ),
+        output_field=SlotMaskField(),
+        db_persist=True,
+        help_text="Slots held by this booking, derived from period",
+    )
+    series = models.ForeignKey(
+        'BookingSeries',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='bookings',
+        help_text="Recurring series this booking was created from",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['date', 'period']
-        unique_together = ['desk', 'date', 'period']
         verbose_name = 'Booking'
         verbose_name_plural = 'Bookings'
         indexes = [
-            models.Index(fields=['date', 'period']),
-            models.Index(fields=['user', 'date']),
+            models.Index(fields=['date', 'slot_mask'], name='booking_date_slots_idx'),
+            # Per-desk overlap checks (availability, matrix) read slots straight from the index
+            models.Index(fields=['desk', 'date', 'slot_mask'], name='booking_desk_date_slots_idx'),
+            # Keyset pagination order, see BookingCursorPagination
+            models.Index(fields=['date', 'period', 'id'], name='booking_date_period_id_idx'),
+            models.Index(fields=['user', 'date', 'period', 'id'], name='booking_user_keyset_idx'),
+        ]
+        # Overlap rules enforced by the database: a full day holds both the
+        # morning and the afternoon, so each half-day gets a partial unique
+        # index per desk and per user.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['desk', 'date'],
+                condition=models.Q(period__in=['am', 'full']),
+                name='booking_desk_am_unique',
+                violation_error_message='This desk is already booked for the morning.',
+            ),
+            models.UniqueConstraint(
+                fields=['desk', 'date'],
+                condition=models.Q(period__in=['pm', 'full']),
+                name='booking_desk_pm_unique',
+                violation_error_message='This desk is already booked for the afternoon.',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'date'],
+                condition=models.Q(period__in=['am', 'full']),
+                name='booking_user_am_unique',
+                violation_error_message='You already have a booking for the morning.',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'date'],
+                condition=models.Q(period__in=['pm', 'full']),
+                name='booking_user_pm_unique',
+                violation_error_message='You already have a booking for the afternoon.',
+            ),
         ]
 
     def __str__(self):
@@ -207,34 +319,217 @@ class Booking(models.Model):
         if self.date < date.today():
             raise ValidationError("Cannot book a desk in the past")
         
-        # Check user doesn't already have a booking for this date/period
+        # Check user doesn't already have a booking overlapping these slots
         conflicting_bookings = Booking.objects.filter(
             user=self.user,
-            date=self.date
+            date=self.date,
+            slot_mask__overlaps=self.PERIOD_SLOT_MASKS.get(self.period, 0),
         ).exclude(pk=self.pk)
-        
-        # Check for period conflicts
-        if self.period == 'full':
-            # Full day conflicts with any booking
-            if conflicting_bookings.exists():
+
+        if conflicting_bookings.exists():
+            if self.period == 'full':
+                # Full day conflicts with any booking
                 raise ValidationError(
                     f"You already have a booking on {self.date}"
                 )
-        else:
-            # AM/PM conflicts with full day or same period
-            if conflicting_bookings.filter(
-                models.Q(period='full') | models.Q(period=self.period)
-            ).exists():
-                period_name = 'Morning' if self.period == 'am' else 'Afternoon'
-                raise ValidationError(
-                    f"You already have a booking for {period_name} on {self.date}"
-                )
+            period_name = 'Morning' if self.period == 'am' else 'Afternoon'
+            raise ValidationError(
+                f"You already have a booking for {period_name} on {self.date}"
+            )
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
+    @classmethod
+    def slots_in(cls, mask):
+        """Split a slot mask into its individual slot bits"""
+        return [slot for slot in cls.SLOTS if mask & slot]
+
+    def save(self, *args, validate=True, **kwargs):
+        """
+        Save with full model validation unless validate=False. API paths that
+        already validated the input skip it and rely on the constraints above.
+        """
+        if validate:
+            self.full_clean()
         super().save(*args, **kwargs)
 
 
+class BookingSeries(models.Model):
+    """Recurring booking of one desk and period, expanded into Booking rows"""
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='booking_series', help_text="User who owns the series")
+    desk = models.ForeignKey(Desk, on_delete=models.CASCADE, related_name='booking_series', help_text="Booked desk")
+    period = models.CharField(max_length=4, choices=Booking.PERIOD_CHOICES, help_text="Time period for each booking")
+    weekdays = models.JSONField(help_text="Weekdays to book, 0 = Monday ... 6 = Sunday")
+    interval = models.PositiveSmallIntegerField(default=1, help_text="Repeat every N weeks")
+    start_date = models.DateField(help_text="First day of the series")
+    end_date = models.DateField(null=True, blank=True, help_text="Last day of the series (or use count)")
+    count = models.PositiveSmallIntegerField(null=True, blank=True, help_text="Number of occurrences (or use end_date)")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Booking Series'
+        verbose_name_plural = 'Booking Series'
+
+    def __str__(self):
+        days = ', '.join(dict(self.WEEKDAY_CHOICES)[day] for day in sorted(self.weekdays))
+        return f"{self.user.username} - {self.desk} - {days} ({self.period})"
+
+    def occurrences(self, until=None):
+        """
+        Dates of the series: the chosen weekdays of every `interval`-th week
+        counted from the week of start_date, up to end_date or `count` dates,
+        and no later than `until` when given
+        """
+        weekdays = set(self.weekdays)
+        if not weekdays or (self.end_date is None and self.count is None):
+            return []
+        week_start = self.start_date - timedelta(days=self.start_date.weekday())
+        last_day = self.end_date
+        if until is not None and (last_day is None or until < last_day):
+            last_day = until
+        dates = []
+        day = self.start_date
+        while True:
+            if last_day is not None and day > last_day:
+                break
+            if self.count is not None and len(dates) >= self.count:
+                break
+            if day.weekday() in weekdays and ((day - week_start).days // 7) % self.interval == 0:
+                dates.append(day)
+            day += timedelta(days=1)
+        return dates
+
+
+class BookingDailyStat(models.Model):
+    """
+    Bookings per date, room, period and department for analytics.
+    Maintained incrementally, see parcark.analytics
+    """
+    date = models.DateField()
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='daily_stats')
+    period = models.CharField(max_length=4, choices=Booking.PERIOD_CHOICES)
+    department = models.CharField(max_length=100, blank=True, help_text="Booking user's department at booking time")
+    bookings = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['date', 'room', 'period']
+        verbose_name = 'Booking Daily Stat'
+        verbose_name_plural = 'Booking Daily Stats'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'room', 'period', 'department'], name='booking_daily_stat_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.room_id} - {self.period}: {self.bookings}"
+
+
+class BookingUserMonthlyStat(models.Model):
+    """
+    Bookings per user, calendar month and department for analytics.
+    Maintained incrementally, see parcark.analytics
+    """
+    month = models.DateField(help_text="First day of the month")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_booking_stats')
+    department = models.CharField(max_length=100, blank=True, help_text="Booking user's department at booking time")
+    bookings = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['month', 'user']
+        verbose_name = 'Booking User Monthly Stat'
+        verbose_name_plural = 'Booking User Monthly Stats'
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'user', 'department'], name='booking_user_monthly_stat_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} - {self.user_id}: {self.bookings}"
+
+
+class BookingDailyView(models.Model):
+    """
+    PostgreSQL materialized view with the rows of BookingDailyStat, computed
+    from Booking. Read-only; refreshed by `manage.py analytics_views
+    refresh`, see parcark.analytics
+    """
+    pk = models.CompositePrimaryKey('date', 'room', 'period', 'department')
+    date = models.DateField()
+    room = models.ForeignKey(Room, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    period = models.CharField(max_length=4, choices=Booking.PERIOD_CHOICES)
+    department = models.CharField(max_length=100, blank=True)
+    bookings = models.IntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'parcark_booking_daily_mv'
+
+
+class BookingUserMonthlyView(models.Model):
+    """PostgreSQL materialized view with the rows of BookingUserMonthlyStat"""
+    pk = models.CompositePrimaryKey('month', 'user', 'department')
+    month = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    department = models.CharField(max_length=100, blank=True)
+    bookings = models.IntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'parcark_booking_user_monthly_mv'
+
+
+class AnalyticsJob(models.Model):
+    """
+    Analytics computed in the background by `manage.py analytics_worker`.
+    The table is the queue; finished results are reused by identical
+    requests, see parcark.jobs
+    """
+    KIND_CHOICES = [
+        ('overview', 'Analytics overview'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='overview')
+    params = models.JSONField(help_text="Validated request parameters")
+    key = models.CharField(max_length=64, help_text="Hash of kind and params identifying identical requests")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percent complete")
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='analytics_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Last progress report of the worker running it")
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Times a worker has claimed it")
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Analytics Job'
+        verbose_name_plural = 'Analytics Jobs'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='analytics_job_queue_idx'),
+            models.Index(fields=['key', 'status'], name='analytics_job_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.id} ({self.status})"
+
+
 class LDAPSettings(models.Model):
     """Singleton model to store LDAP configuration - only one record (pk=1) allowed"""
     # Connection settings
@@ -0,0 +1,198 @@
+"""
+Monthly range partitions of the bookings table (PostgreSQL).
+
+Migration 0020 partitions parcark_booking by `date`: one partition per
+month plus a DEFAULT partition for dates no month partition covers. Hot
+queries all filter on a recent date, so the planner prunes them down to one
+or two small partitions and their indexes; queries over long ranges
+(my-past-bookings, exports, rollup rebuilds) read across partitions as
+before. `manage.py booking_partitions` creates partitions ahead of today
+and archives old months.
+
+Archiving detaches a month into a standalone parcark_booking_archive_*
+table: its bookings leave the API, while the analytics rollups keep
+counting them.
+"""
+import re
+from collections import namedtuple
+from datetime import date
+
+from django.db import connection, transaction
+
+from .models import Booking
+
+BOOKING_TABLE = Booking._meta.db_table
+DEFAULT_PARTITION = f'{BOOKING_TABLE}_default'
+ARCHIVE_PREFIX = f'{BOOKING_TABLE}_archive_'
+# Monthly partitions kept ready past the current month
+PARTITION_MONTHS_AHEAD = 3
+
+# A month partition spans [start, end); both are None for the DEFAULT partition
+Partition = namedtuple('Partition', ['name', 'start', 'end', 'rows', 'table_bytes', 'index_bytes'])
+
+_MONTH_SUFFIX = re.compile(r'_y(\d{4})m(\d{2})$')
+
+
+def add_months(day, months):
+    """First day of the month `months` after the month of `day`"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month, prefix=f'{BOOKING_TABLE}_'):
+    return f'{prefix}y{month:%Y}m{month:%m}'
+
+
+def bookings_partitioned():
+    """Whether the bookings table is partitioned (PostgreSQL after migration 0020)"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass)', [BOOKING_TABLE])
+        return cursor.fetchone()[0]
+
+
+def booking_partitions():
+    """
+    Attached partitions ordered by month, DEFAULT last. Row counts are the
+    planner's estimates (0 until the partition is first analyzed).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), GREATEST(c.reltuples, 0)::bigint,
+                   pg_table_size(c.oid), pg_indexes_size(c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            """,
+            [BOOKING_TABLE],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound, estimate, table_bytes, index_bytes in rows:
+        if bound == 'DEFAULT':
+            start = end = None
+        else:
+            start, end = (date.fromisoformat(day) for day in re.findall(r"'(\d{4}-\d{2}-\d{2})'", bound))
+        partitions.append(Partition(name, start, end, estimate, table_bytes, index_bytes))
+    return sorted(partitions, key=lambda partition: (partition.start is None, partition.start))
+
+
+def archived_booking_partitions():
+    """Archived months as (table name, first day of the month), oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT tablename FROM pg_tables WHERE tablename LIKE %s', [ARCHIVE_PREFIX.replace('_', r'\_') + '%'])
+        names = [row[0] for row in cursor.fetchall()]
+    archived = []
+    for name in names:
+        match = _MONTH_SUFFIX.search(name)
+        if match:
+            archived.append((name, date(int(match[1]), int(match[2]), 1)))
+    return sorted(archived, key=lambda item: item[1])
+
+
+def archived_before():
+    """First day after the newest archived month, or None when nothing is archived"""
+    archived = archived_booking_partitions()
+    return add_months(archived[-1][1], 1) if archived else None
+
+
+def _columns():
+    return ', '.join(field.column for field in Booking._meta.concrete_fields if not field.generated)
+
+
+def _check_constraints(cursor):
+    # Fire deferred FK checks of an enclosing transaction now; ALTER TABLE
+    # refuses to run with trigger events pending
+    cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+def _bounds(month):
+    return f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+
+
+def _fill(cursor, name, source, condition, params):
+    """Create a standalone copy of the bookings table holding the rows of `source` matching `condition`"""
+    columns = _columns()
+    cursor.execute(f'CREATE TABLE {name} (LIKE {BOOKING_TABLE} INCLUDING DEFAULTS INCLUDING GENERATED)')
+    cursor.execute(f'INSERT INTO {name} ({columns}) SELECT {columns} FROM {source} WHERE {condition}', params)
+
+
+def create_booking_partitions(start, end):
+    """
+    Create the missing month partitions from the month of `start` through
+    the month of `end`, moving any bookings the DEFAULT partition holds for
+    those months. Archived months are skipped. Returns the names created.
+    """
+    existing = {partition.start for partition in booking_partitions()}
+    existing.update(month for _, month in archived_booking_partitions())
+    months = []
+    month = start.replace(day=1)
+    while month <= end:
+        if month not in existing:
+            months.append(month)
+        month = add_months(month, 1)
+    if not months:
+        return []
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        _check_constraints(cursor)
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', date)::date FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s",
+            [months[0], add_months(months[-1], 1)],
+        )
+        occupied = {row[0] for row in cursor.fetchall()}
+        if not occupied:
+            for month in months:
+                cursor.execute(f'CREATE TABLE {partition_name(month)} PARTITION OF {BOOKING_TABLE} FOR VALUES {_bounds(month)}')
+            return [partition_name(month) for month in months]
+
+        # The DEFAULT partition holds rows for the new months. Detach it, copy
+        # them into the new partitions and rebuild it from the rows left:
+        # deleting them instead would keep its heap and indexes at full size
+        # until a VACUUM outside this transaction
+        detached = f'{DEFAULT_PARTITION}_detached'
+        cursor.execute(f'ALTER TABLE {BOOKING_TABLE} DETACH PARTITION {DEFAULT_PARTITION}')
+        cursor.execute(f'ALTER TABLE {DEFAULT_PARTITION} RENAME TO {detached}')
+        for month in months:
+            if month in occupied:
+                _fill(cursor, partition_name(month), detached, 'date >= %s AND date < %s', [month, add_months(month, 1)])
+                cursor.execute(f'ALTER TABLE {BOOKING_TABLE} ATTACH PARTITION {partition_name(month)} FOR VALUES {_bounds(month)}')
+            else:
+                cursor.execute(f'CREATE TABLE {partition_name(month)} PARTITION OF {BOOKING_TABLE} FOR VALUES {_bounds(month)}')
+        _fill(cursor, DEFAULT_PARTITION, detached, "date_trunc('month', date)::date <> ALL(%s)", [sorted(occupied)])
+        cursor.execute(f'DROP TABLE {detached}')
+        cursor.execute(f'ALTER TABLE {BOOKING_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+        for name in [partition_name(month) for month in sorted(occupied)] + [DEFAULT_PARTITION]:
+            cursor.execute(f'ANALYZE {name}')
+    return [partition_name(month) for month in months]
+
+
+def archive_booking_partitions(before, drop=False):
+    """
+    Detach the month partitions ending on or before `before` and rename
+    them parcark_booking_archive_yYYYYmMM, or drop them with drop=True.
+    Archived tables lose their foreign keys so users and desks can still be
+    deleted. Returns the names of the detached partitions.
+    """
+    archived = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        _check_constraints(cursor)
+        for partition in booking_partitions():
+            if partition.end is None or partition.end > before:
+                continue
+            cursor.execute(f'ALTER TABLE {BOOKING_TABLE} DETACH PARTITION {partition.name}')
+            if drop:
+                cursor.execute(f'DROP TABLE {partition.name}')
+            else:
+                cursor.execute(
+                    "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+                    [partition.name],
+                )
+                for (constraint,) in cursor.fetchall():
+                    cursor.execute(f'ALTER TABLE {partition.name} DROP CONSTRAINT {constraint}')
+                cursor.execute(f'ALTER TABLE {partition.name} RENAME TO {partition_name(partition.start, ARCHIVE_PREFIX)}')
+            archived.append(partition.name)
+    return archived
@@ -1,12 +1,13 @@
-import os
+from collections import defaultdict
 from datetime import date, timedelta
 
 from django.contrib.auth import get_user_model, authenticate
-from django.db.models import Q
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 from rest_framework.exceptions import AuthenticationFailed, PermissionDenied
 
-from .models import Booking, Desk, Room, RoomLayout, LDAPSettings
+from .images import RENDITION_WIDTHS, delete_room_image
+from .models import AnalyticsJob, Booking, BookingSeries, Desk, Room, RoomLayout, LDAPSettings
 
 User = get_user_model()
 
@@ -118,26 +119,64 @@ class LoginSerializer(serializers.Serializer):
         return data
 
 
+# Smallest first; PostgreSQL returns stored JSON keys in its own order
+RENDITION_ORDER = {name: index for index, name in enumerate(RENDITION_WIDTHS)}
+
+
 class RoomSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = Room
         fields = [
-            'id', 'name', 'number_of_desks', 'image', 'image_url',
+            'id', 'name', 'number_of_desks', 'image', 'image_url', 'image_variants',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'image_url', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'image_url', 'image_variants', 'created_at', 'updated_at']
+
+    def _absolute_url(self, url):
+        request = self.context.get('request')
+        if request:
+            return request.build_absolute_uri(url)
+        return url
     
     def get_image_url(self, obj):
         """Return full URL for image"""
         if obj.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
+            return self._absolute_url(obj.image.url)
         return None
 
+    def get_image_variants(self, obj):
+        """
+        Resized copies of the image for <picture>/srcset:
+        {"pending": bool, "renditions": [{"name", "width", "height", "urls": {MIME type: url}}],
+         "srcset": {MIME type: "url 160w, url 480w, ..."}}
+        pending is true until the image worker has rendered a new upload.
+        """
+        if not obj.image:
+            return None
+        rendered = obj.rendered_image == obj.image.name
+        renditions = []
+        srcset = defaultdict(list)
+        stored = obj.image_variants.get('renditions', {}) if rendered else {}
+        for name in sorted(stored, key=lambda name: RENDITION_ORDER.get(name, len(RENDITION_ORDER))):
+            rendition = stored[name]
+            urls = {
+                mime_type: self._absolute_url(obj.image.storage.url(file_name))
+                for mime_type, file_name in rendition['files'].items()
+            }
+            renditions.append({'name': name, 'width': rendition['width'], 'height': rendition['height'], 'urls': urls})
+            for mime_type, url in urls.items():
+                # Originals narrower than a rendition give copies of the same width
+                if not any(entry.endswith(f" {rendition['width']}w") for entry in srcset[mime_type]):
+                    srcset[mime_type].append(f"{url} {rendition['width']}w")
+        return {
+            'pending': not rendered,
+            'renditions': renditions,
+            'srcset': {mime_type: ', '.join(entries) for mime_type, entries in srcset.items()},
+        }
+
     def validate_name(self, value):
         value = value.strip()
         if not value:
@@ -183,12 +222,10 @@ class RoomSerializer(serializers.ModelSerializer):
     
     def update(self, instance, validated_data):
         """Handle image update/deletion"""
-        # If new image is provided, delete old one
+        # If new image is provided, delete old one and its renditions
         if 'image' in validated_data and validated_data['image']:
             if instance.image:
-                # Delete old image file
-                if os.path.isfile(instance.image.path):
-                    os.remove(instance.image.path)
+                delete_room_image(instance)
         
         return super().update(instance, validated_data)
 
@@ -203,7 +240,58 @@ class DeskSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'room_name']
 
+def format_existing_booking(existing):
+    """Return a structured clash description for the frontend"""
+    return {
+        "date": existing.date,
+        "period": existing.period,
+        "desk": existing.desk.desk_number,
+        "desk_name": getattr(existing.desk, 'name', None),
+        "room": existing.desk.room.id if existing.desk.room else None,
+        "room_name": getattr(existing.desk.room, 'name', None),
+    }
+
+
+def user_conflict_detail(period, existing):
+    """Error payload for a clash with one of the user's own bookings"""
+    if period == 'full':
+        message = "You already have a booking for this day."
+    else:
+        message = "You already have a booking in this timeslot."
+    return {
+        "error": message,
+        "existing_booking": format_existing_booking(existing),
+    }
+
+
+def booking_conflict_detail(booking):
+    """
+    Explain why `booking` was rejected by a slot constraint. Only runs after
+    an IntegrityError, so the happy path never pays for this lookup.
+
+    Returns None when no booking overlaps it on the user or the desk: the
+    error came from something else and the caller should re-raise it.
+    """
+    overlapping = Booking.objects.filter(
+        date=booking.date,
+        slot_mask__overlaps=Booking.PERIOD_SLOT_MASKS[booking.period],
+    ).exclude(pk=booking.pk)
+
+    existing = (
+        overlapping
+        .filter(user_id=booking.user_id)
+        .select_related('desk__room')
+        .first()
+    )
+    if existing:
+        return user_conflict_detail(booking.period, existing)
+    if overlapping.filter(desk_id=booking.desk_id).exists():
+        return {"error": "This desk is already booked for this timeslot."}
+    return None
+
+
 class BookingSerializer(serializers.ModelSerializer):
+    desk = serializers.PrimaryKeyRelatedField(queryset=Desk.objects.select_related('room'))
     user_username = serializers.CharField(source='user.username', read_only=True)
     desk_number = serializers.IntegerField(source='desk.desk_number', read_only=True)
     room_name = serializers.CharField(source='desk.room.name', read_only=True)
@@ -217,6 +305,8 @@ class BookingSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'user', 'user_username', 'desk_number', 
                            'room_name', 'is_mine', 'created_at']
+        # Slot uniqueness is enforced on INSERT, see _save_booking
+        validators = []
     
     def get_is_mine(self, obj):
         """Check if booking belongs to current user"""
@@ -231,61 +321,176 @@ class BookingSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Cannot book a desk in the past")
         return value
     
-    def validate(self, data):
-        """Check for booking conflicts"""
-        user = self.context['request'].user
-        booking_date = data.get('date')
-        period = data.get('period')
-
-        # Get all user bookings for that date with desk + room info included
-        conflicting_bookings = (
-            Booking.objects
-            .filter(user=user, date=booking_date)
-            .select_related('desk__room')
-        )
+    def _save_booking(self, booking):
+        """
+        Write the booking with a single statement. Overlapping bookings are
+        rejected by the database constraints on Booking, not by a prior read,
+        so two concurrent requests cannot both succeed.
+        """
+        try:
+            with transaction.atomic():
+                booking.save(validate=False)
+        except IntegrityError:
+            detail = booking_conflict_detail(booking)
+            if detail is None:
+                raise
+            raise serializers.ValidationError(detail)
+        return booking
 
-        # If this is an update, exclude the instance itself
-        if self.instance:
-            conflicting_bookings = conflicting_bookings.exclude(pk=self.instance.pk)
-
-        def format_existing(existing):
-            """Return a structured clash description for the frontend"""
-            return {
-                "date": existing.date,
-                "period": existing.period,
-                "desk": existing.desk.desk_number,
-                "desk_name": getattr(existing.desk, 'name', None),
-                "room": existing.desk.room.id if existing.desk.room else None,
-                "room_name": getattr(existing.desk.room, 'name', None),
+    def create(self, validated_data):
+        """Auto-set user from request"""
+        validated_data['user'] = self.context['request'].user
+        return self._save_booking(Booking(**validated_data))
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        return self._save_booking(instance)
+
+
+class BookingRowSerializer:
+    """
+    Read-only counterpart of BookingSerializer for list endpoints.
+
+    Works on `values()` rows instead of model instances, so listing bookings
+    never builds Booking/User/Desk/Room objects. The output matches
+    BookingSerializer field for field.
+
+        rows = BookingRowSerializer.values(queryset)
+        BookingRowSerializer(rows, context={'request': request}).data
+    """
+    columns = (
+        'id', 'user_id', 'user__username', 'desk_id', 'desk__desk_number',
+        'desk__room__name', 'date', 'period', 'created_at',
+    )
+    # Formatting is delegated to DRF so DATE_FORMAT/DATETIME_FORMAT still apply
+    date_field = serializers.DateField()
+    created_at_field = serializers.DateTimeField()
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values(*cls.columns)
+
+    @property
+    def data(self):
+        request = self.context.get('request')
+        user_id = request.user.id if request and request.user else None
+        as_date = self.date_field.to_representation
+        created_at = self.created_at_field.to_representation
+        return [
+            {
+                'id': row['id'],
+                'user': row['user_id'],
+                'user_username': row['user__username'],
+                'desk': row['desk_id'],
+                'desk_number': row['desk__desk_number'],
+                'room_name': row['desk__room__name'],
+                'date': as_date(row['date']),
+                'period': row['period'],
+                'is_mine': user_id is not None and row['user_id'] == user_id,
+                'created_at': created_at(row['created_at']),
             }
+            for row in self.rows
+        ]
 
-        # FULL DAY block → any booking that day is a conflict
-        if period == 'full':
-            existing = conflicting_bookings.first()
-            if existing:
-                raise serializers.ValidationError({
-                    "error": "You already have a booking for this day.",
-                    "existing_booking": format_existing(existing)
-                })
 
-        # AM/PM block → conflict only if same period or full-day booking exists
+class BookingItemSerializer(serializers.Serializer):
+    """
+    Shape-only validation for one item of a bulk booking request.
+    Desk existence and conflicts are resolved for the whole batch at once.
+    """
+    desk = serializers.IntegerField()
+    date = serializers.DateField()
+    period = serializers.ChoiceField(choices=Booking.PERIOD_CHOICES)
+
+    def validate_date(self, value):
+        """Validate date is not in the past"""
+        if value < date.today():
+            raise serializers.ValidationError("Cannot book a desk in the past")
+        return value
+
+
+class AutoAssignSerializer(serializers.Serializer):
+    """Input of the auto-assign endpoint: one room or a list of rooms"""
+    room = serializers.IntegerField(required=False)
+    rooms = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    date = serializers.DateField()
+    period = serializers.ChoiceField(choices=Booking.PERIOD_CHOICES)
+    preferred_desks = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    def validate_date(self, value):
+        """Validate date is not in the past"""
+        if value < date.today():
+            raise serializers.ValidationError("Cannot book a desk in the past")
+        return value
+
+    def validate(self, data):
+        rooms = data.pop('rooms', [])
+        if 'room' in data:
+            rooms.append(data.pop('room'))
+        if not rooms:
+            raise serializers.ValidationError({'rooms': "Provide room or rooms"})
+        data['rooms'] = list(dict.fromkeys(rooms))
+        return data
+
+
+class BookingSeriesSerializer(serializers.ModelSerializer):
+    """Recurrence rule of a booking series; see services.create_booking_series"""
+    MAX_OCCURRENCES = 260
+    MAX_SPAN_DAYS = 366
+
+    desk = serializers.PrimaryKeyRelatedField(queryset=Desk.objects.select_related('room'))
+    desk_number = serializers.IntegerField(source='desk.desk_number', read_only=True)
+    room_name = serializers.CharField(source='desk.room.name', read_only=True)
+    weekdays = serializers.ListField(
+        child=serializers.ChoiceField(choices=BookingSeries.WEEKDAY_CHOICES),
+        allow_empty=False,
+    )
+    interval = serializers.IntegerField(min_value=1, max_value=52, default=1)
+    count = serializers.IntegerField(min_value=1, max_value=MAX_OCCURRENCES, required=False, allow_null=True)
+
+    class Meta:
+        model = BookingSeries
+        fields = [
+            'id', 'user', 'desk', 'desk_number', 'room_name', 'period', 'weekdays',
+            'interval', 'start_date', 'end_date', 'count', 'created_at'
+        ]
+        read_only_fields = ['id', 'user', 'desk_number', 'room_name', 'created_at']
+
+    def validate_weekdays(self, value):
+        return sorted(set(value))
+
+    def validate_start_date(self, value):
+        if value < date.today():
+            raise serializers.ValidationError("Cannot book a desk in the past")
+        return value
+
+    def validate(self, data):
+        end_date = data.get('end_date')
+        count = data.get('count')
+        if (end_date is None) == (count is None):
+            raise serializers.ValidationError("Provide either end_date or count")
+        if end_date is not None:
+            if end_date < data['start_date']:
+                raise serializers.ValidationError({'end_date': "End date must be on or after the start date"})
+            if (end_date - data['start_date']).days > self.MAX_SPAN_DAYS:
+                raise serializers.ValidationError({'end_date': f"A series can span at most {self.MAX_SPAN_DAYS} days"})
         else:
-            existing = conflicting_bookings.filter(
-                Q(period='full') | Q(period=period)
-            ).first()
-            if existing:
+            # Expand the rule only as far as the span allows; a count it
+            # can't reach within that would run past it
+            series = BookingSeries(
+                weekdays=data['weekdays'], interval=data['interval'], start_date=data['start_date'], count=count,
+            )
+            if len(series.occurrences(until=data['start_date'] + timedelta(days=self.MAX_SPAN_DAYS))) < count:
                 raise serializers.ValidationError({
-                    "error": "You already have a booking in this timeslot.",
-                    "existing_booking": format_existing(existing)
+                    'count': f"A series can span at most {self.MAX_SPAN_DAYS} days; use fewer occurrences or a shorter interval"
                 })
-
         return data
 
-    def create(self, validated_data):
-        """Auto-set user from request"""
-        validated_data['user'] = self.context['request'].user
-        return super().create(validated_data)
-
 
 class LDAPSettingsSerializer(serializers.ModelSerializer):
     updated_by_username = serializers.ReadOnlyField(source='updated_by.username')
@@ -370,3 +575,24 @@ class RoomLayoutSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({'canvas_height': 'Canvas height must be between 200 and 5000'})
 
         return data
+
+
+class AnalyticsJobSerializer(serializers.ModelSerializer):
+    created_by_username = serializers.ReadOnlyField(source='created_by.username')
+
+    class Meta:
+        model = AnalyticsJob
+        fields = [
+            'id',
+            'kind',
+            'params',
+            'status',
+            'progress',
+            'result',
+            'error',
+            'created_by_username',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
+        read_only_fields = fields
@@ -0,0 +1,627 @@
+"""
+Set-based booking and desk operations.
+
+Single bookings go through BookingSerializer one INSERT at a time. The
+helpers here work on whole batches with a fixed number of queries.
+"""
+import hashlib
+import time
+from collections import defaultdict
+from datetime import date
+from itertools import count, islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, Count, DateField, Exists, F, OuterRef, Q, Value, When
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.serializers import as_serializer_error
+
+from .analytics import STAT_ROW_FIELDS, StatRow, record_booking_stats
+from .models import Booking, BookingSeries, Desk
+from .serializers import BookingItemSerializer, booking_conflict_detail, user_conflict_detail
+
+# Entries are dropped on every booking change; the timeouts only bound staleness
+BOOKING_COUNTS_TIMEOUT = 60 * 60 * 24
+AVAILABILITY_TIMEOUT = 60 * 60
+
+AVAILABILITY_METRICS = ('hits', 'misses', 'rebuilds', 'rebuild_us')
+
+# Seconds each AnalyticsViewSet endpoint is cached for, 0 disables caching.
+# Override per endpoint with settings.ANALYTICS_CACHE_TIMEOUTS.
+ANALYTICS_CACHE_TIMEOUTS = {
+    'list': 5 * 60,
+    'by-day': 15 * 60,
+    'by-user': 15 * 60,
+    'by-room': 15 * 60,
+    'by-period': 15 * 60,
+    'trend': 5 * 60,
+    'summary': 5 * 60,
+    'utilization': 15 * 60,
+}
+ANALYTICS_GENERATION_KEY = 'analytics_generation'
+
+
+def _error(detail):
+    """Build the same error payload a serializer ValidationError produces"""
+    return as_serializer_error(serializers.ValidationError(detail))
+
+
+def auto_assign_booking(user, room_ids, day, period, preferred_desks=()):
+    """
+    Book any free active desk in `room_ids` for `user`.
+
+    Each attempt picks and locks one desk with a single
+    SELECT ... FOR UPDATE SKIP LOCKED, so concurrent callers are spread
+    over different desks instead of colliding, then inserts the booking
+    while holding the lock. Preferred desks are tried first, in the given
+    order. A desk booked meanwhile through the regular create endpoint
+    trips the slot constraints and the next desk is tried, until none
+    are left.
+
+    Returns the saved Booking, or None when no desk is free. Raises
+    serializers.ValidationError when the user already holds the timeslot.
+    """
+    taken = Booking.objects.filter(
+        desk=OuterRef('pk'),
+        date=day,
+        slot_mask__overlaps=Booking.PERIOD_SLOT_MASKS[period],
+    )
+    ordering = ['room_id', 'desk_number']
+    if preferred_desks:
+        ordering.insert(0, Case(
+            *[When(pk=desk_id, then=Value(rank)) for rank, desk_id in enumerate(preferred_desks)],
+            default=Value(len(preferred_desks)),
+        ))
+    candidates = (
+        Desk.objects
+        .filter(room_id__in=room_ids, is_active=True)
+        .exclude(Exists(taken))
+        .select_related('room')
+        .order_by(*ordering)
+    )
+
+    skipped = []
+    while True:
+        with transaction.atomic():
+            # select_related rows are locked too; limit the lock to the desk
+            desk = candidates.exclude(pk__in=skipped).select_for_update(skip_locked=True, of=('self',)).first()
+            if desk is None:
+                return None
+
+            booking = Booking(user=user, desk=desk, date=day, period=period)
+            try:
+                with transaction.atomic():
+                    booking.save(validate=False)
+            except IntegrityError:
+                detail = booking_conflict_detail(booking)
+                if detail is None:
+                    raise
+                if 'existing_booking' in detail:
+                    raise serializers.ValidationError(detail)
+                skipped.append(desk.pk)
+                continue
+            return booking
+
+
+def create_booking_series(user, data):
+    """
+    Save a BookingSeries and book all of its occurrences in one pass.
+
+    The rule is expanded into dates and handed to bulk_create_bookings, so
+    conflicts are resolved with one read and the free dates are inserted
+    with one bulk INSERT. Nothing is saved when no occurrence can be booked.
+
+    Returns (series or None, created bookings, conflicts) where conflicts is
+    a list of {'date': date, 'error': detail} dicts in date order.
+    """
+    series = BookingSeries(user=user, **data)
+    items = [
+        {'desk': series.desk_id, 'date': day, 'period': series.period}
+        for day in series.occurrences()
+    ]
+
+    with transaction.atomic():
+        series.save()
+        created, errors = bulk_create_bookings(user, items, series=series)
+        if not created:
+            transaction.set_rollback(True)
+
+    conflicts = [{'date': entry['booking']['date'], 'error': entry['error']} for entry in errors]
+    return (series if created else None), created, conflicts
+
+
+def cancel_booking_series(series):
+    """
+    Cancel a series: delete its upcoming bookings with delete_bookings(),
+    then the series itself. Past bookings stay as history with series cleared.
+
+    Returns the number of bookings cancelled.
+    """
+    upcoming = Booking.objects.filter(series=series, date__gte=date.today())
+
+    with transaction.atomic():
+        cancelled = delete_bookings(upcoming)
+        series.delete()
+    return cancelled
+
+
+def booking_counts_key(user_id):
+    return f'booking_counts:{user_id}'
+
+
+def _count_bookings(user_id, today):
+    """
+    Count a user's bookings in one grouped query: everything before `today`
+    collapses into a single NULL bucket, later bookings are counted per date
+    """
+    rows = (
+        Booking.objects
+        .filter(user_id=user_id)
+        .values(day=Case(When(date__gte=today, then=F('date')), output_field=DateField()))
+        .annotate(bookings=Count('id'))
+        .order_by()
+    )
+    counts = {'as_of': today, 'past': 0, 'by_date': {}}
+    for row in rows:
+        if row['day'] is None:
+            counts['past'] = row['bookings']
+        else:
+            counts['by_date'][row['day']] = row['bookings']
+    return counts
+
+
+def booking_counts(user):
+    """
+    Upcoming/past/today booking totals for `user`, served from the cache.
+
+    The cached entry keeps per-date counts for upcoming days, so when the
+    date changes the days that have passed are moved into "past" in memory
+    instead of recounting every user at midnight.
+    """
+    today = date.today()
+    key = booking_counts_key(user.id)
+    counts = cache.get(key)
+
+    if counts is None or counts['as_of'] > today:
+        counts = _count_bookings(user.id, today)
+        cache.set(key, counts, BOOKING_COUNTS_TIMEOUT)
+    elif counts['as_of'] < today:
+        for day in [day for day in counts['by_date'] if day < today]:
+            counts['past'] += counts['by_date'].pop(day)
+        counts['as_of'] = today
+        cache.set(key, counts, BOOKING_COUNTS_TIMEOUT)
+
+    upcoming = sum(counts['by_date'].values())
+    return {
+        'upcoming': upcoming,
+        'past': counts['past'],
+        'today': counts['by_date'].get(today, 0),
+        'total': upcoming + counts['past'],
+    }
+
+
+def invalidate_booking_counts(*user_ids):
+    """
+    Drop cached counts now and again once the transaction commits, so a
+    concurrent reader can't re-cache the pre-commit totals
+    """
+    keys = [booking_counts_key(user_id) for user_id in set(user_ids)]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def bulk_create_bookings(user, items, series=None):
+    """
+    Validate and insert a batch of bookings for `user`, optionally as
+    occurrences of a BookingSeries.
+
+    Existing bookings for the user and the requested desks on the affected
+    dates are loaded in one query, conflicts (including conflicts between
+    items of the same batch) are resolved in memory, and accepted rows are
+    written with one bulk INSERT inside a transaction.
+
+    Returns (created, errors): saved Booking instances with desk, room and
+    user attached, and a list of {'booking': item, 'error': detail} dicts.
+    """
+    # (input position, error entry) so errors come back in request order
+    failures = []
+    candidates = []
+
+    def finish(created):
+        return created, [entry for _, entry in sorted(failures, key=lambda failure: failure[0])]
+
+    for index, item in enumerate(items):
+        serializer = BookingItemSerializer(data=item)
+        if serializer.is_valid():
+            candidates.append((index, item, serializer.validated_data))
+        else:
+            failures.append((index, {'booking': item, 'error': serializer.errors}))
+
+    if not candidates:
+        return finish([])
+
+    desk_ids = {data['desk'] for _, _, data in candidates}
+    dates = {data['date'] for _, _, data in candidates}
+
+    desks = Desk.objects.select_related('room').in_bulk(desk_ids)
+
+    existing = (
+        Booking.objects
+        .filter(date__in=dates)
+        .filter(Q(user=user) | Q(desk_id__in=desk_ids))
+        .select_related('desk__room')
+    )
+
+    # (date, slot) -> booking holding it for this user
+    user_slots = {}
+    # (desk_id, date, slot) -> booking holding the desk
+    desk_slots = {}
+
+    for booking in existing:
+        for slot in Booking.slots_in(booking.slot_mask):
+            if booking.user_id == user.id:
+                user_slots[(booking.date, slot)] = booking
+            desk_slots[(booking.desk_id, booking.date, slot)] = booking
+
+    accepted = []
+    for index, item, data in candidates:
+        desk = desks.get(data['desk'])
+        if desk is None:
+            message = PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+            failures.append((index, {
+                'booking': item,
+                'error': {'desk': [message.format(pk_value=data['desk'])]},
+            }))
+            continue
+
+        slots = Booking.slots_in(Booking.PERIOD_SLOT_MASKS[data['period']])
+
+        clash = next(
+            (user_slots[(data['date'], slot)] for slot in slots if (data['date'], slot) in user_slots),
+            None,
+        )
+        if clash is not None:
+            failures.append((index, {'booking': item, 'error': _error(user_conflict_detail(data['period'], clash))}))
+            continue
+
+        if any((desk.id, data['date'], slot) in desk_slots for slot in slots):
+            failures.append((index, {
+                'booking': item,
+                'error': _error({'error': "This desk is already booked for this timeslot."}),
+            }))
+            continue
+
+        booking = Booking(user=user, desk=desk, date=data['date'], period=data['period'], series=series)
+        for slot in slots:
+            user_slots[(booking.date, slot)] = booking
+            desk_slots[(desk.id, booking.date, slot)] = booking
+        accepted.append((index, item, booking))
+
+    if not accepted:
+        return finish([])
+
+    try:
+        with transaction.atomic():
+            created = Booking.objects.bulk_create([booking for _, _, booking in accepted])
+            record_booking_stats(added=[
+                StatRow(booking.date, booking.desk.room_id, booking.period, booking.department, user.id)
+                for booking in created
+            ])
+    except IntegrityError:
+        # Another request booked one of these slots after we read them.
+        # Re-read them; if none is held now the error came from elsewhere.
+        held = set()
+        for desk_id, user_id, day, slot_mask in existing.values_list('desk_id', 'user_id', 'date', 'slot_mask'):
+            for slot in Booking.slots_in(slot_mask):
+                held.add((desk_id, day, slot))
+                if user_id == user.id:
+                    held.add((None, day, slot))
+        if not any(
+            (booking.desk_id, booking.date, slot) in held or (None, booking.date, slot) in held
+            for _, _, booking in accepted
+            for slot in Booking.slots_in(Booking.PERIOD_SLOT_MASKS[booking.period])
+        ):
+            raise
+        for index, item, _ in accepted:
+            failures.append((index, {
+                'booking': item,
+                'error': _error({'error': "This timeslot was just booked by someone else. Please try again."}),
+            }))
+        return finish([])
+
+    invalidate_booking_counts(user.id)
+    invalidate_availability(*{(booking.desk.room_id, booking.date) for booking in created})
+    invalidate_analytics()
+    return finish(created)
+
+
+def delete_bookings(bookings):
+    """
+    Delete a queryset of bookings with one DELETE and return how many were
+    deleted.
+
+    The rows are locked and read first, and the per-row post_delete
+    receivers are bypassed: what they maintain - the rollups and the
+    booking count, availability and analytics caches - is updated from the
+    locked rows, as bulk_create_bookings does for inserts. Nothing
+    references bookings, so there is nothing to cascade.
+    """
+    with transaction.atomic():
+        locked = bookings.select_for_update(of=('self',)).order_by('pk').values_list('pk', *STAT_ROW_FIELDS)
+        ids, rows = [], []
+        for pk, *row in locked:
+            ids.append(pk)
+            rows.append(StatRow(*row))
+        if not ids:
+            return 0
+        table = connection.ops.quote_name(Booking._meta.db_table)
+        column = connection.ops.quote_name(Booking._meta.pk.column)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({', '.join(['%s'] * len(ids))})", ids)
+            deleted = cursor.rowcount
+        record_booking_stats(removed=rows)
+
+    invalidate_booking_counts(*{row.user_id for row in rows})
+    invalidate_availability(*{(row.room_id, row.date) for row in rows})
+    invalidate_analytics()
+    return deleted
+
+
+def provision_desks(rooms):
+    """
+    Add or remove desks so each room has `number_of_desks` of them.
+
+    Desk numbers of all rooms are read in one query and missing desks are
+    written with one bulk INSERT, filling gaps in the numbering first.
+    Surplus desks are removed highest number first, but only desks without
+    bookings: they are found and locked in one query and deleted together,
+    so a room whose surplus desks are booked keeps them.
+
+    Returns (created, removed) desk counts.
+    """
+    rooms = [room for room in rooms if room.pk is not None]
+    if not rooms:
+        return 0, 0
+
+    with transaction.atomic():
+        taken = defaultdict(set)
+        numbers = Desk.objects.filter(room_id__in=[room.pk for room in rooms]).values_list('room_id', 'desk_number')
+        for room_id, number in numbers:
+            taken[room_id].add(number)
+
+        new_desks = []
+        surplus = {}
+        for room in rooms:
+            missing = room.number_of_desks - len(taken[room.pk])
+            if missing > 0:
+                free = (number for number in count(1) if number not in taken[room.pk])
+                new_desks.extend(
+                    Desk(room=room, desk_number=number, location_description=f'Desk {number}')
+                    for number in islice(free, missing)
+                )
+            elif missing < 0:
+                surplus[room.pk] = -missing
+        if new_desks:
+            Desk.objects.bulk_create(new_desks)
+
+        removable = []
+        if surplus:
+            # Locking the desks makes concurrent bookings of them wait for
+            # the delete and then fail their foreign key check
+            unbooked = (
+                Desk.objects
+                .filter(room_id__in=surplus)
+                .exclude(Exists(Booking.objects.filter(desk=OuterRef('pk'))))
+                .select_for_update()
+                .order_by('room_id', '-desk_number')
+                .values_list('pk', 'room_id')
+            )
+            for pk, room_id in unbooked:
+                if surplus[room_id]:
+                    surplus[room_id] -= 1
+                    removable.append(pk)
+        removed = 0
+        if removable:
+            # Checked again in the delete's own snapshot
+            removed = (
+                Desk.objects
+                .filter(pk__in=removable)
+                .exclude(Exists(Booking.objects.filter(desk=OuterRef('pk'))))
+                .delete()[1].get(Desk._meta.label, 0)
+            )
+
+    # bulk_create skips the Desk post_save receivers; deletes send post_delete
+    for room_id in {desk.room_id for desk in new_desks}:
+        invalidate_room_availability(room_id)
+    if new_desks:
+        invalidate_analytics()
+    return len(new_desks), removed
+
+
+def availability_key(room_id, day, period):
+    return f'availability:{room_id}:{day.isoformat()}:{period}'
+
+
+def availability_generation_key(room_id):
+    return f'availability_generation:{room_id}'
+
+
+def _incr(key, delta=1):
+    """Increment a cache counter, creating it if needed"""
+    cache.add(key, 0, None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(key, delta, None)
+        return delta
+
+
+def _build_availability(room_id, day, period):
+    """Active desks of the room with a booked flag, in one query"""
+    booked = Booking.objects.filter(
+        desk=OuterRef('pk'),
+        date=day,
+        slot_mask__overlaps=Booking.PERIOD_SLOT_MASKS[period],
+    )
+    desks = list(
+        Desk.objects
+        .filter(room_id=room_id, is_active=True)
+        .annotate(booked=Exists(booked))
+        .values('id', 'room', 'room__name', 'desk_number', 'location_description', 'is_active', 'booked')
+    )
+    available = [
+        {
+            'id': desk['id'],
+            'room': desk['room'],
+            'room_name': desk['room__name'],
+            'desk_number': desk['desk_number'],
+            'location_description': desk['location_description'],
+            'is_active': desk['is_active'],
+        }
+        for desk in desks if not desk['booked']
+    ]
+    return {
+        'total_desks': len(desks),
+        'available_desks': len(available),
+        'booked_desks': len(desks) - len(available),
+        'desks': available,
+    }
+
+
+def availability_snapshot(room_id, day, period):
+    """
+    Availability of a room's desks for one date and period, from the cache.
+
+    Snapshots are dropped when a booking in the room on that date changes
+    and go stale when the room's generation is bumped (desk or room edits).
+    Hits, misses and rebuild time are counted for availability_cache_metrics().
+    """
+    key = availability_key(room_id, day, period)
+    generation_key = availability_generation_key(room_id)
+    cached = cache.get_many([key, generation_key])
+    generation = cached.get(generation_key, 0)
+    entry = cached.get(key)
+
+    if entry is not None and entry['generation'] == generation:
+        _incr('availability_metrics:hits')
+        return entry['snapshot']
+
+    started = time.perf_counter()
+    snapshot = _build_availability(room_id, day, period)
+    elapsed_us = int((time.perf_counter() - started) * 1_000_000)
+
+    cache.set(key, {'generation': generation, 'snapshot': snapshot}, AVAILABILITY_TIMEOUT)
+    _incr('availability_metrics:misses')
+    _incr('availability_metrics:rebuilds')
+    _incr('availability_metrics:rebuild_us', elapsed_us)
+    return snapshot
+
+
+def availability_cache_metrics():
+    """Snapshot cache hit rate and average rebuild latency since the counters were created"""
+    values = cache.get_many([f'availability_metrics:{name}' for name in AVAILABILITY_METRICS])
+    hits, misses, rebuilds, rebuild_us = (
+        values.get(f'availability_metrics:{name}', 0) for name in AVAILABILITY_METRICS
+    )
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 4) if lookups else None,
+        'rebuilds': rebuilds,
+        'rebuild_ms_avg': round(rebuild_us / rebuilds / 1000, 3) if rebuilds else None,
+    }
+
+
+def invalidate_availability(*room_dates):
+    """Drop snapshots of every period for each (room_id, date), now and on commit"""
+    keys = [
+        availability_key(room_id, day, period)
+        for room_id, day in set(room_dates)
+        for period in Booking.PERIOD_SLOT_MASKS
+    ]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_room_availability(room_id):
+    """Make every snapshot of a room stale by bumping its generation"""
+    key = availability_generation_key(room_id)
+    _incr(key)
+    transaction.on_commit(lambda: _incr(key))
+
+
+def analytics_cache_timeout(endpoint):
+    return getattr(settings, 'ANALYTICS_CACHE_TIMEOUTS', {}).get(endpoint, ANALYTICS_CACHE_TIMEOUTS.get(endpoint, 0))
+
+
+def analytics_cache_key(endpoint, params, generation):
+    """
+    Key for one analytics response. Params are normalized (sorted, blanks
+    dropped) and today's date is included because defaults are relative to it.
+    """
+    normalized = '&'.join(
+        f'{name}={value}'
+        for name, values in sorted(params.lists())
+        for value in sorted(values) if value != ''
+    )
+    digest = hashlib.md5(f'{date.today().isoformat()}?{normalized}'.encode()).hexdigest()
+    return f'analytics:{generation}:{endpoint}:{digest}'
+
+
+def cached_analytics(endpoint, params, build):
+    """
+    Serve an analytics payload from the cache, calling build() on a miss.
+
+    build() returns (data, status); only 200 payloads are stored. Keys embed
+    the analytics generation, so invalidate_analytics() retires every entry
+    at once and old ones simply expire. Hits and misses are counted per
+    endpoint for analytics_cache_metrics().
+
+    Returns (data, status).
+    """
+    timeout = analytics_cache_timeout(endpoint)
+    if not timeout:
+        return build()
+
+    generation = cache.get(ANALYTICS_GENERATION_KEY, 0)
+    key = analytics_cache_key(endpoint, params, generation)
+    data = cache.get(key)
+    if data is not None:
+        _incr(f'analytics_metrics:{endpoint}:hits')
+        return data, 200
+
+    _incr(f'analytics_metrics:{endpoint}:misses')
+    data, status = build()
+    if status == 200:
+        cache.set(key, data, timeout)
+    return data, status
+
+
+def analytics_cache_metrics():
+    """Hit/miss counters per analytics endpoint since the counters were created"""
+    keys = {
+        (endpoint, name): f'analytics_metrics:{endpoint}:{name}'
+        for endpoint in ANALYTICS_CACHE_TIMEOUTS for name in ('hits', 'misses')
+    }
+    values = cache.get_many(list(keys.values()))
+    metrics = {'generation': cache.get(ANALYTICS_GENERATION_KEY, 0), 'endpoints': {}}
+    for endpoint in ANALYTICS_CACHE_TIMEOUTS:
+        hits = values.get(keys[(endpoint, 'hits')], 0)
+        misses = values.get(keys[(endpoint, 'misses')], 0)
+        metrics['endpoints'][endpoint] = {
+            'timeout': analytics_cache_timeout(endpoint),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    return metrics
+
+
+def invalidate_analytics():
+    """Bump the analytics generation now and once the transaction commits"""
+    _incr(ANALYTICS_GENERATION_KEY)
+    transaction.on_commit(lambda: _incr(ANALYTICS_GENERATION_KEY))
@@ -1,42 +1,104 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import Room, Desk
+from .models import Room, Desk, Booking
+from .analytics import booking_stat_row, record_booking_stats, stored_stat_row
+from .services import (
+    invalidate_analytics, invalidate_availability, invalidate_booking_counts, invalidate_room_availability,
+    provision_desks,
+)
 
 User = get_user_model()
 
 @receiver(post_save, sender=Room)
 def create_desks_for_room(sender, instance, created, **kwargs):
     """
-    Automatically create desks when a room is created or updated
+    Automatically create desks when a room is created or updated. Surplus
+    desks are removed only if they have no bookings.
     """
+    provision_desks([instance])
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_user_booking_counts(sender, instance, **kwargs):
+    """
+    Drop the owner's cached booking counts. Also fires for admin and
+    cascade deletes; bulk inserts invalidate in services.bulk_create_bookings
+    """
+    invalidate_booking_counts(instance.user_id)
+
+
+@receiver(pre_save, sender=Booking)
+def remember_previous_booking(sender, instance, **kwargs):
+    """An edited booking may move away from its old room, date or period"""
+    instance._previous_stat_row = None
+    if instance._state.adding or instance.pk is None:
+        return
+    previous = stored_stat_row(instance.pk)
+    if previous is not None:
+        instance._previous_stat_row = previous
+        invalidate_availability((previous.room_id, previous.date))
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, created, **kwargs):
+    """
+    Drop the availability snapshots of the booking's room and date and
+    update the analytics rollups. Bulk inserts do both in services.
+    """
+    row = booking_stat_row(instance)
+    if row.room_id is not None:
+        invalidate_availability((row.room_id, row.date))
+
     if created:
-        # Room just created - create all desks
-        for i in range(1, instance.number_of_desks + 1):
-            Desk.objects.create(
-                room=instance,
-                desk_number=i,
-                location_description=f'Desk {i}'
-            )
-    else:
-        # Room updated - adjust desk count
-        current_desk_count = instance.desks.count()
-        target_desk_count = instance.number_of_desks
-        
-        if target_desk_count > current_desk_count:
-            # Add more desks
-            for i in range(current_desk_count + 1, target_desk_count + 1):
-                Desk.objects.create(
-                    room=instance,
-                    desk_number=i,
-                    location_description=f'Desk {i}'
-                )
-        elif target_desk_count < current_desk_count:
-            # Remove excess desks (only if they have no bookings)
-            desks_to_remove = instance.desks.order_by('-desk_number')[:(current_desk_count - target_desk_count)]
-            for desk in desks_to_remove:
-                if not desk.bookings.exists():
-                    desk.delete()
+        record_booking_stats(added=[row])
+        return
+    previous = getattr(instance, '_previous_stat_row', None)
+    if previous is not None and previous != row:
+        record_booking_stats(added=[row], removed=[previous])
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, origin=None, **kwargs):
+    """Same as booking_saved for deletes, including admin and cascade deletes"""
+    row = booking_stat_row(instance)
+    if row.room_id is not None:
+        invalidate_availability((row.room_id, row.date))
+    # A deleted user's monthly rollup rows are deleted with it
+    record_booking_stats(removed=[row], users=not isinstance(origin, User))
+
+
+@receiver(post_save, sender=Desk)
+@receiver(post_delete, sender=Desk)
+def invalidate_desk_availability(sender, instance, **kwargs):
+    """Desks activated, deactivated, added or removed change every snapshot of the room"""
+    invalidate_room_availability(instance.room_id)
+
+
+@receiver(post_save, sender=Room)
+def invalidate_renamed_room_availability(sender, instance, created, **kwargs):
+    """Snapshots embed the room name"""
+    if not created:
+        invalidate_room_availability(instance.pk)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+@receiver(post_save, sender=Desk)
+@receiver(post_delete, sender=Desk)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_analytics_responses(sender, instance, update_fields=None, **kwargs):
+    """
+    Any write can change an analytics response; bump the generation so every
+    cached one is retired. Logins only touch last_login, which none read.
+    """
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_analytics()
 
 
 @receiver(post_save, sender=User)
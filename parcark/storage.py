@@ -0,0 +1,32 @@
+"""
+Content-addressed media storage.
+
+Room images are named after the SHA-256 of their bytes, so a URL always
+serves the same content: nginx can send it with an immutable, year-long
+Cache-Control, a replaced image gets a new URL, and uploading a file that
+is already stored reuses it instead of writing a copy.
+"""
+import hashlib
+
+from django.core.files.storage import FileSystemStorage
+
+
+def content_hash(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that keeps the existing file when a name is saved again"""
+
+    def save(self, name, content, max_length=None):
+        if name is not None and self.exists(name):
+            # Same name, same bytes
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+room_image_storage = ContentAddressedStorage()
@@ -1,11 +1,40 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from django.test.utils import override_settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Value
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
 from rest_framework.test import APIClient
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
-from unittest import skip
+import csv
+import json
+import os
+import tempfile
+from io import BytesIO, StringIO
+from unittest import skip, skipUnless
+from unittest.mock import patch
 
-from .models import Room, Booking
+from .analytics import (
+    analytics_overview, booking_stats_drift, booking_time_series, bookings_by_period, bookings_by_room, bookings_by_weekday,
+    comparison_window, daily_facets, daily_stats, fill_time_series, rebuild_booking_stats, stat_models,
+)
+from .exports import EXPORT_CHUNK_SIZE, EXPORT_COLUMNS, csv_stream
+from .images import RENDITION_WIDTHS, rendition_formats
+from .jobs import (
+    ANALYTICS_JOB_MAX_ATTEMPTS, ANALYTICS_JOB_REUSE_FOR, ANALYTICS_JOB_STALE_AFTER, claim_analytics_job, run_analytics_job,
+)
+from .partitions import (
+    ARCHIVE_PREFIX, DEFAULT_PARTITION, add_months, archived_booking_partitions, bookings_partitioned, partition_name,
+)
+from .models import (
+    AnalyticsJob, Room, Desk, Booking, BookingDailyStat, BookingDailyView, BookingUserMonthlyStat, BookingUserMonthlyView, RoomLayout,
+)
+from .serializers import BookingSerializer
 
 
 @override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
@@ -218,3 +247,1903 @@ class LDAPAuthTests(TestCase):
 
     def test_ldap_login_flow_placeholder(self):
         pass
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class AvailabilityMatrixTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username='matrix_user',
+            password='password123',
+            email='matrix@example.com',
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.room_a = Room.objects.create(name='Room A', number_of_desks=2)
+        self.room_b = Room.objects.create(name='Room B', number_of_desks=3)
+        self.desk_a1, self.desk_a2 = self.room_a.desks.order_by('desk_number')
+        self.start = date.today() + timedelta(days=1)
+
+    def test_matrix_reports_booked_periods_and_available_counts(self):
+        Booking.objects.create(user=self.user, desk=self.desk_a1, date=self.start, period='am')
+        Booking.objects.create(
+            user=self.user, desk=self.desk_a2, date=self.start + timedelta(days=1), period='full',
+        )
+
+        response = self.client.get(
+            '/api/bookings/availability-matrix/',
+            {
+                'rooms': str(self.room_a.id),
+                'start_date': self.start.isoformat(),
+                'end_date': (self.start + timedelta(days=1)).isoformat(),
+                'periods': 'am,pm,full',
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['periods'], ['am', 'pm', 'full'])
+        self.assertEqual(len(response.data['rooms']), 1)
+
+        room = response.data['rooms'][0]
+        self.assertEqual(room['id'], self.room_a.id)
+        self.assertEqual(room['total_desks'], 2)
+        self.assertEqual(room['desks'][0]['booked'], [[1, 0, 1], [0, 0, 0]])
+        self.assertEqual(room['desks'][1]['booked'], [[0, 0, 0], [1, 1, 1]])
+        self.assertEqual(room['available'], [[1, 2, 1], [1, 1, 1]])
+
+    def test_matrix_query_count_is_independent_of_room_and_date_count(self):
+        Booking.objects.create(user=self.user, desk=self.desk_a1, date=self.start, period='pm')
+
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                '/api/bookings/availability-matrix/',
+                {
+                    'start_date': self.start.isoformat(),
+                    'end_date': (self.start + timedelta(days=29)).isoformat(),
+                },
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['dates']), 30)
+        self.assertEqual([room['id'] for room in response.data['rooms']], [self.room_a.id, self.room_b.id])
+
+    def test_matrix_rejects_invalid_period(self):
+        response = self.client.get('/api/bookings/availability-matrix/', {'periods': 'am,evening'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class BulkCreateBookingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username='bulk_user',
+            password='password123',
+            email='bulk@example.com',
+        )
+        self.other_user = get_user_model().objects.create_user(
+            username='bulk_other',
+            password='password123',
+            email='bulk_other@example.com',
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.room = Room.objects.create(name='Room A', number_of_desks=3)
+        self.desk_1, self.desk_2, self.desk_3 = self.room.desks.order_by('desk_number')
+        self.start = date.today() + timedelta(days=1)
+
+    def test_bulk_create_inserts_batch_with_constant_query_count(self):
+        payload = [
+            {'desk': self.desk_1.id, 'date': (self.start + timedelta(days=i)).isoformat(), 'period': 'full'}
+            for i in range(20)
+        ]
+
+        # desks, existing bookings, savepoint + INSERT + release, two rollup upserts
+        with self.assertNumQueries(7):
+            response = self.client.post('/api/bookings/bulk-create/', {'bookings': payload}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['summary'], {'total': 20, 'created': 20, 'failed': 0})
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 20)
+
+        created = response.data['created'][0]
+        self.assertEqual(created['desk_number'], 1)
+        self.assertEqual(created['room_name'], 'Room A')
+        self.assertTrue(created['is_mine'])
+        self.assertIsNotNone(created['id'])
+
+    def test_bulk_create_reports_existing_and_in_batch_conflicts(self):
+        Booking.objects.create(user=self.user, desk=self.desk_1, date=self.start, period='am')
+        Booking.objects.create(
+            user=self.other_user, desk=self.desk_2, date=self.start + timedelta(days=1), period='pm',
+        )
+
+        payload = [
+            # clashes with the user's existing AM booking
+            {'desk': self.desk_3.id, 'date': self.start.isoformat(), 'period': 'full'},
+            # free
+            {'desk': self.desk_3.id, 'date': self.start.isoformat(), 'period': 'pm'},
+            # desk 2 already taken for PM by someone else
+            {'desk': self.desk_2.id, 'date': (self.start + timedelta(days=1)).isoformat(), 'period': 'full'},
+            # free, but the next item clashes with it inside the batch
+            {'desk': self.desk_1.id, 'date': (self.start + timedelta(days=2)).isoformat(), 'period': 'am'},
+            {'desk': self.desk_2.id, 'date': (self.start + timedelta(days=2)).isoformat(), 'period': 'full'},
+            # in the past
+            {'desk': self.desk_1.id, 'date': (date.today() - timedelta(days=1)).isoformat(), 'period': 'am'},
+        ]
+
+        response = self.client.post('/api/bookings/bulk-create/', {'bookings': payload}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['summary'], {'total': 6, 'created': 2, 'failed': 4})
+        self.assertEqual(
+            [(item['desk'], item['period']) for item in response.data['created']],
+            [(self.desk_3.id, 'pm'), (self.desk_1.id, 'am')],
+        )
+
+        errors = response.data['errors']
+        self.assertEqual([entry['booking'] for entry in errors], [payload[0], payload[2], payload[4], payload[5]])
+        self.assertEqual(errors[0]['error']['existing_booking']['period'], 'am')
+        self.assertEqual(errors[1]['error']['error'], ['This desk is already booked for this timeslot.'])
+        self.assertEqual(errors[2]['error']['existing_booking']['period'], 'am')
+        self.assertEqual(errors[3]['error'], 'Cannot book a desk in the past')
+
+    def test_bulk_create_returns_400_when_nothing_is_created(self):
+        response = self.client.post(
+            '/api/bookings/bulk-create/',
+            {'bookings': [{'desk': 999999, 'date': self.start.isoformat(), 'period': 'am'}]},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['summary'], {'total': 1, 'created': 0, 'failed': 1})
+        self.assertIn('desk', response.data['errors'][0]['error'])
+
+    def test_bulk_create_reraises_integrity_errors_that_are_not_clashes(self):
+        payload = [{'desk': self.desk_1.id, 'date': self.start.isoformat(), 'period': 'am'}]
+
+        with patch('parcark.services.record_booking_stats', side_effect=IntegrityError('boom')):
+            with self.assertRaisesMessage(IntegrityError, 'boom'):
+                self.client.post('/api/bookings/bulk-create/', {'bookings': payload}, format='json')
+
+        self.assertFalse(Booking.objects.exists())
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class BookingCreateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username='create_user',
+            password='password123',
+            email='create@example.com',
+        )
+        self.other_user = get_user_model().objects.create_user(
+            username='create_other',
+            password='password123',
+            email='create_other@example.com',
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.room = Room.objects.create(name='Room A', number_of_desks=2)
+        self.desk_1, self.desk_2 = self.room.desks.order_by('desk_number')
+        self.day = date.today() + timedelta(days=1)
+
+    def test_create_is_a_single_insert(self):
+        # desk lookup, savepoint + INSERT + release, two rollup upserts
+        with self.assertNumQueries(6):
+            response = self.client.post(
+                '/api/bookings/',
+                {'desk': self.desk_1.id, 'date': self.day.isoformat(), 'period': 'am'},
+                format='json',
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['booking']['room_name'], 'Room A')
+        self.assertTrue(response.data['booking']['is_mine'])
+
+    def test_create_user_clash_returns_existing_booking(self):
+        Booking.objects.create(user=self.user, desk=self.desk_1, date=self.day, period='full')
+
+        response = self.client.post(
+            '/api/bookings/',
+            {'desk': self.desk_2.id, 'date': self.day.isoformat(), 'period': 'pm'},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], ['You already have a booking in this timeslot.'])
+        self.assertEqual(response.data['existing_booking']['period'], 'full')
+        self.assertEqual(response.data['existing_booking']['room_name'], 'Room A')
+
+    def test_create_rejects_full_day_on_partly_booked_desk(self):
+        Booking.objects.create(user=self.other_user, desk=self.desk_1, date=self.day, period='pm')
+
+        response = self.client.post(
+            '/api/bookings/',
+            {'desk': self.desk_1.id, 'date': self.day.isoformat(), 'period': 'full'},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], ['This desk is already booked for this timeslot.'])
+        self.assertEqual(Booking.objects.filter(desk=self.desk_1).count(), 1)
+
+    def test_create_reports_integrity_errors_that_are_not_clashes(self):
+        with patch.object(Booking, 'save', side_effect=IntegrityError('boom')):
+            response = self.client.post(
+                '/api/bookings/',
+                {'desk': self.desk_1.id, 'date': self.day.isoformat(), 'period': 'am'},
+                format='json',
+            )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'boom'})
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Concurrent writers need PostgreSQL')
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class ConcurrentBookingTests(TransactionTestCase):
+    """Many clients race for the same slots; the constraints must let exactly one win."""
+
+    workers = 16
+
+    def setUp(self):
+        User = get_user_model()
+        self.users = [
+            User.objects.create_user(username=f'racer_{i}', password='password123')
+            for i in range(self.workers)
+        ]
+        self.room = Room.objects.create(name='Race Room', number_of_desks=self.workers)
+        self.desks = list(self.room.desks.order_by('desk_number'))
+        self.day = date.today() + timedelta(days=1)
+
+    def _post(self, user, payload):
+        try:
+            client = APIClient()
+            client.force_authenticate(user=user)
+            return client.post('/api/bookings/', payload, format='json').status_code
+        finally:
+            connection.close()
+
+    def test_racing_users_cannot_double_book_a_desk(self):
+        periods = ['am', 'pm', 'full']
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            codes = list(pool.map(
+                lambda i: self._post(self.users[i], {
+                    'desk': self.desks[0].id,
+                    'date': self.day.isoformat(),
+                    'period': periods[i % 3],
+                }),
+                range(self.workers),
+            ))
+
+        bookings = list(Booking.objects.filter(desk=self.desks[0], date=self.day))
+        halves = [half for booking in bookings for half in (['am', 'pm'] if booking.period == 'full' else [booking.period])]
+        self.assertEqual(len(halves), len(set(halves)))
+        self.assertEqual(codes.count(201), len(bookings))
+        self.assertEqual(codes.count(400), self.workers - len(bookings))
+
+    def test_one_user_racing_across_desks_gets_one_booking(self):
+        user = self.users[0]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            codes = list(pool.map(
+                lambda desk: self._post(user, {
+                    'desk': desk.id,
+                    'date': self.day.isoformat(),
+                    'period': 'full',
+                }),
+                self.desks,
+            ))
+
+        self.assertEqual(codes.count(201), 1)
+        self.assertEqual(Booking.objects.filter(user=user, date=self.day).count(), 1)
+
+    def test_auto_assign_gives_racing_users_distinct_desks(self):
+        # Half the desks are gone, so half of the users must be turned away
+        Room.objects.filter(pk=self.room.pk).update(number_of_desks=self.workers // 2)
+        Desk.objects.filter(room=self.room, desk_number__gt=self.workers // 2).update(is_active=False)
+
+        def assign(user):
+            try:
+                client = APIClient()
+                client.force_authenticate(user=user)
+                return client.post('/api/bookings/auto-assign/', {
+                    'room': self.room.id, 'date': self.day.isoformat(), 'period': 'am',
+                }, format='json').status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            codes = list(pool.map(assign, self.users))
+
+        desks = list(Booking.objects.filter(date=self.day).values_list('desk_id', flat=True))
+        self.assertEqual(codes.count(201), self.workers // 2)
+        self.assertEqual(len(desks), len(set(desks)))
+        self.assertEqual(len(desks), self.workers // 2)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class AutoAssignTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='regular', password='password123')
+        self.other_user = get_user_model().objects.create_user(username='other', password='password123')
+        self.client.force_authenticate(user=self.user)
+
+        self.room = Room.objects.create(name='Room A', number_of_desks=3)
+        self.other_room = Room.objects.create(name='Room B', number_of_desks=1)
+        self.desk_1, self.desk_2, self.desk_3 = self.room.desks.order_by('desk_number')
+        self.day = date.today() + timedelta(days=1)
+
+    def assign(self, **data):
+        payload = {'room': self.room.id, 'date': self.day.isoformat(), 'period': 'am'}
+        payload.update(data)
+        payload = {key: value for key, value in payload.items() if value is not None}
+        return self.client.post('/api/bookings/auto-assign/', payload, format='json')
+
+    def test_books_first_free_active_desk(self):
+        Booking.objects.create(user=self.other_user, desk=self.desk_1, date=self.day, period='full')
+        self.desk_2.is_active = False
+        self.desk_2.save()
+
+        response = self.assign()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['booking']['desk'], self.desk_3.id)
+        self.assertTrue(response.data['booking']['is_mine'])
+
+    def test_honours_preferred_desks_in_order(self):
+        Booking.objects.create(user=self.other_user, desk=self.desk_3, date=self.day, period='am')
+
+        response = self.assign(preferred_desks=[self.desk_3.id, self.desk_2.id])
+
+        self.assertEqual(response.data['booking']['desk'], self.desk_2.id)
+
+    def test_spills_over_to_other_rooms(self):
+        Booking.objects.bulk_create([
+            Booking(user=get_user_model().objects.create_user(username=f'holder_{desk.id}'), desk=desk, date=self.day, period='am')
+            for desk in (self.desk_1, self.desk_2, self.desk_3)
+        ])
+
+        response = self.assign(room=None, rooms=[self.room.id, self.other_room.id])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['booking']['room_name'], 'Room B')
+
+    def test_keeps_going_past_desks_booked_meanwhile(self):
+        room = Room.objects.create(name='Room C', number_of_desks=5)
+        *taken, free = room.desks.order_by('desk_number')
+        Booking.objects.bulk_create([
+            Booking(user=get_user_model().objects.create_user(username=f'holder_{desk.id}'), desk=desk, date=self.day, period='am')
+            for desk in taken
+        ])
+
+        # Blind the free-desk read so every taken desk is only found on INSERT
+        with patch('parcark.services.Exists', lambda queryset: Value(False)):
+            response = self.assign(room=room.id)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['booking']['desk'], free.id)
+
+    def test_reraises_integrity_errors_that_are_not_clashes(self):
+        with patch.object(Booking, 'save', side_effect=IntegrityError('boom')):
+            with self.assertRaisesMessage(IntegrityError, 'boom'):
+                self.assign()
+
+    def test_no_free_desk(self):
+        response = self.assign(room=self.other_room.id, period='pm')
+        self.assertEqual(response.status_code, 201)
+
+        self.client.force_authenticate(user=self.other_user)
+        response = self.assign(room=self.other_room.id, period='full')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'No desk is free in the selected rooms for this timeslot.')
+
+    def test_user_already_booked_for_timeslot(self):
+        Booking.objects.create(user=self.user, desk=self.desk_1, date=self.day, period='full')
+
+        response = self.assign(room=self.other_room.id)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('existing_booking', response.data)
+        self.assertFalse(Booking.objects.filter(desk__room=self.other_room).exists())
+
+
+class BookingSlotMaskTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='slots', password='password123')
+        self.other_user = get_user_model().objects.create_user(username='slots_other', password='password123')
+        self.room = Room.objects.create(name='Room A', number_of_desks=3)
+        self.desk_1, self.desk_2, self.desk_3 = self.room.desks.order_by('desk_number')
+        self.day = date.today() + timedelta(days=1)
+
+    def test_slot_mask_is_derived_from_period(self):
+        Booking.objects.create(user=self.user, desk=self.desk_1, date=self.day, period='am')
+        Booking.objects.create(user=self.other_user, desk=self.desk_1, date=self.day, period='pm')
+        Booking.objects.create(user=self.user, desk=self.desk_2, date=self.day + timedelta(days=1), period='full')
+
+        self.assertEqual(
+            sorted(Booking.objects.values_list('period', 'slot_mask')),
+            [('am', 1), ('full', 3), ('pm', 2)],
+        )
+
+    def test_overlaps_lookup_matches_any_shared_slot(self):
+        Booking.objects.create(user=self.user, desk=self.desk_1, date=self.day, period='am')
+        Booking.objects.create(user=self.other_user, desk=self.desk_2, date=self.day, period='full')
+
+        def booked_desks(period):
+            return set(Booking.objects.filter(
+                date=self.day,
+                slot_mask__overlaps=Booking.PERIOD_SLOT_MASKS[period],
+            ).values_list('desk_id', flat=True))
+
+        self.assertEqual(booked_desks('am'), {self.desk_1.id, self.desk_2.id})
+        self.assertEqual(booked_desks('pm'), {self.desk_2.id})
+        self.assertEqual(booked_desks('full'), {self.desk_1.id, self.desk_2.id})
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class BookingCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='pager', password='password123')
+        self.client.force_authenticate(user=self.user)
+
+        self.room = Room.objects.create(name='Room A', number_of_desks=2)
+        self.desk_1, self.desk_2 = self.room.desks.order_by('desk_number')
+        start = date.today() + timedelta(days=1)
+        # Two bookings per day so pages split between rows sharing a date
+        bookings = []
+        for offset in range(4):
+            day = start + timedelta(days=offset)
+            bookings.append(Booking(user=self.user, desk=self.desk_1, date=day, period='am'))
+            bookings.append(Booking(user=self.user, desk=self.desk_2, date=day, period='pm'))
+        Booking.objects.bulk_create(bookings)
+        self.expected = list(
+            Booking.objects.filter(user=self.user).order_by('date', 'period', 'id').values_list('id', flat=True)
+        )
+
+    def _ids(self, response):
+        return [item['id'] for item in response.data['results']]
+
+    def test_walks_forward_and_back_without_counting(self):
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(
+                '/api/bookings/my-bookings/', {'pagination': 'cursor', 'page_size': 3},
+            )
+
+        self.assertEqual(first.status_code, 200)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+        self.assertNotIn('count', first.data)
+        self.assertIsNone(first.data['previous'])
+        self.assertEqual(self._ids(first), self.expected[:3])
+
+        second = self.client.get(first.data['next'])
+        third = self.client.get(second.data['next'])
+        self.assertEqual(self._ids(second), self.expected[3:6])
+        self.assertEqual(self._ids(third), self.expected[6:])
+        self.assertIsNone(third.data['next'])
+
+        back = self.client.get(third.data['previous'])
+        self.assertEqual(self._ids(back), self.expected[3:6])
+        back = self.client.get(back.data['previous'])
+        self.assertEqual(self._ids(back), self.expected[:3])
+        self.assertIsNone(back.data['previous'])
+
+    def test_descending_order_for_past_bookings(self):
+        Booking.objects.filter(user=self.user).update(date=F('date') - timedelta(days=30))
+        expected = list(
+            Booking.objects.filter(user=self.user).order_by('-date', '-period', '-id').values_list('id', flat=True)
+        )
+
+        first = self.client.get('/api/bookings/my-past-bookings/', {'pagination': 'cursor', 'page_size': 5})
+        second = self.client.get(first.data['next'])
+
+        self.assertEqual(self._ids(first) + self._ids(second), expected)
+
+    def test_page_number_pagination_is_still_the_default(self):
+        response = self.client.get('/api/bookings/my-bookings/', {'page_size': 3})
+
+        self.assertEqual(response.data['count'], 8)
+
+    def test_rejects_tampered_cursor(self):
+        response = self.client.get('/api/bookings/', {'pagination': 'cursor', 'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class BookingListSerializationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='lister', password='password123')
+        self.other_user = get_user_model().objects.create_user(username='other', password='password123')
+        self.client.force_authenticate(user=self.user)
+
+        self.room = Room.objects.create(name='Room A', number_of_desks=2)
+        self.desk_1, self.desk_2 = self.room.desks.order_by('desk_number')
+        day = date.today() + timedelta(days=1)
+        Booking.objects.bulk_create([
+            Booking(user=self.user, desk=self.desk_1, date=day, period='am'),
+            Booking(user=self.other_user, desk=self.desk_2, date=day, period='full'),
+        ])
+
+    def test_rows_match_booking_serializer(self):
+        response = self.client.get('/api/bookings/', {'room': self.room.id})
+
+        bookings = Booking.objects.filter(desk__room=self.room).order_by('id')
+        expected = BookingSerializer(bookings, many=True, context={'request': response.wsgi_request}).data
+        results = sorted(response.json()['results'], key=lambda item: item['id'])
+        self.assertEqual(results, [dict(item) for item in expected])
+        self.assertEqual([item['is_mine'] for item in results], [True, False])
+
+    def test_list_does_not_load_related_rows_per_booking(self):
+        # COUNT for the page plus one SELECT for the rows
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/bookings/', {'room': self.room.id})
+
+        self.assertEqual(response.data['count'], 2)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class BookingCountsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='counter', password='password123')
+        self.client.force_authenticate(user=self.user)
+
+        self.room = Room.objects.create(name='Room A', number_of_desks=3)
+        self.desk_1, self.desk_2, self.desk_3 = self.room.desks.order_by('desk_number')
+        self.today = date.today()
+        Booking.objects.bulk_create([
+            Booking(user=self.user, desk=self.desk_1, date=self.today - timedelta(days=2), period='full'),
+            Booking(user=self.user, desk=self.desk_1, date=self.today, period='am'),
+            Booking(user=self.user, desk=self.desk_2, date=self.today + timedelta(days=1), period='full'),
+        ])
+
+    def counts(self):
+        return self.client.get('/api/bookings/my-bookings-count/').data
+
+    def test_counts_with_one_query_then_from_cache(self):
+        with self.assertNumQueries(1):
+            first = self.counts()
+        with self.assertNumQueries(0):
+            second = self.counts()
+
+        self.assertEqual(first, {'upcoming': 2, 'past': 1, 'today': 1, 'total': 3})
+        self.assertEqual(second, first)
+
+    def test_create_bulk_create_and_delete_invalidate(self):
+        self.counts()
+        tomorrow = (self.today + timedelta(days=1)).isoformat()
+
+        self.client.post('/api/bookings/', {'desk': self.desk_3.id, 'date': (self.today + timedelta(days=3)).isoformat(), 'period': 'am'})
+        self.assertEqual(self.counts()['upcoming'], 3)
+
+        self.client.post('/api/bookings/bulk-create/', {'bookings': [
+            {'desk': self.desk_3.id, 'date': (self.today + timedelta(days=4)).isoformat(), 'period': 'am'},
+            {'desk': self.desk_3.id, 'date': (self.today + timedelta(days=5)).isoformat(), 'period': 'pm'},
+        ]}, format='json')
+        self.assertEqual(self.counts()['upcoming'], 5)
+
+        # Queryset deletes (as the admin does) send post_delete per booking
+        Booking.objects.filter(user=self.user, date=tomorrow).delete()
+        self.assertEqual(self.counts(), {'upcoming': 4, 'past': 1, 'today': 1, 'total': 5})
+
+    def test_date_rollover_moves_bookings_to_past_without_recounting(self):
+        self.counts()
+
+        class Tomorrow(date):
+            @classmethod
+            def today(cls):
+                return date.today() + timedelta(days=1)
+
+        with patch('parcark.services.date', Tomorrow), self.assertNumQueries(0):
+            counts = self.counts()
+
+        self.assertEqual(counts, {'upcoming': 1, 'past': 2, 'today': 1, 'total': 3})
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class AvailabilitySnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='viewer', password='password123')
+        self.client.force_authenticate(user=self.user)
+
+        self.room = Room.objects.create(name='Room A', number_of_desks=3)
+        self.other_room = Room.objects.create(name='Room B', number_of_desks=1)
+        self.desk_1, self.desk_2, self.desk_3 = self.room.desks.order_by('desk_number')
+        self.day = date.today() + timedelta(days=1)
+        Booking.objects.create(user=self.user, desk=self.desk_1, date=self.day, period='am')
+
+    def availability(self, period='am', day=None):
+        return self.client.get('/api/bookings/availability/', {
+            'room': self.room.id, 'date': (day or self.day).isoformat(), 'period': period,
+        })
+
+    def test_snapshot_built_in_one_query_then_served_from_cache(self):
+        with self.assertNumQueries(1):
+            first = self.availability()
+        with self.assertNumQueries(0):
+            second = self.availability()
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first.data['total_desks'], 3)
+        self.assertEqual(first.data['booked_desks'], 1)
+        self.assertEqual([desk['id'] for desk in first.data['desks']], [self.desk_2.id, self.desk_3.id])
+        self.assertEqual(first.data['desks'][0]['room_name'], 'Room A')
+        self.assertEqual(self.availability('pm').data['available_desks'], 3)
+
+    def test_booking_changes_invalidate_only_their_room_and_date(self):
+        self.availability('full')
+        self.availability('full', day=self.day + timedelta(days=1))
+
+        response = self.client.post('/api/bookings/', {
+            'desk': self.desk_2.id, 'date': self.day.isoformat(), 'period': 'pm',
+        })
+        self.assertEqual(response.status_code, 201)
+
+        with self.assertNumQueries(0):
+            self.availability('full', day=self.day + timedelta(days=1))
+        self.assertEqual(self.availability('full').data['available_desks'], 1)
+
+        self.client.delete(f"/api/bookings/{response.data['booking']['id']}/")
+        self.assertEqual(self.availability('full').data['available_desks'], 2)
+
+    def test_bulk_create_invalidates(self):
+        self.availability('pm')
+
+        self.client.post('/api/bookings/bulk-create/', {'bookings': [
+            {'desk': self.desk_3.id, 'date': self.day.isoformat(), 'period': 'pm'},
+        ]}, format='json')
+
+        self.assertEqual(self.availability('pm').data['available_desks'], 2)
+
+    def test_desk_deactivation_invalidates_room(self):
+        self.availability()
+
+        self.desk_3.is_active = False
+        self.desk_3.save()
+
+        response = self.availability()
+        self.assertEqual(response.data['total_desks'], 2)
+        self.assertEqual([desk['id'] for desk in response.data['desks']], [self.desk_2.id])
+
+    def test_rejects_unknown_period(self):
+        self.assertEqual(self.availability('evening').status_code, 400)
+
+    def test_metrics_report_hit_rate_for_admins(self):
+        self.availability()
+        self.availability()
+        self.availability()
+
+        self.assertEqual(self.client.get('/api/bookings/availability-metrics/').status_code, 403)
+
+        admin = get_user_model().objects.create_user(username='admin', password='password123', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        metrics = self.client.get('/api/bookings/availability-metrics/').data
+
+        self.assertEqual((metrics['hits'], metrics['misses'], metrics['rebuilds']), (2, 1, 1))
+        self.assertAlmostEqual(metrics['hit_rate'], 0.6667)
+        self.assertGreater(metrics['rebuild_ms_avg'], 0)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class BookingSeriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='regular', password='password123')
+        self.client.force_authenticate(user=self.user)
+
+        self.room = Room.objects.create(name='Room A', number_of_desks=2)
+        self.desk_1, self.desk_2 = self.room.desks.order_by('desk_number')
+        # Start on a Monday a week out so every weekday is in the future
+        today = date.today()
+        self.monday = today + timedelta(days=7 - today.weekday())
+
+    def create_series(self, **overrides):
+        data = {
+            'desk': self.desk_1.id, 'period': 'am', 'weekdays': [1, 3],
+            'start_date': self.monday.isoformat(), 'count': 8,
+        }
+        data.update(overrides)
+        return self.client.post('/api/booking-series/', data, format='json')
+
+    def test_expands_rule_and_inserts_with_constant_query_count(self):
+        # Desk lookups, series INSERT, one conflict read, one booking INSERT,
+        # two rollup upserts, savepoints
+        with self.assertNumQueries(11):
+            response = self.create_series(count=40)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['summary'], {'total': 40, 'created': 40, 'failed': 0})
+        dates = list(Booking.objects.filter(series_id=response.data['series']['id']).values_list('date', flat=True))
+        self.assertEqual(len(dates), 40)
+        self.assertTrue(all(day.weekday() in (1, 3) for day in dates))
+        self.assertEqual(dates[0], self.monday + timedelta(days=1))
+
+    def test_interval_and_end_date(self):
+        response = self.create_series(
+            weekdays=[0], interval=2, count=None,
+            end_date=(self.monday + timedelta(weeks=6)).isoformat(),
+        )
+
+        self.assertEqual(
+            [booking['date'] for booking in response.data['created']],
+            [(self.monday + timedelta(weeks=week)).isoformat() for week in (0, 2, 4, 6)],
+        )
+
+    def test_reports_conflicts_and_books_the_rest(self):
+        taken = self.monday + timedelta(days=3)
+        other = get_user_model().objects.create_user(username='other', password='password123')
+        Booking.objects.create(user=other, desk=self.desk_1, date=taken, period='full')
+
+        response = self.create_series(count=4)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['summary'], {'total': 4, 'created': 3, 'failed': 1})
+        self.assertEqual(response.data['conflicts'][0]['date'], taken)
+        self.assertEqual(
+            response.data['conflicts'][0]['error']['error'], ["This desk is already booked for this timeslot."]
+        )
+
+    def test_nothing_saved_when_every_occurrence_conflicts(self):
+        Booking.objects.create(user=self.user, desk=self.desk_2, date=self.monday + timedelta(days=1), period='full')
+
+        response = self.create_series(count=1)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(response.data['series'])
+        self.assertFalse(self.user.booking_series.exists())
+
+    def test_requires_exactly_one_of_end_date_and_count(self):
+        response = self.create_series(end_date=(self.monday + timedelta(weeks=2)).isoformat())
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_count_cannot_run_past_the_maximum_span(self):
+        response = self.create_series(weekdays=[0], interval=52, count=260)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('count', response.data)
+        self.assertFalse(Booking.objects.exists())
+
+        # 27 Mondays two weeks apart end 364 days after the start, a 28th 378 days
+        response = self.create_series(weekdays=[0], interval=2, count=27)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'][-1]['date'], (self.monday + timedelta(weeks=52)).isoformat())
+        self.assertEqual(self.create_series(weekdays=[0], interval=2, count=28, desk=self.desk_2.id).status_code, 400)
+
+    def test_cancel_deletes_upcoming_bookings_and_keeps_history(self):
+        series_id = self.create_series(count=4).data['series']['id']
+        past = Booking.objects.filter(series_id=series_id).order_by('date').first()
+        Booking.objects.filter(pk=past.pk).update(date=date.today() - timedelta(days=1))
+        self.assertEqual(self.client.get('/api/bookings/my-bookings-count/').data['upcoming'], 3)
+
+        response = self.client.delete(f'/api/booking-series/{series_id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['cancelled'], 3)
+        self.assertEqual(list(Booking.objects.filter(user=self.user).values_list('pk', 'series')), [(past.pk, None)])
+        self.assertEqual(self.client.get('/api/bookings/my-bookings-count/').data['upcoming'], 0)
+
+    def test_cannot_cancel_someone_elses_series(self):
+        series_id = self.create_series(count=2).data['series']['id']
+        other = get_user_model().objects.create_user(username='other', password='password123')
+        self.client.force_authenticate(user=other)
+
+        response = self.client.delete(f'/api/booking-series/{series_id}/')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Booking.objects.filter(series_id=series_id).count(), 2)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class BookingStatsRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='alice', password='password123', department='Research')
+        self.other_user = User.objects.create_user(username='bob', password='password123', department='Finance')
+        self.client.force_authenticate(user=self.user)
+
+        self.room = Room.objects.create(name='Room A', number_of_desks=2)
+        self.other_room = Room.objects.create(name='Room B', number_of_desks=1)
+        self.desk_1, self.desk_2 = self.room.desks.order_by('desk_number')
+        self.desk_3 = self.other_room.desks.get()
+        self.day = date.today() + timedelta(days=1)
+
+    def assertNoDrift(self):
+        self.assertEqual(booking_stats_drift(), {'daily': [], 'monthly': []})
+
+    def test_hooks_keep_rollups_in_step_with_bookings(self):
+        response = self.client.post('/api/bookings/', {'desk': self.desk_1.id, 'date': self.day.isoformat(), 'period': 'am'})
+        booking_id = response.data['booking']['id']
+        self.client.post('/api/bookings/bulk-create/', {'bookings': [
+            {'desk': self.desk_2.id, 'date': (self.day + timedelta(days=offset)).isoformat(), 'period': 'pm'}
+            for offset in range(3)
+        ]}, format='json')
+        Booking.objects.create(user=self.other_user, desk=self.desk_3, date=self.day, period='full')
+        self.assertNoDrift()
+        self.assertEqual(
+            BookingDailyStat.objects.get(date=self.day, room=self.room, period='am', department='Research').bookings, 1,
+        )
+
+        booking = Booking.objects.get(pk=booking_id)
+        booking.desk = self.desk_3
+        booking.date = self.day + timedelta(days=10)
+        booking.period = 'pm'
+        booking.save()
+        self.assertNoDrift()
+
+        self.client.delete(f'/api/bookings/{booking_id}/')
+        Booking.objects.filter(desk=self.desk_2).delete()
+        self.assertNoDrift()
+
+    def test_series_and_user_deletes_keep_rollups_in_step(self):
+        series_id = self.client.post('/api/booking-series/', {
+            'desk': self.desk_1.id, 'period': 'full', 'weekdays': [0, 2, 4],
+            'start_date': self.day.isoformat(), 'count': 9,
+        }, format='json').data['series']['id']
+        self.assertNoDrift()
+
+        self.client.delete(f'/api/booking-series/{series_id}/')
+        self.assertNoDrift()
+
+        Booking.objects.create(user=self.other_user, desk=self.desk_3, date=self.day, period='am')
+        self.other_user.delete()
+        self.assertNoDrift()
+
+    def test_rollups_keep_department_at_booking_time(self):
+        moved = Booking.objects.create(user=self.user, desk=self.desk_1, date=self.day, period='am')
+        deleted = Booking.objects.create(user=self.user, desk=self.desk_2, date=self.day, period='pm')
+        self.user.department = 'Finance'
+        self.user.save()
+
+        moved = Booking.objects.get(pk=moved.pk)
+        self.assertEqual(moved.department, 'Research')
+        moved.date = self.day + timedelta(days=1)
+        moved.save()
+        self.client.delete(f'/api/bookings/{deleted.pk}/')
+        self.client.post('/api/bookings/bulk-create/', {'bookings': [
+            {'desk': self.desk_3.id, 'date': self.day.isoformat(), 'period': 'full'},
+        ]}, format='json')
+
+        self.assertNoDrift()
+        self.assertFalse(BookingDailyStat.objects.filter(bookings__lt=0).exists())
+        self.assertEqual(
+            dict(BookingDailyStat.objects.filter(bookings__gt=0).values_list('date', 'department')),
+            {self.day: 'Finance', self.day + timedelta(days=1): 'Research'},
+        )
+        rebuild_booking_stats()
+        self.assertEqual(
+            dict(BookingDailyStat.objects.values_list('date', 'department')),
+            {self.day: 'Finance', self.day + timedelta(days=1): 'Research'},
+        )
+
+    def test_department_filter_counts_users_by_department_at_booking_time(self):
+        def book(user, desk, day):
+            Booking(user=user, desk=desk, date=day, period='am').save(validate=False)
+
+        # January and February come from the monthly rollup, March from bookings
+        for day in (date(2025, 1, 6), date(2025, 2, 3), date(2025, 3, 3)):
+            book(self.user, self.desk_1, day)
+        self.user.department = 'Finance'
+        self.user.save()
+        for day in (date(2025, 1, 7), date(2025, 3, 4)):
+            book(self.user, self.desk_1, day)
+        book(self.other_user, self.desk_3, date(2025, 1, 6))
+        self.assertNoDrift()
+
+        params = {'start_date': '2025-01-01', 'end_date': '2025-03-15'}
+        for department, total, by_user in (
+            ('Research', 3, {'alice': 3}),
+            ('Finance', 3, {'alice': 2, 'bob': 1}),
+        ):
+            data = self.client.get('/api/analytics/', {**params, 'department': department}).data
+            self.assertEqual(data['totalBookings'], total)
+            self.assertEqual(data['bookingsByDepartment'], {department: total})
+            self.assertEqual({item['username']: item['count'] for item in data['bookingsByUser']}, by_user)
+            self.assertEqual(data['totalUsers'], len(by_user))
+
+    def test_analytics_reads_rollups_with_constant_queries(self):
+        start = date.today() - timedelta(days=400)
+        other = get_user_model().objects.create_user(username='carol', password='password123')
+        Booking.objects.bulk_create([
+            Booking(user=user, desk=desk, date=start + timedelta(days=offset), period=period)
+            for offset in range(0, 400, 3)
+            for user, desk, period in ((self.user, self.desk_1, 'am'), (self.other_user, self.desk_3, 'full'), (other, self.desk_2, 'pm'))
+        ])
+        rebuild_booking_stats()
+        Booking.objects.create(user=self.user, desk=self.desk_2, date=date.today(), period='pm')
+
+        params = {'start_date': (start + timedelta(days=10)).isoformat(), 'end_date': date.today().isoformat()}
+        # daily stat facets (one statement), user months + partial-month
+        # edges, usernames, rooms
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/analytics/', params)
+
+        bookings = Booking.objects.filter(date__gte=params['start_date'], date__lte=params['end_date'])
+        self.assertEqual(response.data['totalBookings'], bookings.count())
+        self.assertEqual(response.data['totalUsers'], 3)
+        self.assertEqual(
+            {item['username']: item['count'] for item in response.data['bookingsByUser']},
+            {
+                username: bookings.filter(user__username=username).count()
+                for username in ('alice', 'bob', 'carol')
+            },
+        )
+        self.assertEqual(response.data['bookingsByRoom'][0], {
+            'name': 'Room A', 'count': bookings.filter(desk__room=self.room).count(),
+        })
+        self.assertEqual(response.data['bookingsByPeriod']['Full Day'], bookings.filter(period='full').count())
+        self.assertEqual(
+            sum(response.data['bookingsByDay'].values()), bookings.count(),
+        )
+        self.assertEqual(response.data['bookingsByDepartment']['Finance'], bookings.filter(period='full').count())
+        self.assertEqual(response.data['trendGranularity'], 'week')
+        self.assertEqual(sum(item['count'] for item in response.data['bookingTrend']), bookings.count())
+
+        filtered = self.client.get('/api/analytics/', {**params, 'department': 'Research'})
+        self.assertEqual(filtered.data['totalBookings'], bookings.filter(user=self.user).count())
+        self.assertEqual([item['username'] for item in filtered.data['bookingsByUser']], ['alice'])
+
+    def test_comparison_matches_separate_overview_with_same_queries(self):
+        start = date.today() - timedelta(days=400)
+        other = get_user_model().objects.create_user(username='carol', password='password123')
+        Booking.objects.bulk_create([
+            Booking(user=user, desk=desk, date=start + timedelta(days=offset), period=period)
+            for offset in range(0, 400, 3)
+            for user, desk, period in ((self.user, self.desk_1, 'am'), (self.other_user, self.desk_3, 'full'), (other, self.desk_2, 'pm'))
+            if offset % 7 or user != other
+        ])
+        rebuild_booking_stats()
+        end = date.today() - timedelta(days=5)
+        params = {'start_date': (end - timedelta(days=59)).isoformat(), 'end_date': end.isoformat(), 'granularity': 'day'}
+
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/analytics/', {**params, 'compare': 'previous'})
+        comparison = response.data['comparison']
+        self.assertEqual(comparison['endDate'], (end - timedelta(days=60)).isoformat())
+        previous = self.client.get('/api/analytics/', {
+            'start_date': comparison['startDate'], 'end_date': comparison['endDate'], 'granularity': 'day',
+        }).data
+
+        self.assertEqual(response.data['totalBookings'], self.client.get('/api/analytics/', params).data['totalBookings'])
+        self.assertEqual(comparison['totalBookings'], {
+            'current': response.data['totalBookings'],
+            'previous': previous['totalBookings'],
+            'delta': response.data['totalBookings'] - previous['totalBookings'],
+            'percent': round((response.data['totalBookings'] - previous['totalBookings']) / previous['totalBookings'] * 100, 1),
+        })
+        self.assertEqual(comparison['totalUsers']['previous'], previous['totalUsers'])
+        self.assertEqual(comparison['averageBookingsPerDay']['previous'], previous['averageBookingsPerDay'])
+        self.assertEqual({day: change['previous'] for day, change in comparison['bookingsByDay'].items()}, previous['bookingsByDay'])
+        self.assertEqual({name: change['previous'] for name, change in comparison['bookingsByPeriod'].items()}, previous['bookingsByPeriod'])
+        self.assertEqual(
+            {name: change['previous'] for name, change in comparison['bookingsByDepartment'].items()},
+            previous['bookingsByDepartment'],
+        )
+        previous_users = {item['username']: item['count'] for item in previous['bookingsByUser']}
+        self.assertEqual(
+            {item['username']: item['previous'] for item in comparison['bookingsByUser']},
+            {item['username']: previous_users.get(item['username'], 0) for item in response.data['bookingsByUser']},
+        )
+        previous_rooms = {item['name']: item['count'] for item in previous['bookingsByRoom']}
+        self.assertEqual(
+            {item['name']: item['previous'] for item in comparison['bookingsByRoom']},
+            {item['name']: previous_rooms.get(item['name'], 0) for item in response.data['bookingsByRoom']},
+        )
+        self.assertEqual([point['previous'] for point in comparison['bookingTrend']], [point['count'] for point in previous['bookingTrend']])
+        self.assertEqual(comparison['bookingTrend'][0]['previousDate'], comparison['startDate'])
+
+        year_ago = self.client.get('/api/analytics/', {**params, 'compare': 'year_ago'}).data['comparison']
+        expected = comparison_window(date.fromisoformat(params['start_date']), end, 'year_ago')
+        self.assertEqual((year_ago['startDate'], year_ago['endDate']), (expected[0].isoformat(), expected[1].isoformat()))
+        self.assertEqual(self.client.get('/api/analytics/', {**params, 'compare': 'lastweek'}).status_code, 400)
+
+    def test_daily_facets_match_separate_queries(self):
+        other = get_user_model().objects.create_user(username='carol', password='password123', department='Research')
+        Booking.objects.bulk_create([
+            Booking(user=user, desk=desk, date=self.day + timedelta(days=offset), period=period)
+            for offset in range(0, 40, 3)
+            for user, desk, period in ((self.user, self.desk_1, 'am'), (self.other_user, self.desk_3, 'full'), (other, self.desk_2, 'pm'))
+        ])
+        rebuild_booking_stats()
+        stats = daily_stats(self.day, self.day + timedelta(days=40))
+
+        with self.assertNumQueries(1):
+            facets = daily_facets(stats, 'week')
+
+        self.assertEqual(facets['weekday'], bookings_by_weekday(stats))
+        self.assertEqual(facets['period'], bookings_by_period(stats))
+        self.assertEqual(facets['room_id'], {row['room_id']: row['count'] for row in bookings_by_room(stats)})
+        self.assertEqual(facets['department'], {'Finance': 14, 'Research': 28})
+        self.assertEqual(facets['total'], 42)
+        self.assertEqual(
+            fill_time_series(facets['bucket'], self.day, self.day + timedelta(days=40), 'week'),
+            booking_time_series(self.day, self.day + timedelta(days=40), 'week'),
+        )
+
+    def test_command_reports_and_fixes_drift(self):
+        Booking.objects.bulk_create([Booking(user=self.user, desk=self.desk_1, date=self.day, period='am')])
+
+        with self.assertRaises(CommandError):
+            call_command('booking_stats', 'check', stdout=StringIO())
+
+        call_command('booking_stats', 'check', '--fix', stdout=StringIO())
+        self.assertNoDrift()
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class BookingTrendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='alice', password='password123')
+        self.client.force_authenticate(user=self.user)
+        self.room = Room.objects.create(name='Room A', number_of_desks=2)
+        self.desk_1, self.desk_2 = self.room.desks.order_by('desk_number')
+        # Monday 2025-01-06 .. Sunday 2025-01-12, then nothing until February
+        Booking.objects.bulk_create([
+            Booking(user=self.user, desk=self.desk_1, date=date(2025, 1, 6), period='am'),
+            Booking(user=self.user, desk=self.desk_2, date=date(2025, 1, 6), period='pm'),
+            Booking(user=self.user, desk=self.desk_1, date=date(2025, 1, 12), period='full'),
+            Booking(user=self.user, desk=self.desk_1, date=date(2025, 2, 3), period='full'),
+        ])
+        rebuild_booking_stats()
+
+    def trend(self, **params):
+        return self.client.get('/api/analytics/trend/', params)
+
+    def test_daily_series_fills_gaps(self):
+        response = self.trend(start_date='2025-01-05', end_date='2025-01-08')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [
+            {'date': 'Jan 05', 'fullDate': '2025-01-05', 'count': 0},
+            {'date': 'Jan 06', 'fullDate': '2025-01-06', 'count': 2},
+            {'date': 'Jan 07', 'fullDate': '2025-01-07', 'count': 0},
+            {'date': 'Jan 08', 'fullDate': '2025-01-08', 'count': 0},
+        ])
+
+    def test_weekly_and_monthly_buckets(self):
+        weekly = self.trend(start_date='2025-01-06', end_date='2025-02-09', granularity='week')
+        self.assertEqual(
+            [(item['fullDate'], item['count']) for item in weekly.data],
+            [('2025-01-06', 3), ('2025-01-13', 0), ('2025-01-20', 0), ('2025-01-27', 0), ('2025-02-03', 1)],
+        )
+
+        monthly = self.trend(start_date='2024-12-15', end_date='2025-02-28', granularity='month')
+        self.assertEqual(
+            [(item['date'], item['count']) for item in monthly.data],
+            [('Dec 2024', 0), ('Jan 2025', 3), ('Feb 2025', 1)],
+        )
+
+    def test_query_count_does_not_grow_with_range(self):
+        with CaptureQueriesContext(connection) as short:
+            self.trend(start_date='2025-01-01', end_date='2025-01-07')
+        with CaptureQueriesContext(connection) as long:
+            response = self.trend(start_date='2024-03-01', end_date='2025-02-28')
+
+        self.assertEqual(len(response.data), 365)
+        self.assertEqual(len(long.captured_queries), len(short.captured_queries))
+
+    def test_rejects_bad_granularity_and_over_long_span(self):
+        self.assertEqual(self.trend(granularity='hour').status_code, 400)
+        self.assertEqual(self.trend(start_date='2020-01-01', end_date='2025-01-01').status_code, 400)
+        self.assertEqual(self.trend(start_date='2020-01-01', end_date='2025-01-01', granularity='month').status_code, 200)
+        self.assertEqual(self.trend(days='week').status_code, 400)
+        self.assertEqual(
+            self.client.get('/api/analytics/', {'start_date': '2025-01-01', 'end_date': '2025-01-31', 'granularity': 'hour'}).status_code,
+            400,
+        )
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class AnalyticsResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='alice', password='password123', is_staff=True)
+        self.client.force_authenticate(user=self.user)
+        self.room = Room.objects.create(name='Room A', number_of_desks=2)
+        self.desk = self.room.desks.order_by('desk_number').first()
+        self.day = date.today() + timedelta(days=1)
+
+    def test_repeat_requests_are_served_from_cache(self):
+        first = self.client.get('/api/analytics/summary/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/analytics/summary/')
+        self.assertEqual(second.data, first.data)
+
+        # Param order and blank params don't change the key
+        self.client.get('/api/analytics/trend/', {'days': 14, 'granularity': 'day'})
+        with self.assertNumQueries(0):
+            self.client.get('/api/analytics/trend/?granularity=day&department=&days=14')
+
+        metrics = self.client.get('/api/analytics/cache-metrics/').data
+        self.assertEqual(metrics['endpoints']['summary'], {'timeout': 300, 'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+        self.assertEqual(metrics['endpoints']['trend']['hits'], 1)
+
+    def test_writes_retire_cached_responses(self):
+        self.assertEqual(self.client.get('/api/analytics/summary/').data['totalBookings'], 0)
+
+        self.client.post('/api/bookings/', {'desk': self.desk.id, 'date': self.day.isoformat(), 'period': 'am'})
+        self.assertEqual(self.client.get('/api/analytics/summary/').data['totalBookings'], 1)
+
+        self.client.post('/api/bookings/bulk-create/', {'bookings': [
+            {'desk': self.desk.id, 'date': self.day.isoformat(), 'period': 'pm'},
+        ]}, format='json')
+        self.assertEqual(self.client.get('/api/analytics/summary/').data['totalBookings'], 2)
+
+        Room.objects.create(name='Room B', number_of_desks=1)
+        self.assertEqual(self.client.get('/api/analytics/summary/').data['totalRooms'], 2)
+
+    def test_logins_do_not_retire_cached_responses(self):
+        self.client.get('/api/analytics/summary/')
+        self.user.last_login = self.user.date_joined
+        self.user.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            self.client.get('/api/analytics/summary/')
+
+    def test_errors_are_not_cached_and_timeout_zero_disables(self):
+        self.client.get('/api/analytics/trend/', {'granularity': 'hour'})
+        self.assertEqual(self.client.get('/api/analytics/trend/', {'granularity': 'hour'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/analytics/cache-metrics/').data['endpoints']['trend']['hits'], 0)
+
+        with self.settings(ANALYTICS_CACHE_TIMEOUTS={'summary': 0}):
+            self.client.get('/api/analytics/summary/')
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get('/api/analytics/summary/')
+        self.assertTrue(queries.captured_queries)
+
+    def test_metrics_are_admin_only(self):
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/analytics/cache-metrics/').status_code, 403)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class UtilizationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='alice', password='password123')
+        self.other_user = get_user_model().objects.create_user(username='bob', password='password123')
+        self.client.force_authenticate(user=self.user)
+        self.room = Room.objects.create(name='Room A', number_of_desks=3)
+        self.other_room = Room.objects.create(name='Room B', number_of_desks=1)
+        self.desk_1, self.desk_2, self.desk_3 = self.room.desks.order_by('desk_number')
+        self.desk_3.is_active = False
+        self.desk_3.save()
+        self.desk_4 = self.other_room.desks.get()
+        # Monday 2025-01-06 .. Sunday 2025-01-12
+        Booking.objects.bulk_create([
+            Booking(user=self.user, desk=self.desk_1, date=date(2025, 1, 6), period='am'),
+            Booking(user=self.user, desk=self.desk_1, date=date(2025, 1, 6), period='pm'),
+            Booking(user=self.user, desk=self.desk_2, date=date(2025, 1, 7), period='full'),
+            Booking(user=self.other_user, desk=self.desk_4, date=date(2025, 1, 7), period='am'),
+            # Weekend and inactive desk: outside the capacity, not counted
+            Booking(user=self.user, desk=self.desk_1, date=date(2025, 1, 11), period='am'),
+            Booking(user=self.other_user, desk=self.desk_3, date=date(2025, 1, 8), period='full'),
+        ])
+
+    def utilization(self, **params):
+        return self.client.get('/api/analytics/utilization/', {'start_date': '2025-01-06', 'end_date': '2025-01-12', **params})
+
+    def test_utilization_cuts(self):
+        with self.assertNumQueries(2):
+            response = self.utilization()
+
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual((data['workingDays'], data['slotsPerDay']), (5, 2))
+        # 5 booked slots of 3 active desks x 5 days x 2 slots
+        self.assertEqual(data['overall'], {'bookedSlots': 5, 'capacitySlots': 30, 'utilization': 0.1667})
+        self.assertEqual(
+            [(room['name'], room['desks'], room['bookedSlots'], room['utilization']) for room in data['byRoom']],
+            [('Room A', 2, 4, 0.2), ('Room B', 1, 1, 0.1)],
+        )
+        self.assertEqual(data['byWeekday'], {
+            'Monday': 0.3333, 'Tuesday': 0.5, 'Wednesday': 0.0, 'Thursday': 0.0, 'Friday': 0.0,
+        })
+        self.assertEqual(data['byPeriod'], {'am': 0.2, 'pm': 0.1333})
+        self.assertEqual([desk['utilization'] for desk in data['byDesk']], [0.2, 0.2, 0.1])
+        self.assertEqual(data['heatmap']['desks'], [self.desk_1.id, self.desk_2.id, self.desk_4.id])
+        self.assertEqual(data['heatmap']['dates'][0], '2025-01-06')
+        self.assertEqual(data['heatmap']['bookedSlots'][0], [2, 0, 0, 0, 0])
+        self.assertEqual(data['heatmap']['bookedSlots'][1], [0, 2, 0, 0, 0])
+
+    def test_room_and_weekday_filters(self):
+        data = self.utilization(rooms=str(self.room.id), weekdays='5,6').data
+
+        self.assertEqual(data['workingDays'], 2)
+        self.assertEqual(data['overall'], {'bookedSlots': 1, 'capacitySlots': 8, 'utilization': 0.125})
+        self.assertEqual(list(data['byWeekday']), ['Saturday', 'Sunday'])
+
+    def test_rejects_bad_params(self):
+        self.assertEqual(self.utilization(weekdays='7').status_code, 400)
+        self.assertEqual(self.utilization(rooms='a').status_code, 400)
+        self.assertEqual(self.utilization(start_date='2024-01-01', end_date='2025-06-01').status_code, 400)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class BookingExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        User = get_user_model()
+        self.admin = User.objects.create_user(username='admin', password='password123', is_staff=True, department='Facilities')
+        self.client.force_authenticate(user=self.admin)
+        self.room = Room.objects.create(name='Room, "A"', number_of_desks=2)
+        self.desk_1, self.desk_2 = self.room.desks.order_by('desk_number')
+        self.day = date.today() + timedelta(days=1)
+        self.bookings = Booking.objects.bulk_create([
+            Booking(user=self.admin, desk=self.desk_1, date=self.day, period='am'),
+            Booking(user=self.admin, desk=self.desk_2, date=self.day, period='pm'),
+            Booking(user=self.admin, desk=self.desk_1, date=self.day + timedelta(days=5), period='full'),
+        ])
+
+    def export(self, **params):
+        return self.client.get('/api/bookings/export/', params)
+
+    def test_csv_export_streams_filtered_rows(self):
+        response = self.export(start_date=self.day.isoformat(), end_date=self.day.isoformat())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn(f'bookings-{self.day.isoformat()}-{self.day.isoformat()}.csv', response['Content-Disposition'])
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:5], ['id', 'date', 'period', 'room_id', 'room_name'])
+        self.assertEqual(
+            [(row[0], row[1], row[2], row[4], row[9]) for row in rows[1:]],
+            [
+                (str(self.bookings[0].id), self.day.isoformat(), 'am', 'Room, "A"', 'Facilities'),
+                (str(self.bookings[1].id), self.day.isoformat(), 'pm', 'Room, "A"', 'Facilities'),
+            ],
+        )
+
+    def test_exports_department_at_booking_time(self):
+        self.admin.department = 'Research'
+        self.admin.save()
+
+        response = self.export(format='ndjson')
+
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual({line['department'] for line in lines}, {'Facilities'})
+
+    def test_ndjson_export(self):
+        response = self.export(format='ndjson', desk=self.desk_1.id)
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(line['id'], line['period']) for line in lines], [
+            (self.bookings[0].id, 'am'), (self.bookings[2].id, 'full'),
+        ])
+        self.assertEqual(lines[0]['username'], 'admin')
+        self.assertIsNone(lines[0]['series_id'])
+
+    def test_empty_csv_export_has_header(self):
+        response = self.export(start_date='2000-01-01', end_date='2000-01-02')
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(), [
+            ','.join(name for name, _ in EXPORT_COLUMNS),
+        ])
+
+    def test_rejects_bad_params_and_non_admins(self):
+        self.assertEqual(self.export(start_date='tomorrow').status_code, 400)
+        self.assertEqual(self.export(room='a').status_code, 400)
+        self.assertEqual(self.export(format='xml').status_code, 404)
+
+        self.client.force_authenticate(user=get_user_model().objects.create_user(username='bob', password='password123'))
+        self.assertEqual(self.export().status_code, 403)
+
+    @skipUnless(os.path.exists('/proc/self/statm'), 'Reads resident memory from /proc')
+    def test_streams_millions_of_rows_in_bounded_memory(self):
+        pulled = 0
+
+        def rows():
+            nonlocal pulled
+            for i in range(2_000_000):
+                pulled += 1
+                yield (i, self.day, 'am', 1, 'Room A', i % 500, i % 20, i % 3000, 'user', 'Research', None, self.day)
+
+        def resident():
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+        stream = csv_stream(rows())
+        total = len(next(stream))
+        # Nothing is read ahead of the block being written
+        self.assertEqual(pulled, EXPORT_CHUNK_SIZE)
+        baseline = peak = resident()
+        for block in stream:
+            total += len(block)
+            peak = max(peak, resident())
+
+        self.assertEqual(pulled, 2_000_000)
+        self.assertGreater(total, 100 * 1024 * 1024)
+        self.assertLess(peak - baseline, 16 * 1024 * 1024)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class AnalyticsViewsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='alice', password='password123', department='Research')
+        self.other_user = User.objects.create_user(username='bob', password='password123', department='Finance')
+        self.client.force_authenticate(user=self.user)
+        self.room = Room.objects.create(name='Room A', number_of_desks=2)
+        self.desk_1, self.desk_2 = self.room.desks.order_by('desk_number')
+        day = date.today() + timedelta(days=1)
+        for offset in range(3):
+            Booking.objects.create(user=self.user, desk=self.desk_1, date=day + timedelta(days=offset), period='am')
+        Booking.objects.create(user=self.other_user, desk=self.desk_2, date=day, period='full')
+
+    def analytics(self):
+        cache.clear()
+        return [
+            self.client.get(path).data
+            for path in ('/api/analytics/', '/api/analytics/by-user/', '/api/analytics/summary/')
+        ]
+
+    @override_settings(ANALYTICS_SOURCE='views')
+    def test_falls_back_to_rollups_until_views_are_populated(self):
+        self.assertEqual(stat_models(), (BookingDailyStat, BookingUserMonthlyStat))
+        self.assertEqual(self.analytics()[2]['totalBookings'], 4)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Materialized views need PostgreSQL')
+    def test_views_match_rollups_after_refresh(self):
+        expected = self.analytics()
+        call_command('analytics_views', 'refresh', stdout=StringIO())
+
+        with self.settings(ANALYTICS_SOURCE='views'):
+            self.assertEqual(stat_models(), (BookingDailyView, BookingUserMonthlyView))
+            self.assertEqual(self.analytics(), expected)
+
+            # Views lag writes until the next refresh, which is concurrent now
+            Booking.objects.create(user=self.other_user, desk=self.desk_1, date=date.today(), period='pm')
+            self.assertEqual(self.analytics()[2]['totalBookings'], 4)
+            call_command('analytics_views', 'refresh', stdout=StringIO())
+            self.assertEqual(self.analytics()[2]['totalBookings'], 5)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Materialized views need PostgreSQL')
+    def test_status_command(self):
+        with self.assertRaises(CommandError):
+            call_command('analytics_views', 'status', stdout=StringIO())
+        call_command('analytics_views', 'refresh', '--no-concurrent', stdout=StringIO())
+        call_command('analytics_views', 'status', stdout=StringIO())
+
+    @skipUnless(connection.vendor == 'sqlite', 'Checks the non-PostgreSQL error')
+    def test_command_needs_postgresql(self):
+        with self.assertRaises(CommandError):
+            call_command('analytics_views', 'refresh', stdout=StringIO())
+
+
+class AnalyticsJobTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='alice', password='password123', department='Research')
+        self.other_user = User.objects.create_user(username='bob', password='password123', department='Finance')
+        self.client.force_authenticate(user=self.user)
+        room = Room.objects.create(name='Room A', number_of_desks=2)
+        desk_1, desk_2 = room.desks.order_by('desk_number')
+        for offset in range(0, 200, 9):
+            Booking.objects.create(user=self.user, desk=desk_1, date=date.today() + timedelta(days=offset), period='am')
+            Booking.objects.create(user=self.other_user, desk=desk_2, date=date.today() + timedelta(days=offset), period='full')
+        self.params = {'start_date': date.today().isoformat(), 'end_date': (date.today() + timedelta(days=200)).isoformat()}
+
+    def run_worker(self):
+        call_command('analytics_worker', '--once', stdout=StringIO())
+
+    def test_job_result_matches_synchronous_overview(self):
+        response = self.client.post('/api/analytics/jobs/', self.params, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertIsNone(response.data['result'])
+        path = f"/api/analytics/jobs/{response.data['id']}/"
+
+        seen = []
+
+        def overview(*args, progress, **kwargs):
+            def report(done, total):
+                progress(done, total)
+                seen.append(AnalyticsJob.objects.get(pk=response.data['id']).progress)
+            return analytics_overview(*args, progress=report, **kwargs)
+
+        with patch('parcark.jobs.analytics_overview', overview):
+            self.run_worker()
+        # 201 days in three-month chunks
+        self.assertEqual(seen, [33, 66, 100])
+
+        job = self.client.get(path)
+        self.assertEqual(job.status_code, 200)
+        self.assertEqual(job.data['status'], 'done')
+        self.assertEqual(job.data['progress'], 100)
+        self.assertIsNotNone(job.data['finished_at'])
+        expected = self.client.get('/api/analytics/', self.params).data
+        self.assertEqual(job.data['result'], json.loads(json.dumps(expected)))
+        self.assertEqual(job.data['result']['totalBookings'], 46)
+
+    def test_identical_requests_reuse_job(self):
+        first = self.client.post('/api/analytics/jobs/', self.params, format='json')
+        pending = self.client.post('/api/analytics/jobs/', self.params, format='json')
+        self.assertEqual(pending.status_code, 202)
+        self.assertEqual(pending.data['id'], first.data['id'])
+
+        self.run_worker()
+        self.client.force_authenticate(user=self.other_user)
+        with self.assertNumQueries(1):
+            done = self.client.post('/api/analytics/jobs/', self.params, format='json')
+        self.assertEqual(done.status_code, 200)
+        self.assertEqual(done.data['id'], first.data['id'])
+        self.assertEqual(done.data['status'], 'done')
+
+        # Other params, or a result past its reuse window, queue a new job
+        other = self.client.post('/api/analytics/jobs/', {**self.params, 'department': 'Finance'}, format='json')
+        self.assertNotEqual(other.data['id'], first.data['id'])
+        AnalyticsJob.objects.filter(pk=first.data['id']).update(
+            finished_at=F('finished_at') - ANALYTICS_JOB_REUSE_FOR,
+        )
+        again = self.client.post('/api/analytics/jobs/', self.params, format='json')
+        self.assertEqual(again.status_code, 202)
+        self.assertNotEqual(again.data['id'], first.data['id'])
+        self.assertEqual(AnalyticsJob.objects.filter(status='queued').count(), 2)
+
+    def test_invalid_params_and_unknown_job(self):
+        response = self.client.post('/api/analytics/jobs/', {'start_date': '2025-13-01'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/analytics/jobs/', {'granularity': 'hour'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        for name, value in (('granularity', ['day']), ('department', {'name': 'Research'}), ('compare', 1)):
+            response = self.client.post('/api/analytics/jobs/', {name: value}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data['error'], f'{name} must be a string.')
+        self.assertFalse(AnalyticsJob.objects.exists())
+
+        self.assertEqual(self.client.get('/api/analytics/jobs/00000000-0000-0000-0000-000000000000/').status_code, 404)
+        self.client.force_authenticate(user=None)
+        self.assertIn(self.client.post('/api/analytics/jobs/', self.params, format='json').status_code, (401, 403))
+
+    def test_failed_job_records_error(self):
+        job = self.client.post('/api/analytics/jobs/', self.params, format='json').data
+        with patch('parcark.jobs.analytics_overview', side_effect=RuntimeError('boom')), self.assertLogs('parcark.jobs', 'ERROR'):
+            self.run_worker()
+        response = self.client.get(f"/api/analytics/jobs/{job['id']}/")
+        self.assertEqual(response.data['status'], 'failed')
+        self.assertEqual(response.data['error'], 'boom')
+        self.assertIsNone(response.data['result'])
+        # Nothing left to claim
+        self.assertIsNone(claim_analytics_job())
+
+    def test_stale_jobs_are_retried_until_out_of_attempts(self):
+        job_id = self.client.post('/api/analytics/jobs/', self.params, format='json').data['id']
+        job = claim_analytics_job()
+        self.assertEqual((str(job.pk), job.attempts), (job_id, 1))
+
+        # Started long ago but still reporting progress: not taken over
+        AnalyticsJob.objects.filter(pk=job_id).update(started_at=F('started_at') - ANALYTICS_JOB_STALE_AFTER * 4)
+        self.assertIsNone(claim_analytics_job())
+
+        for attempt in range(2, ANALYTICS_JOB_MAX_ATTEMPTS + 1):
+            AnalyticsJob.objects.filter(pk=job_id).update(heartbeat_at=F('heartbeat_at') - ANALYTICS_JOB_STALE_AFTER * 2)
+            retried = claim_analytics_job()
+            self.assertEqual((str(retried.pk), retried.attempts), (job_id, attempt))
+
+        # The first worker finds its claim gone and leaves the row alone
+        with self.assertLogs('parcark.jobs', 'WARNING'):
+            run_analytics_job(job)
+        self.assertEqual(AnalyticsJob.objects.get(pk=job_id).status, 'running')
+
+        AnalyticsJob.objects.filter(pk=job_id).update(heartbeat_at=F('heartbeat_at') - ANALYTICS_JOB_STALE_AFTER * 2)
+        self.assertIsNone(claim_analytics_job())
+        job = AnalyticsJob.objects.get(pk=job_id)
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('stopped responding', job.error)
+
+
+class BookingPartitionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='alice', password='password123')
+        self.client.force_authenticate(user=self.user)
+        room = Room.objects.create(name='Room A', number_of_desks=2)
+        self.desk_1, self.desk_2 = room.desks.order_by('desk_number')
+
+        self.old_month = add_months(date.today(), -14)
+        self.tomorrow = date.today() + timedelta(days=1)
+        Booking.objects.bulk_create([
+            Booking(user=self.user, desk=self.desk_1, date=self.old_month, period='am'),
+            Booking(user=self.user, desk=self.desk_2, date=self.old_month + timedelta(days=10), period='full'),
+            Booking(user=self.user, desk=self.desk_1, date=self.tomorrow, period='pm'),
+        ])
+        rebuild_booking_stats()
+
+    def partition_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text, COUNT(*) FROM parcark_booking GROUP BY 1')
+            return dict(cursor.fetchall())
+
+    def create_old_partitions(self):
+        call_command('booking_partitions', 'create', '--start', self.old_month.isoformat(), stdout=StringIO())
+
+    @skipUnless(connection.vendor == 'postgresql', 'Partitioning needs PostgreSQL')
+    def test_create_moves_bookings_out_of_default_partition(self):
+        self.assertTrue(bookings_partitioned())
+        recent = partition_name(self.tomorrow.replace(day=1))
+        self.assertEqual(self.partition_rows(), {DEFAULT_PARTITION: 2, recent: 1})
+
+        self.create_old_partitions()
+        self.assertEqual(self.partition_rows(), {partition_name(self.old_month): 2, recent: 1})
+        out = StringIO()
+        call_command('booking_partitions', 'create', '--start', self.old_month.isoformat(), stdout=out)
+        self.assertIn('already exist', out.getvalue())
+
+        # Date filters only touch the matching partition
+        plan = Booking.objects.filter(date=self.tomorrow).explain()
+        self.assertIn(recent, plan)
+        self.assertNotIn(partition_name(self.old_month), plan)
+        # Long ranges read across partitions
+        response = self.client.get('/api/bookings/my-past-bookings/')
+        self.assertEqual(response.data['count'], 2)
+        # Overlap constraints still hold in the moved rows
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Booking.objects.bulk_create([Booking(user=self.user, desk=self.desk_1, date=self.old_month, period='full')])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Partitioning needs PostgreSQL')
+    def test_archive_detaches_old_months_and_keeps_analytics(self):
+        self.create_old_partitions()
+        self.assertEqual(self.client.get('/api/analytics/summary/').data['totalBookings'], 3)
+
+        call_command('booking_partitions', 'archive', '--keep-months', '12', stdout=StringIO())
+        archived = dict(archived_booking_partitions())
+        self.assertIn(partition_name(self.old_month, ARCHIVE_PREFIX), archived)
+        self.assertNotIn(partition_name(self.old_month), self.partition_rows())
+        self.assertEqual(self.client.get('/api/bookings/my-past-bookings/').data['count'], 0)
+
+        # Rollups still count archived months, and the drift check skips them
+        self.assertEqual(self.client.get('/api/analytics/summary/').data['totalBookings'], 3)
+        call_command('booking_stats', 'check', stdout=StringIO())
+        # Archived rows don't pin their users
+        self.user.delete()
+
+    @skipUnless(connection.vendor == 'postgresql', 'Partitioning needs PostgreSQL')
+    def test_status(self):
+        out = StringIO()
+        call_command('booking_partitions', 'status', stdout=out)
+        self.assertIn(DEFAULT_PARTITION, out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('booking_partitions', 'archive', stdout=StringIO())
+
+    @skipUnless(connection.vendor == 'sqlite', 'Checks the non-PostgreSQL error')
+    def test_command_needs_postgresql(self):
+        self.assertFalse(bookings_partitioned())
+        with self.assertRaises(CommandError):
+            call_command('booking_partitions', 'create', stdout=StringIO())
+
+
+class DeskProvisioningTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='alice', password='password123')
+        self.room = Room.objects.create(name='Room A', number_of_desks=5)
+
+    def resize(self, room, desks):
+        room.number_of_desks = desks
+        room.save()
+        return sorted(room.desks.values_list('desk_number', flat=True))
+
+    def test_room_desks_are_created_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as small:
+            Room.objects.create(name='Room B', number_of_desks=2)
+        with CaptureQueriesContext(connection) as large:
+            room = Room.objects.create(name='Room C', number_of_desks=100)
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(room.desks.count(), 100)
+        self.assertEqual(room.desks.get(desk_number=100).location_description, 'Desk 100')
+
+    def test_shrinking_keeps_booked_desks_and_growing_fills_gaps(self):
+        Booking.objects.create(user=self.user, desk=self.room.desks.get(desk_number=5), date=date.today(), period='am')
+
+        room = Room.objects.create(name='Room B', number_of_desks=100)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.resize(self.room, 2), [1, 5])
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.resize(room, 1), [1])
+        self.assertEqual(len(large), len(small))
+
+        self.assertEqual(self.resize(self.room, 4), [1, 2, 3, 5])
+        self.assertEqual(self.resize(self.room, 6), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(self.resize(self.room, 1), [5])
+
+    def test_command_resizes_many_rooms(self):
+        other = Room.objects.create(name='Room B', number_of_desks=1)
+        Booking.objects.bulk_create([
+            Booking(user=self.user, desk=desk, date=date.today() + timedelta(days=desk.desk_number), period='am')
+            for desk in self.room.desks.filter(desk_number__gte=2)
+        ])
+
+        out = StringIO()
+        call_command('provision_desks', str(self.room.pk), str(other.pk), '--desks', '3', stdout=out)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.number_of_desks, 3)
+        self.assertEqual(sorted(self.room.desks.values_list('desk_number', flat=True)), [2, 3, 4, 5])
+        self.assertEqual(other.desks.count(), 3)
+        self.assertIn('2 desks added, 1 removed', out.getvalue())
+        self.assertIn('Room A: keeps 4 desks', out.getvalue())
+
+        # Without --desks, every room is brought back to its number_of_desks
+        Desk.objects.filter(room=other).delete()
+        call_command('provision_desks', stdout=StringIO())
+        self.assertEqual(other.desks.count(), 3)
+
+        for args in (['--desks', '0'], ['999']):
+            with self.assertRaises(CommandError):
+                call_command('provision_desks', *args, stdout=StringIO())
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='alice', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.room = Room.objects.create(name='Room A', number_of_desks=2)
+        self.other_room = Room.objects.create(name='Room B', number_of_desks=1)
+
+    def assertRevalidates(self, url):
+        """The URL answers 304 for its own ETag in at most one query and returns the response"""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertLessEqual(len(queries), 1)
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertLessEqual(len(queries), 1)
+        return response
+
+    def assertChanged(self, url, response):
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_rooms(self):
+        listing = self.assertRevalidates('/api/rooms/')
+        detail = self.assertRevalidates(f'/api/rooms/{self.other_room.pk}/')
+
+        self.room.name = 'Room A2'
+        self.room.save()
+        self.assertChanged('/api/rooms/', listing)
+        self.assertRevalidates(f'/api/rooms/{self.other_room.pk}/')
+
+        listing = self.assertRevalidates('/api/rooms/')
+        self.other_room.delete()
+        self.assertChanged('/api/rooms/', listing)
+        self.assertEqual(self.client.get(f'/api/rooms/{self.other_room.pk}/', HTTP_IF_NONE_MATCH=detail['ETag']).status_code, 404)
+        self.assertEqual(self.client.get('/api/rooms/abc/').status_code, 404)
+
+    def test_desks_of_a_room(self):
+        url = f'/api/desks/?room={self.room.pk}'
+        listing = self.assertRevalidates(url)
+        other_listing = self.assertRevalidates(f'/api/desks/?room={self.other_room.pk}')
+        desk = self.room.desks.get(desk_number=2)
+        self.assertRevalidates(f'/api/desks/{desk.pk}/')
+
+        desk.is_active = False
+        desk.save()
+        self.assertChanged(url, listing)
+        self.assertEqual(len(self.client.get(url).data), 1)
+        self.assertEqual(self.client.get(f'/api/desks/{desk.pk}/').status_code, 404)
+        self.assertEqual(
+            self.client.get(f'/api/desks/?room={self.other_room.pk}', HTTP_IF_NONE_MATCH=other_listing['ETag']).status_code,
+            304,
+        )
+
+        # room_name is part of each desk
+        listing = self.assertRevalidates(url)
+        self.room.name = 'Room A2'
+        self.room.save()
+        self.assertChanged(url, listing)
+
+        # Desks added in bulk by a resize
+        listing = self.assertRevalidates(url)
+        self.room.number_of_desks = 5
+        self.room.save()
+        self.assertChanged(url, listing)
+
+    def test_room_layout(self):
+        url = f'/api/room-layouts/{self.room.pk}/'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.assertRevalidates(url)
+
+        layout = RoomLayout.objects.get(room=self.room)
+        layout.canvas_width = 1200
+        layout.save()
+        self.assertChanged(url, response)
+        self.assertEqual(self.client.get(url).data['canvas_width'], 1200)
+        self.assertEqual(self.client.get('/api/room-layouts/999999/').status_code, 404)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend'])
+class RoomImageRenditionTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.admin = get_user_model().objects.create_user(username='admin', password='password123', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.room = Room.objects.create(name='Room A', number_of_desks=1)
+
+    def upload(self, size=(2000, 1000), image_format='JPEG', name='photo.jpg', content_type='image/jpeg', room=None):
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 120, 40)).save(buffer, image_format)
+        return self.client.patch(
+            f'/api/rooms/{(room or self.room).pk}/',
+            {'image': SimpleUploadedFile(name, buffer.getvalue(), content_type=content_type)},
+            format='multipart',
+        )
+
+    def media_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), self.media_root)
+            for directory, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def test_worker_renders_variants_exposed_as_srcset(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['image_variants'], {'pending': True, 'renditions': [], 'srcset': {}})
+
+        call_command('image_worker', '--once', stdout=StringIO())
+        variants = self.client.get(f'/api/rooms/{self.room.pk}/').data['image_variants']
+        self.assertFalse(variants['pending'])
+        self.assertEqual([item['name'] for item in variants['renditions']], list(RENDITION_WIDTHS))
+        self.assertEqual(
+            [(item['width'], item['height']) for item in variants['renditions']],
+            [(160, 80), (480, 240), (1600, 800)],
+        )
+        mime_types = {'image/jpeg', 'image/webp'} | ({'image/avif'} if 'AVIF' in rendition_formats('JPEG') else set())
+        self.assertEqual(set(variants['srcset']), mime_types)
+        self.assertTrue(variants['srcset']['image/webp'].endswith('.full.webp 1600w'))
+        self.assertEqual(len(self.media_files()), 1 + 3 * len(mime_types))
+
+        # Nothing left to render
+        self.assertEqual(call_command('image_worker', '--once', stdout=StringIO()), None)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.rendered_image, self.room.image.name)
+
+    def test_small_images_are_not_upscaled(self):
+        self.upload(size=(300, 200), image_format='PNG', name='photo.png', content_type='image/png')
+        call_command('image_worker', '--once', stdout=StringIO())
+        variants = self.client.get(f'/api/rooms/{self.room.pk}/').data['image_variants']
+        self.assertEqual([item['width'] for item in variants['renditions']], [160, 300, 300])
+        self.assertEqual(variants['srcset']['image/png'].count('w,'), 1)
+
+    def test_replacing_and_removing_the_image_deletes_variants(self):
+        self.upload()
+        call_command('image_worker', '--once', stdout=StringIO())
+        first = self.media_files()
+
+        # The new upload reuses the old names; old files are gone before it is stored
+        self.upload(size=(800, 800))
+        self.assertEqual(self.media_files(), [Room.objects.get(pk=self.room.pk).image.name])
+        self.assertTrue(self.client.get(f'/api/rooms/{self.room.pk}/').data['image_variants']['pending'])
+        call_command('image_worker', '--once', stdout=StringIO())
+        self.assertEqual(len(self.media_files()), len(first))
+
+        response = self.client.delete(f'/api/rooms/{self.room.pk}/remove-image/')
+        self.assertIsNone(response.data['image_variants'])
+        self.assertEqual(self.media_files(), [])
+
+        self.upload()
+        call_command('image_worker', '--once', stdout=StringIO())
+        self.room.refresh_from_db()
+        self.room.delete()
+        self.assertEqual(self.media_files(), [])
+
+    def test_images_are_named_by_content_and_deduplicated(self):
+        other = Room.objects.create(name='Room B', number_of_desks=1)
+        first = self.upload().data['image_url']
+        self.assertRegex(first, r'/media/rooms/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(self.upload(room=other).data['image_url'], first)
+        self.assertEqual(len(self.media_files()), 1)
+
+        call_command('image_worker', '--once', stdout=StringIO())
+        self.room.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(other.image_variants, self.room.image_variants)
+        rendered = len(self.media_files())
+
+        # Still used by the other room
+        self.client.delete(f'/api/rooms/{self.room.pk}/remove-image/')
+        self.assertEqual(len(self.media_files()), rendered)
+        self.assertNotEqual(self.upload(size=(900, 900), room=other).data['image_url'], first)
+        self.assertNotIn(os.path.relpath(first.split('/media/')[1]), self.media_files())
+
+    def test_media_is_served_immutable_to_signed_in_users(self):
+        self.upload()
+        name = Room.objects.get(pk=self.room.pk).image.name
+        client = self.client_class()
+        self.assertEqual(client.get(f'/media/{name}').status_code, 403)
+
+        client.force_login(self.admin)
+        response = client.get(f'/media/{name}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content)[:2], b'\xff\xd8')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+        # Behind nginx the file is handed over with X-Accel-Redirect
+        response = client.get(f'/media/{name}', HTTP_X_SENDFILE_TYPE='X-Accel-Redirect')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{name}')
+        self.assertEqual(response.content, b'')
+        self.assertNotIn('Content-Type', response)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(client.get('/media/../manage.py', HTTP_X_SENDFILE_TYPE='X-Accel-Redirect').status_code, 404)
+        self.assertEqual(client.get('/media/rooms/missing.jpg').status_code, 404)
+
+
+class RoomBootstrapTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='alice', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.room = Room.objects.create(name='Room A', number_of_desks=3)
+        self.room.desks.filter(desk_number=3).update(is_active=False)
+        RoomLayout.objects.create(room=self.room, updated_by=self.user)
+        self.day = date.today() + timedelta(days=1)
+        Booking.objects.create(user=self.user, desk=self.room.desks.get(desk_number=1), date=self.day, period='am')
+        cache.clear()
+
+    def test_matches_separate_endpoints_in_fixed_queries(self):
+        url = f'/api/rooms/{self.room.pk}/bootstrap/'
+        params = {'date': self.day.isoformat(), 'period': 'am'}
+        with self.assertNumQueries(3):
+            data = self.client.get(url, params).data
+        # The availability snapshot is cached now
+        with self.assertNumQueries(2):
+            self.client.get(url, params)
+
+        self.assertEqual(data['room'], self.client.get(f'/api/rooms/{self.room.pk}/').data)
+        self.assertEqual(data['desks'], self.client.get('/api/desks/', {'room': self.room.pk}).data)
+        self.assertEqual([desk['room_name'] for desk in data['desks']], ['Room A', 'Room A'])
+        self.assertEqual(data['layout'], self.client.get(f'/api/room-layouts/{self.room.pk}/').data)
+        self.assertEqual(
+            data['availability'],
+            self.client.get('/api/bookings/availability/', {'room': self.room.pk, **params}).data,
+        )
+        self.assertEqual(data['availability']['available_desks'], 1)
+
+    def test_optional_date_and_missing_layout(self):
+        other = Room.objects.create(name='Room B', number_of_desks=1)
+        data = self.client.get(f'/api/rooms/{other.pk}/bootstrap/').data
+        self.assertIsNone(data['layout'])
+        self.assertIsNone(data['availability'])
+        self.assertEqual(len(data['desks']), 1)
+        self.assertFalse(RoomLayout.objects.filter(room=other).exists())
+
+        self.assertEqual(self.client.get(f'/api/rooms/{other.pk}/bootstrap/', {'date': 'tomorrow'}).status_code, 400)
+        self.assertEqual(self.client.get(f'/api/rooms/{other.pk}/bootstrap/', {'period': 'night'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/rooms/999999/bootstrap/').status_code, 404)
+        self.assertEqual(self.client.get('/api/rooms/abc/bootstrap/').status_code, 404)
@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     register_view, login_view, logout_view, current_user_view,
-    UserViewSet, RoomViewSet, DeskViewSet, BookingViewSet, LDAPSettingsViewSet, RoomLayoutViewSet, AnalyticsViewSet,
+    UserViewSet, RoomViewSet, DeskViewSet, BookingViewSet, BookingSeriesViewSet, LDAPSettingsViewSet, RoomLayoutViewSet, AnalyticsViewSet,
 )
 
 # Create a router and register our viewset
@@ -11,6 +11,7 @@ router.register(r'rooms', RoomViewSet, basename='room')
 router.register(r'desks', DeskViewSet, basename='desk')
 router.register(r'bookings', BookingViewSet, basename='booking')
 router.register(r'mybookings', BookingViewSet, basename='mybooking')
+router.register(r'booking-series', BookingSeriesViewSet, basename='booking-series')
 router.register(r'settings/ldap', LDAPSettingsViewSet, basename='ldap-settings')
 router.register(r'room-layouts', RoomLayoutViewSet, basename='room-layout')
 router.register(r'analytics', AnalyticsViewSet, basename='analytics')
@@ -0,0 +1,185 @@
+"""
+Desk utilization: booked slots / (active desks x working days x slots).
+
+The booked slots of a date range are loaded once into a dense
+desk x day x slot array and every cut (room, weekday, period, desk,
+heatmap) is a vectorized reduction over it, so the cost is two queries
+plus array work proportional to desks x days.
+"""
+from collections import namedtuple
+from datetime import timedelta
+from itertools import chain
+
+import numpy as np
+from django.db import connection
+from django.db.models import Func, IntegerField, Value
+
+from .models import Booking, Desk
+
+# Longest range a report may cover
+UTILIZATION_MAX_SPAN_DAYS = 366
+WORKING_WEEKDAYS = (0, 1, 2, 3, 4)
+
+WEEKDAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+# Period name of each single slot bit, in Booking.SLOTS order
+SLOT_PERIODS = tuple(
+    next(period for period, mask in Booking.PERIOD_SLOT_MASKS.items() if mask == slot)
+    for slot in Booking.SLOTS
+)
+
+Occupancy = namedtuple('Occupancy', ['start', 'desks', 'booked'])
+
+
+class DaysSince(Func):
+    """Whole days from `start` to a date expression, as an integer"""
+    template = '(%(expressions)s)'
+    arg_joiner = ' - '
+    output_field = IntegerField()
+
+    def __init__(self, expression, start):
+        super().__init__(expression, Value(start))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)', arg_joiner=') - julianday(',
+            **extra_context,
+        )
+
+
+def load_occupancy(start, end, room_ids=None):
+    """
+    Booked slots of the active desks between start and end (inclusive).
+
+    Returns an Occupancy whose `desks` are value dicts ordered by room and
+    desk number and whose `booked` is a bool array of shape
+    (desks, days, len(Booking.SLOTS)).
+    """
+    desks = Desk.objects.filter(is_active=True)
+    if room_ids is not None:
+        desks = desks.filter(room_id__in=room_ids)
+    desks = list(desks.order_by('room__name', 'room_id', 'desk_number').values('id', 'room_id', 'room__name', 'desk_number'))
+
+    days = (end - start).days + 1
+    masks = np.zeros((len(desks), days), dtype=np.uint8)
+    if desks:
+        bookings = Booking.objects.filter(date__gte=start, date__lte=end)
+        if room_ids is not None:
+            bookings = bookings.filter(desk__room_id__in=room_ids)
+        # Only integers cross the wire, and the rows skip the ORM's per-row
+        # iterator: the array is filled straight from fetchall()
+        sql, params = bookings.values_list('desk_id', DaysSince('date', start), 'slot_mask').order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        if rows:
+            desk_ids, offsets, slot_masks = np.fromiter(
+                chain.from_iterable(rows), dtype=np.int64, count=len(rows) * 3,
+            ).reshape(-1, 3).T
+            # Position of each booking's desk in `desks`; bookings of inactive
+            # desks find no match and are dropped
+            ids = np.array([desk['id'] for desk in desks], dtype=np.int64)
+            order = np.argsort(ids)
+            found = np.minimum(np.searchsorted(ids, desk_ids, sorter=order), len(ids) - 1)
+            positions = order[found]
+            known = ids[positions] == desk_ids
+            # One booking per desk and slot, but am and pm may be separate rows
+            np.bitwise_or.at(masks, (positions[known], offsets[known]), slot_masks[known].astype(np.uint8))
+
+    slots = np.array(Booking.SLOTS, dtype=np.uint8)
+    return Occupancy(start, desks, (masks[:, :, None] & slots) != 0)
+
+
+def _ratio(booked, capacity):
+    """Element-wise booked / capacity rounded to 4 places, 0 where there is no capacity"""
+    booked = np.asarray(booked, dtype=np.float64)
+    capacity = np.asarray(capacity, dtype=np.float64)
+    return np.round(np.divide(booked, capacity, out=np.zeros_like(booked), where=capacity > 0), 4)
+
+
+def utilization_report(occupancy, weekdays=WORKING_WEEKDAYS):
+    """
+    Utilization cuts of an Occupancy over the days falling on `weekdays`
+    (0 = Monday). The heatmap holds booked slots per desk and working day.
+    """
+    desks, booked = occupancy.desks, occupancy.booked
+    desk_count, day_count, slot_count = booked.shape
+
+    day_weekdays = (occupancy.start.weekday() + np.arange(day_count)) % 7
+    working = np.isin(day_weekdays, list(weekdays))
+    booked = booked[:, working, :]
+    day_weekdays = day_weekdays[working]
+    working_days = int(working.sum())
+
+    per_desk_day = booked.sum(axis=2, dtype=np.int32)
+    per_desk = per_desk_day.sum(axis=1)
+    total = int(per_desk.sum())
+    capacity = desk_count * working_days * slot_count
+
+    room_ids = [desk['room_id'] for desk in desks]
+    room_positions = {room_id: index for index, room_id in enumerate(dict.fromkeys(room_ids))}
+    rooms = list(room_positions)
+    room_index = np.array([room_positions[room_id] for room_id in room_ids], dtype=np.intp)
+    room_desks = np.bincount(room_index, minlength=len(rooms))
+    room_booked = np.bincount(room_index, weights=per_desk, minlength=len(rooms))
+    room_utilization = _ratio(room_booked, room_desks * working_days * slot_count)
+    room_names = {desk['room_id']: desk['room__name'] for desk in desks}
+
+    weekday_booked = np.bincount(day_weekdays, weights=per_desk_day.sum(axis=0), minlength=7)
+    weekday_days = np.bincount(day_weekdays, minlength=7)
+    weekday_utilization = _ratio(weekday_booked, weekday_days * desk_count * slot_count)
+
+    period_booked = booked.sum(axis=(0, 1))
+    period_utilization = _ratio(period_booked, np.full(slot_count, desk_count * working_days))
+
+    desk_utilization = _ratio(per_desk, np.full(desk_count, working_days * slot_count))
+
+    dates = [occupancy.start + timedelta(days=int(offset)) for offset in np.flatnonzero(working)]
+    return {
+        'workingDays': working_days,
+        'slotsPerDay': slot_count,
+        'overall': {
+            'bookedSlots': total,
+            'capacitySlots': capacity,
+            'utilization': float(_ratio(total, capacity)),
+        },
+        'byRoom': [
+            {
+                'roomId': room_id,
+                'name': room_names[room_id],
+                'desks': int(desk_total),
+                'bookedSlots': int(room_total),
+                'utilization': utilization,
+            }
+            for room_id, desk_total, room_total, utilization
+            in zip(rooms, room_desks, room_booked, room_utilization.tolist())
+        ],
+        'byWeekday': {
+            WEEKDAY_NAMES[weekday]: weekday_utilization[weekday].item()
+            for weekday in sorted(set(weekdays))
+        },
+        'byPeriod': dict(zip(SLOT_PERIODS, period_utilization.tolist())),
+        'byDesk': [
+            {
+                'deskId': desk['id'],
+                'roomId': desk['room_id'],
+                'deskNumber': desk['desk_number'],
+                'bookedSlots': desk_total,
+                'utilization': utilization,
+            }
+            for desk, desk_total, utilization in zip(desks, per_desk.tolist(), desk_utilization.tolist())
+        ],
+        'heatmap': {
+            'dates': [day.isoformat() for day in dates],
+            'desks': [desk['id'] for desk in desks],
+            'bookedSlots': per_desk_day.tolist(),
+        },
+    }
+
+
+def booking_utilization(start, end, room_ids=None, weekdays=WORKING_WEEKDAYS):
+    """Load and report in one call; raises ValueError for spans over UTILIZATION_MAX_SPAN_DAYS"""
+    if (end - start).days + 1 > UTILIZATION_MAX_SPAN_DAYS:
+        raise ValueError(f'A utilization report can span at most {UTILIZATION_MAX_SPAN_DAYS} days')
+    return utilization_report(load_occupancy(start, end, room_ids), weekdays)
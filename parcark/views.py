@@ -4,19 +4,45 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.views.static import serve
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.contrib.auth import login, logout, get_user_model
-from django.db.models import Q, Count
-from django.db.models.functions import ExtractWeekDay
+from django.db.models import Q, Count, Max, Prefetch, Sum
 from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework.exceptions import ValidationError as DRFValidationError
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.serializers import as_serializer_error
 from datetime import date, timedelta, datetime
 from collections import defaultdict
-import os
+from functools import wraps
+from urllib.parse import quote
+import base64
+import hashlib
+import json
 import logging
-from .models import Room, Desk, Booking, RoomLayout, LDAPSettings
+from .models import Room, Desk, Booking, BookingSeries, RoomLayout, LDAPSettings, AnalyticsJob
 from .serializers import (
-    UserSerializer, RegisterSerializer, LoginSerializer, RoomSerializer, DeskSerializer, BookingSerializer, RoomLayoutSerializer, LDAPSettingsSerializer,
+    UserSerializer, RegisterSerializer, LoginSerializer, RoomSerializer, DeskSerializer, BookingSerializer, BookingRowSerializer, BookingSeriesSerializer, AutoAssignSerializer, RoomLayoutSerializer, LDAPSettingsSerializer,
+    AnalyticsJobSerializer,
+)
+from .analytics import (
+    COMPARISONS, analytics_overview, auto_granularity, booking_time_series, bookings_by_period, bookings_by_room, bookings_by_weekday,
+    check_time_series, daily_stats, stat_models, time_series_points,
+)
+from .exports import CSVRenderer, NDJSONRenderer, csv_stream, export_rows, ndjson_stream
+from .images import delete_room_image
+from .jobs import enqueue_analytics_job
+from .utilization import booking_utilization
+from .services import (
+    analytics_cache_metrics, auto_assign_booking, availability_cache_metrics, availability_snapshot, booking_counts,
+    bulk_create_bookings, cached_analytics, cancel_booking_series, create_booking_series,
 )
 from django.core.cache import cache
 
@@ -30,6 +56,36 @@ class IsAdminUser(permissions.BasePermission):
         return request.user and request.user.is_authenticated and request.user.is_staff
 
 
+# Media files are content-addressed (parcark.storage): a URL never changes content
+MEDIA_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def media_file(request, path):
+    """
+    Serve an uploaded file to signed-in users
+    GET /media/{path}
+    Behind nginx, which sends X-Sendfile-Type: X-Accel-Redirect, the file is
+    handed to nginx's internal MEDIA_ACCEL_REDIRECT location instead of
+    being read through Django. Either way browsers may keep it for a year
+    without revalidating.
+    """
+    if not request.user.is_authenticated:
+        return HttpResponseForbidden()
+    if request.headers.get('X-Sendfile-Type') == 'X-Accel-Redirect':
+        try:
+            safe_join(settings.MEDIA_ROOT, path)
+        except SuspiciousFileOperation:
+            raise Http404
+        response = HttpResponse()
+        # nginx picks the type from the file extension
+        del response['Content-Type']
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT + quote(path)
+    else:
+        response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    patch_cache_control(response, private=True, max_age=MEDIA_MAX_AGE, immutable=True)
+    return response
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_view(request):
@@ -119,6 +175,94 @@ class UserViewSet(viewsets.ModelViewSet):
         return queryset
 
 
+def conditional_get(marker):
+    """
+    Answer GET/HEAD with 304 Not Modified when the client's ETag or
+    Last-Modified still matches, without rendering the body.
+
+    `marker(request, *args, **kwargs)` reads change markers in one cheap
+    query and returns (last_modified, *other_values), or None to serve the
+    request as usual (e.g. for a missing object). The ETag hashes all of
+    them with the negotiated media type.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(self, request, *args, **kwargs)
+            try:
+                values = marker(request, *args, **kwargs)
+            except (TypeError, ValueError, DjangoValidationError):
+                # A malformed id; the view reports it as before
+                values = None
+            if values is None:
+                return view(self, request, *args, **kwargs)
+
+            last_modified = values[0]
+            etag = quote_etag(hashlib.md5(repr((values, request.accepted_media_type)).encode()).hexdigest())
+            response = get_conditional_response(
+                request,
+                etag=etag,
+                last_modified=int(last_modified.timestamp()) if last_modified else None,
+            )
+            if response is None:
+                response = view(self, request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.headers['ETag'] = etag
+                if last_modified:
+                    response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+                # Browsers revalidate on every use instead of trusting a stale copy
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapped
+    return decorator
+
+
+def most_recent(*datetimes):
+    return max((value for value in datetimes if value is not None), default=None)
+
+
+def rooms_marker(request, *args, **kwargs):
+    """Any room added, edited or removed"""
+    stats = Room.objects.aggregate(updated=Max('updated_at'), count=Count('id'))
+    return stats['updated'], stats['count']
+
+
+def room_marker(request, pk=None, **kwargs):
+    updated = Room.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    return None if updated is None else (updated,)
+
+
+def desks_marker(request, pk=None, **kwargs):
+    """
+    Desks of the listed room (or all desks), active or not, so deactivated
+    and removed desks change it too; room renames change `room_name`.
+    """
+    desks = Desk.objects.all()
+    if pk is not None:
+        desks = desks.filter(pk=pk)
+    elif request.query_params.get('room'):
+        desks = desks.filter(room_id=request.query_params['room'])
+    stats = desks.aggregate(updated=Max('updated_at'), room_updated=Max('room__updated_at'), count=Count('id'))
+    if pk is not None and not stats['count']:
+        return None
+    return most_recent(stats['updated'], stats['room_updated']), stats['updated'], stats['room_updated'], stats['count']
+
+
+def room_layout_marker(request, room_id=None, **kwargs):
+    """A layout not saved yet is created by the first GET; serve that normally"""
+    row = (
+        RoomLayout.objects
+        .filter(room_id=room_id)
+        .values_list('updated_at', 'room__updated_at', 'updated_by__username')
+        .first()
+    )
+    if row is None:
+        return None
+    updated, room_updated, username = row
+    return most_recent(updated, room_updated), updated, room_updated, username
+
+
 class RoomViewSet(viewsets.ModelViewSet):
     """
     ViewSet for Room CRUD operations
@@ -148,6 +292,11 @@ class RoomViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(
                 Q(name__icontains=search)
             )
+
+        if self.action == 'bootstrap':
+            queryset = queryset.select_related('layout__updated_by').prefetch_related(
+                Prefetch('desks', queryset=Desk.objects.filter(is_active=True), to_attr='active_desks')
+            )
         
         return queryset
 
@@ -177,9 +326,8 @@ class RoomViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Delete the image file
-        if os.path.isfile(room.image.path):
-            os.remove(room.image.path)
+        # Delete the image file and its renditions
+        delete_room_image(room)
         
         # Clear the image field
         room.image = None
@@ -194,10 +342,12 @@ class RoomViewSet(viewsets.ModelViewSet):
         return Response({'count': count})
 
 
+    @conditional_get(rooms_marker)
     def list(self, request, *args, **kwargs):
         """
         List all rooms
         GET /api/rooms/
+        Supports If-None-Match / If-Modified-Since (304 Not Modified)
         """
         queryset = self.get_queryset()
         serializer = self.get_serializer(queryset, many=True)
@@ -223,10 +373,12 @@ class RoomViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @conditional_get(room_marker)
     def retrieve(self, request, *args, **kwargs):
         """
         Get a single room by ID
         GET /api/rooms/{id}/
+        Supports If-None-Match / If-Modified-Since (304 Not Modified)
         """
         instance = self.get_object()
         serializer = self.get_serializer(instance)
@@ -290,6 +442,35 @@ class RoomViewSet(viewsets.ModelViewSet):
         count = self.get_queryset().count()
         return Response({'count': count})
 
+    @action(detail=True, methods=['get'])
+    def bootstrap(self, request, pk=None):
+        """
+        Everything the booking page needs once a room is selected
+        GET /api/rooms/{id}/bootstrap/?date=2025-11-10&period=am
+        Returns the room, its active desks, its saved layout (null if none)
+        and, when a date is given, the availability snapshot for that date
+        and period (default full), as GET /api/bookings/availability/.
+        Two queries plus at most one for an uncached availability snapshot.
+        """
+        check_date = request.query_params.get('date')
+        period = request.query_params.get('period') or 'full'
+        try:
+            check_date = date.fromisoformat(check_date) if check_date else None
+        except ValueError:
+            return Response({'error': 'date must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        if period not in Booking.PERIOD_SLOT_MASKS:
+            return Response({'error': f'Unknown period: {period}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        room = self.get_object()
+        # The prefetch attaches the room to each desk, so room_name costs nothing
+        layout = getattr(room, 'layout', None)
+        return Response({
+            'room': self.get_serializer(room).data,
+            'desks': DeskSerializer(room.active_desks, many=True).data,
+            'layout': RoomLayoutSerializer(layout).data if layout is not None else None,
+            'availability': availability_snapshot(room.pk, check_date, period) if check_date else None,
+        })
+
 class DeskViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Desk (read-only for regular users)
@@ -309,6 +490,20 @@ class DeskViewSet(viewsets.ReadOnlyModelViewSet):
         
         return queryset
 
+    @conditional_get(desks_marker)
+    def list(self, request, *args, **kwargs):
+        """GET /api/desks/?room={id}, supports If-None-Match / If-Modified-Since"""
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get(desks_marker)
+    def retrieve(self, request, *args, **kwargs):
+        """GET /api/desks/{id}/, supports If-None-Match / If-Modified-Since"""
+        return super().retrieve(request, *args, **kwargs)
+
+
+MATRIX_DEFAULT_DAYS = 21
+MATRIX_MAX_DAYS = 62
+
 
 class BookingPagination(PageNumberPagination):
     page_size = 10
@@ -316,6 +511,98 @@ class BookingPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class BookingCursorPagination(BasePagination):
+    """
+    Keyset pagination over (date, period, id), opted into with ?pagination=cursor
+
+    Pages are fetched with a WHERE on the last seen key instead of OFFSET and
+    no COUNT(*) is run, so deep pages cost the same as the first one. The
+    direction follows the queryset ordering (descending for past bookings).
+    Response: {"next": url, "previous": url, "results": [...]}
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        self.descending = bool(ordering) and ordering[0].startswith('-')
+
+        cursor = self.decode_cursor(request)
+        # A "previous" cursor walks the keyset backwards from the first row of a page
+        backwards = bool(cursor and cursor['back'])
+        walk_descending = self.descending != backwards
+
+        prefix = '-' if walk_descending else ''
+        queryset = queryset.order_by(f'{prefix}date', f'{prefix}period', f'{prefix}id')
+        if cursor:
+            queryset = queryset.filter(self.keyset_filter(cursor['key'], walk_descending))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if backwards:
+            rows.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = cursor is not None, has_more
+
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def keyset_filter(self, key, descending):
+        """Rows strictly after `key` in (date, period, id) order"""
+        booking_date, period, pk = key
+        op, bound = ('lt', 'lte') if descending else ('gt', 'gte')
+        # The redundant outer bound lets the index range scan start at the key
+        return Q(**{f'date__{bound}': booking_date}) & (
+            Q(**{f'date__{op}': booking_date})
+            | Q(date=booking_date, **{f'period__{op}': period})
+            | Q(date=booking_date, period=period, **{f'id__{op}': pk})
+        )
+
+    def encode_cursor(self, booking, back):
+        # Pages hold model instances or values() rows
+        if isinstance(booking, dict):
+            key = (booking['date'], booking['period'], booking['id'])
+        else:
+            key = (booking.date, booking.period, booking.pk)
+        payload = json.dumps([key[0].isoformat(), key[1], key[2], int(back)])
+        token = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            booking_date, period, pk, back = json.loads(base64.urlsafe_b64decode(token.encode()))
+            key = (date.fromisoformat(booking_date), str(period), int(pk))
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return {'key': key, 'back': bool(back)}
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.encode_cursor(self.page[-1], back=False) if self.has_next and self.page else None,
+            'previous': self.encode_cursor(self.page[0], back=True) if self.has_previous and self.page else None,
+            'results': data,
+        })
+
+
 class BookingViewSet(viewsets.ModelViewSet):
     """
     ViewSet for Booking CRUD operations
@@ -323,6 +610,16 @@ class BookingViewSet(viewsets.ModelViewSet):
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = BookingPagination
+
+    @property
+    def paginator(self):
+        """Page numbers by default, keyset cursors with ?pagination=cursor"""
+        if not hasattr(self, '_paginator'):
+            if self.request is not None and self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = BookingCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
     
     def get_queryset(self):
         """Filter bookings based on query params"""
@@ -358,6 +655,22 @@ class BookingViewSet(viewsets.ModelViewSet):
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
+
+    def list_rows(self, queryset):
+        """
+        Paginated list response built from values() rows via
+        BookingRowSerializer, without instantiating any models
+        """
+        rows = BookingRowSerializer.values(queryset)
+        context = self.get_serializer_context()
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(BookingRowSerializer(page, context=context).data)
+        return Response(BookingRowSerializer(rows, context=context).data)
+
+    def list(self, request, *args, **kwargs):
+        return self.list_rows(self.filter_queryset(self.get_queryset()))
     
     def destroy(self, request, *args, **kwargs):
         """Delete/cancel a booking"""
@@ -388,43 +701,30 @@ class BookingViewSet(viewsets.ModelViewSet):
         """
         Get current user's bookings with pagination support
         GET /api/bookings/my-bookings/?page=1&page_size=10
+        GET /api/bookings/my-bookings/?pagination=cursor&page_size=10
         
         Returns paginated list of user's upcoming bookings ordered by date
         """
         bookings = Booking.objects.filter(
             user=request.user,
             date__gte=date.today()
-        ).select_related('desk', 'desk__room').order_by('date', 'period')
-        
-        # Apply pagination
-        page = self.paginate_queryset(bookings)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        # If pagination is not applied (shouldn't happen with our setup)
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        ).order_by('date', 'period')
+
+        return self.list_rows(bookings)
 
     @action(detail=False, methods=['get'], url_path='my-past-bookings')
     def my_past_bookings(self, request):
         """
         Get current user's past bookings with pagination support
         GET /api/bookings/my-past-bookings/?page=1&page_size=10
+        GET /api/bookings/my-past-bookings/?pagination=cursor&page_size=10
         """
         bookings = Booking.objects.filter(
             user=request.user,
             date__lt=date.today()
-        ).select_related('desk', 'desk__room').order_by('-date', '-period')
-        
-        # Apply pagination
-        page = self.paginate_queryset(bookings)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(bookings, many=True)
-        return Response(serializer.data)
+        ).order_by('-date', '-period')
+
+        return self.list_rows(bookings)
 
     @action(detail=False, methods=['get'], url_path='my-bookings-count')
     def my_bookings_count(self, request):
@@ -432,33 +732,15 @@ class BookingViewSet(viewsets.ModelViewSet):
         Get count of current user's bookings
         GET /api/bookings/my-bookings-count/
         """
-        upcoming = Booking.objects.filter(
-            user=request.user,
-            date__gte=date.today()
-        ).count()
-        
-        past = Booking.objects.filter(
-            user=request.user,
-            date__lt=date.today()
-        ).count()
-        
-        today = Booking.objects.filter(
-            user=request.user,
-            date=date.today()
-        ).count()
-        
-        return Response({
-            'upcoming': upcoming,
-            'past': past,
-            'today': today,
-            'total': upcoming + past
-        })
+        return Response(booking_counts(request.user))
 
     def create(self, request, *args, **kwargs):
         """
         Create a single booking
         POST /api/bookings/
         Body: {"desk": 1, "date": "2025-11-10", "period": "am"}
+
+        Conflicts are detected by the database constraints on INSERT.
         """
         serializer = self.get_serializer(data=request.data)
         
@@ -472,6 +754,12 @@ class BookingViewSet(viewsets.ModelViewSet):
                     },
                     status=status.HTTP_201_CREATED
                 )
+            except DRFValidationError as e:
+                # Slot already taken - rejected by the booking constraints
+                return Response(
+                    as_serializer_error(e),
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             except DjangoValidationError as e:
                 # Handle Django model validation errors
                 error_dict = e.message_dict if hasattr(e, 'message_dict') else {'error': str(e)}
@@ -499,11 +787,81 @@ class BookingViewSet(viewsets.ModelViewSet):
         
         return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'], url_path='auto-assign')
+    def auto_assign(self, request):
+        """
+        Book any free desk in one or more rooms
+        POST /api/bookings/auto-assign/
+        Body: {"rooms": [1, 2], "date": "2025-11-10", "period": "am", "preferred_desks": [7, 8]}
+        ("room": 1 works for a single room)
+
+        The desk is picked and locked in one query, so concurrent requests get
+        different desks instead of failing; see services.auto_assign_booking.
+        """
+        serializer = AutoAssignSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        try:
+            booking = auto_assign_booking(
+                request.user, data['rooms'], data['date'], data['period'], data['preferred_desks'],
+            )
+        except DRFValidationError as e:
+            return Response(as_serializer_error(e), status=status.HTTP_400_BAD_REQUEST)
+
+        if booking is None:
+            return Response(
+                {'error': 'No desk is free in the selected rooms for this timeslot.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(
+            {
+                'message': 'Booking created successfully',
+                'booking': self.get_serializer(booking).data
+            },
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=False, methods=['get'], url_path='export',
+            permission_classes=[IsAuthenticated, IsAdminUser], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """
+        Stream every matching booking as CSV (default) or NDJSON (admin only)
+        GET /api/bookings/export/?start_date=2025-01-01&end_date=2025-12-31&format=csv|ndjson
+        Optional params: room, desk, my_bookings (as for the list)
+        """
+        for param in ('start_date', 'end_date'):
+            try:
+                if request.query_params.get(param):
+                    date.fromisoformat(request.query_params[param])
+            except ValueError:
+                return Response(
+                    {'error': f'Invalid {param} format. Use YYYY-MM-DD.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        for param in ('room', 'desk'):
+            if not request.query_params.get(param, '0').isdigit():
+                return Response({'error': f'{param} must be an id'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = export_rows(self.get_queryset())
+        renderer = request.accepted_renderer
+        stream = csv_stream(rows) if renderer.format == 'csv' else ndjson_stream(rows)
+        response = StreamingHttpResponse(stream, content_type=f'{renderer.media_type}; charset=utf-8')
+        span = '-'.join(request.query_params[param] for param in ('start_date', 'end_date') if request.query_params.get(param))
+        filename = f"bookings{'-' + span if span else ''}.{renderer.format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
     @action(detail=False, methods=['post'], url_path='bulk-create')
     def bulk_create(self, request):
         """
         Create multiple bookings at once
         POST /api/bookings/bulk-create/
+        Body: {"bookings": [{"desk": 1, "date": "2025-11-10", "period": "am"}, ...]}
+
+        The whole batch is validated against existing bookings in one pass and
+        accepted bookings are inserted together; see services.bulk_create_bookings.
         """
         bookings_data = request.data.get('bookings', [])
         
@@ -513,39 +871,18 @@ class BookingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        created_bookings = []
-        errors = []
-        
-        for booking_data in bookings_data:
-            serializer = self.get_serializer(data=booking_data)
-            if serializer.is_valid():
-                try:
-                    serializer.save()
-                    created_bookings.append(serializer.data)
-                except DjangoValidationError as e:
-                    error_dict = e.message_dict if hasattr(e, 'message_dict') else {'error': str(e)}
-                    errors.append({
-                        'booking': booking_data,
-                        'error': error_dict
-                    })
-                except Exception as e:
-                    errors.append({
-                        'booking': booking_data,
-                        'error': {'error': str(e)}
-                    })
-            else:
-                # Serializer validation failed
-                error_message = serializer.errors
-                if isinstance(error_message, dict):
-                    if 'date' in error_message:
-                        error_message = error_message['date'][0] if isinstance(error_message['date'], list) else error_message['date']
-                    elif 'period' in error_message:
-                        error_message = error_message['period'][0] if isinstance(error_message['period'], list) else error_message['period']
-                
-                errors.append({
-                    'booking': booking_data,
-                    'error': error_message
-                })
+        bookings, errors = bulk_create_bookings(request.user, bookings_data)
+        created_bookings = self.get_serializer(bookings, many=True).data
+
+        # Flatten field errors the same way the single-create endpoint does
+        for entry in errors:
+            error_message = entry['error']
+            if isinstance(error_message, dict):
+                if 'date' in error_message:
+                    error_message = error_message['date'][0] if isinstance(error_message['date'], list) else error_message['date']
+                elif 'period' in error_message:
+                    error_message = error_message['period'][0] if isinstance(error_message['period'], list) else error_message['period']
+            entry['error'] = error_message
         
         return Response({
             'created': created_bookings,
@@ -559,7 +896,13 @@ class BookingViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'], url_path='availability')
     def availability(self, request):
-        """Check desk availability"""
+        """
+        Check desk availability
+        GET /api/bookings/availability/?room=1&date=2025-11-10&period=am
+
+        Served from a cached per (room, date, period) snapshot, see
+        services.availability_snapshot.
+        """
         room_id = request.query_params.get('room')
         check_date = request.query_params.get('date')
         period = request.query_params.get('period', 'full')
@@ -569,29 +912,219 @@ class BookingViewSet(viewsets.ModelViewSet):
                 {'error': 'room and date parameters required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        desks = Desk.objects.filter(room_id=room_id, is_active=True)
-        
-        bookings_query = Q(date=check_date)
-        if period != 'full':
-            bookings_query &= (Q(period=period) | Q(period='full'))
-        
-        booked_desk_ids = Booking.objects.filter(
-            bookings_query,
-            desk__room_id=room_id
-        ).values_list('desk_id', flat=True)
-        
-        available_desks = desks.exclude(id__in=booked_desk_ids)
-        serializer = DeskSerializer(available_desks, many=True)
-        
+
+        try:
+            room_id = int(room_id)
+            check_date = date.fromisoformat(check_date)
+        except ValueError:
+            return Response(
+                {'error': 'room must be an id and date must be YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if period not in Booking.PERIOD_SLOT_MASKS:
+            return Response(
+                {'error': f'Unknown period: {period}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(availability_snapshot(room_id, check_date, period))
+
+    @action(detail=False, methods=['get'], url_path='availability-metrics',
+            permission_classes=[IsAuthenticated, IsAdminUser])
+    def availability_metrics(self, request):
+        """
+        Availability snapshot cache hit rate and rebuild latency (admin only)
+        GET /api/bookings/availability-metrics/
+        """
+        return Response(availability_cache_metrics())
+
+    @action(detail=False, methods=['get'], url_path='availability-matrix')
+    def availability_matrix(self, request):
+        """
+        Desk x date x period occupancy grid for a set of rooms
+        GET /api/bookings/availability-matrix/?rooms=1,2&start_date=2025-11-10&end_date=2025-11-30&periods=am,pm
+
+        - rooms: comma separated room ids (all rooms if omitted)
+        - start_date / end_date: inclusive range, defaults to today + 20 days
+        - periods: comma separated subset of am, pm, full (default am,pm)
+
+        Each desk gets a `booked` list with one entry per date, each entry
+        holding a 0/1 flag per requested period. Rooms get the matching
+        `available` desk counts. Built from two queries regardless of size.
+        """
+        rooms_param = request.query_params.get('rooms')
+        start_date_param = request.query_params.get('start_date')
+        end_date_param = request.query_params.get('end_date')
+        periods_param = request.query_params.get('periods', 'am,pm')
+
+        room_ids = None
+        if rooms_param:
+            try:
+                room_ids = [int(value) for value in rooms_param.split(',') if value.strip()]
+            except ValueError:
+                return Response(
+                    {'error': 'rooms must be a comma separated list of room ids'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        try:
+            start_date = (
+                datetime.strptime(start_date_param, '%Y-%m-%d').date()
+                if start_date_param else date.today()
+            )
+            end_date = (
+                datetime.strptime(end_date_param, '%Y-%m-%d').date()
+                if end_date_param else start_date + timedelta(days=MATRIX_DEFAULT_DAYS - 1)
+            )
+        except ValueError:
+            return Response(
+                {'error': 'Invalid date format. Use YYYY-MM-DD.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if start_date > end_date:
+            return Response(
+                {'error': 'start_date cannot be after end_date.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        span = (end_date - start_date).days + 1
+        if span > MATRIX_MAX_DAYS:
+            return Response(
+                {'error': f'Date range cannot exceed {MATRIX_MAX_DAYS} days.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        periods = [value.strip() for value in periods_param.split(',') if value.strip()]
+        valid_periods = dict(Booking.PERIOD_CHOICES)
+        if not periods or any(period not in valid_periods for period in periods):
+            return Response(
+                {'error': 'periods must be a comma separated subset of am, pm, full'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        desks = Desk.objects.filter(is_active=True)
+        bookings = Booking.objects.filter(
+            date__gte=start_date,
+            date__lte=end_date,
+            desk__is_active=True,
+        )
+        if room_ids is not None:
+            desks = desks.filter(room_id__in=room_ids)
+            bookings = bookings.filter(desk__room_id__in=room_ids)
+
+        desk_rows = desks.order_by('room__name', 'room_id', 'desk_number').values(
+            'id', 'desk_number', 'room_id', 'room__name'
+        )
+
+        # One grouped query: which slots are taken per (desk, date)
+        slot_counts = {
+            f'slot_{slot}': Count('id', filter=Q(slot_mask__overlaps=slot))
+            for slot in Booking.SLOTS
+        }
+        occupancy = {}
+        for row in bookings.values('desk_id', 'date').annotate(**slot_counts).order_by():
+            occupancy[(row['desk_id'], row['date'])] = sum(
+                slot for slot in Booking.SLOTS if row[f'slot_{slot}']
+            )
+        period_masks = [Booking.PERIOD_SLOT_MASKS[period] for period in periods]
+
+        dates = [start_date + timedelta(days=i) for i in range(span)]
+        rooms = {}
+
+        for desk in desk_rows:
+            room = rooms.get(desk['room_id'])
+            if room is None:
+                room = rooms[desk['room_id']] = {
+                    'id': desk['room_id'],
+                    'name': desk['room__name'],
+                    'total_desks': 0,
+                    'available': [[0] * len(periods) for _ in dates],
+                    'desks': [],
+                }
+            room['total_desks'] += 1
+
+            booked = []
+            for day_index, day in enumerate(dates):
+                taken_mask = occupancy.get((desk['id'], day), 0)
+                flags = []
+                for period_index, period_mask in enumerate(period_masks):
+                    taken = taken_mask & period_mask
+                    flags.append(1 if taken else 0)
+                    if not taken:
+                        room['available'][day_index][period_index] += 1
+                booked.append(flags)
+
+            room['desks'].append({
+                'id': desk['id'],
+                'desk_number': desk['desk_number'],
+                'booked': booked,
+            })
+
         return Response({
-            'total_desks': desks.count(),
-            'available_desks': available_desks.count(),
-            'booked_desks': len(booked_desk_ids),
-            'desks': serializer.data
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'dates': [day.isoformat() for day in dates],
+            'periods': periods,
+            'rooms': list(rooms.values()),
         })
 
 
+class BookingSeriesViewSet(viewsets.ModelViewSet):
+    """
+    Recurring bookings
+    GET    /api/booking-series/
+    POST   /api/booking-series/
+    Body: {"desk": 1, "period": "am", "weekdays": [1, 3], "interval": 1,
+           "start_date": "2025-11-10", "end_date": "2026-01-31"}   (or "count": 20)
+    DELETE /api/booking-series/{id}/   cancels all upcoming bookings of the series
+    """
+    serializer_class = BookingSeriesSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'delete', 'head', 'options']
+
+    def get_queryset(self):
+        queryset = BookingSeries.objects.select_related('desk', 'desk__room')
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        series, bookings, conflicts = create_booking_series(request.user, serializer.validated_data)
+        occurrences = len(bookings) + len(conflicts)
+
+        return Response({
+            'series': self.get_serializer(series).data if series else None,
+            'created': BookingSerializer(bookings, many=True, context=self.get_serializer_context()).data,
+            'conflicts': conflicts,
+            'summary': {
+                'total': occurrences,
+                'created': len(bookings),
+                'failed': len(conflicts)
+            }
+        }, status=status.HTTP_201_CREATED if bookings else status.HTTP_400_BAD_REQUEST)
+
+    def destroy(self, request, *args, **kwargs):
+        """Cancel the series and its upcoming bookings"""
+        series = self.get_object()
+
+        if series.user_id != request.user.id and not request.user.is_staff:
+            return Response(
+                {'error': 'You can only cancel your own bookings'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        cancelled = cancel_booking_series(series)
+        return Response(
+            {'message': 'Booking series cancelled successfully', 'cancelled': cancelled},
+            status=status.HTTP_200_OK
+        )
+
+
 class LDAPSettingsViewSet(viewsets.ModelViewSet):
     """Manage LDAP settings (admin only)"""
     serializer_class = LDAPSettingsSerializer
@@ -676,9 +1209,10 @@ class RoomLayoutViewSet(viewsets.ViewSet):
         return layout
 
     @action(detail=False, methods=['get', 'put'], url_path=r'(?P<room_id>[^/.]+)')
+    @conditional_get(room_layout_marker)
     def by_room(self, request, room_id=None):
         """
-        GET /api/room-layouts/{room_id}/
+        GET /api/room-layouts/{room_id}/ (supports If-None-Match / If-Modified-Since)
         PUT /api/room-layouts/{room_id}/
         """
         room = self._get_room(room_id)
@@ -757,171 +1291,100 @@ class RoomLayoutViewSet(viewsets.ViewSet):
         return Response(serializer.data)
 
 
+def overview_params(data):
+    """
+    Validated analytics overview parameters from query params or a request
+    body, as keyword arguments for analytics_overview(). Raises ValueError
+    with the message to return.
+    """
+    # A JSON body can carry any type; every parameter is a string
+    for name in ('start_date', 'end_date', 'department', 'granularity', 'compare'):
+        if data.get(name) is not None and not isinstance(data[name], str):
+            raise ValueError(f'{name} must be a string.')
+
+    try:
+        start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date() if data.get('start_date') else None
+    except (TypeError, ValueError):
+        raise ValueError('Invalid start_date format. Use YYYY-MM-DD.')
+    try:
+        end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date() if data.get('end_date') else None
+    except (TypeError, ValueError):
+        raise ValueError('Invalid end_date format. Use YYYY-MM-DD.')
+
+    # Default to the 30 days either side of today
+    start_date = start_date or date.today() - timedelta(days=30)
+    end_date = end_date or date.today() + timedelta(days=30)
+    if start_date > end_date:
+        raise ValueError('start_date cannot be after end_date.')
+
+    granularity = data.get('granularity') or auto_granularity(start_date, end_date)
+    check_time_series(start_date, end_date, granularity)
+    compare = data.get('compare') or None
+    if compare is not None and compare not in COMPARISONS:
+        raise ValueError(f"compare must be one of: {', '.join(COMPARISONS)}.")
+    return {
+        'start': start_date,
+        'end': end_date,
+        'department': data.get('department') or None,
+        'granularity': granularity,
+        'compare': compare,
+    }
+
+
+def cache_analytics(endpoint):
+    """Serve an analytics action through services.cached_analytics"""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(self, request, *args, **kwargs):
+            def build():
+                response = view(self, request, *args, **kwargs)
+                return response.data, response.status_code
+            data, status_code = cached_analytics(endpoint, request.query_params, build)
+            return Response(data, status=status_code)
+        return wrapped
+    return decorator
+
+
 class AnalyticsViewSet(viewsets.ViewSet):
     """
     ViewSet for analytics and reporting
     """
     permission_classes = [IsAuthenticated]
 
+    @cache_analytics('list')
     def list(self, request):
         """
         Get comprehensive analytics
         GET /api/analytics/
-        Optional params: start_date, end_date
+        Optional params: start_date, end_date, department,
+        granularity (day/week/month, picked from the range by default),
+        compare (previous/year_ago: adds `comparison` with each metric's
+        previous value, delta and percent change, at no extra queries)
+        Long ranges can be computed in the background, see `jobs`.
         """
-        # Get date range from query params
-        start_date_param = request.query_params.get('start_date')
-        end_date_param = request.query_params.get('end_date')
-
-        # Default to last 30 days if not specified
-        if not start_date_param:
-            start_date = date.today() - timedelta(days=30)
-        else:
-            try:
-                start_date = datetime.strptime(start_date_param, '%Y-%m-%d').date()
-            except ValueError:
-                return Response(
-                    {'error': 'Invalid start_date format. Use YYYY-MM-DD.'},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-        if not end_date_param:
-            end_date = date.today() + timedelta(days=30)
-        else:
-            try:
-                end_date = datetime.strptime(end_date_param, '%Y-%m-%d').date()
-            except ValueError:
-                return Response(
-                    {'error': 'Invalid end_date format. Use YYYY-MM-DD.'},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-        if start_date > end_date:
-            return Response(
-                {'error': 'start_date cannot be after end_date.'},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        
-
-        # Filter bookings by date range
-        bookings = Booking.objects.filter(date__gte=start_date, date__lte=end_date)
-
-        # Bookings by day of week
-        bookings_by_day = {
-            'Monday': 0, 'Tuesday': 0, 'Wednesday': 0, 'Thursday': 0,
-            'Friday': 0, 'Saturday': 0, 'Sunday': 0
-        }
-        day_mapping = {
-            1: 'Sunday', 2: 'Monday', 3: 'Tuesday', 4: 'Wednesday',
-            5: 'Thursday', 6: 'Friday', 7: 'Saturday'
-        }
-        
-        day_counts = bookings.annotate(
-            weekday=ExtractWeekDay('date')
-        ).values('weekday').annotate(count=Count('id'))
-        
-        for item in day_counts:
-            day_name = day_mapping[item['weekday']]
-            bookings_by_day[day_name] = item['count']
-
-        # Bookings by user (top 10)
-        bookings_by_user = bookings.values(
-            'user__username'
-        ).annotate(
-            count=Count('id')
-        ).order_by('-count')[:10]
-        
-        bookings_by_user_list = [
-            {'username': item['user__username'], 'count': item['count']}
-            for item in bookings_by_user
-        ]
-
-        # Bookings by room (top 10)
-        bookings_by_room = bookings.values(
-            'desk__room__name'
-        ).annotate(
-            count=Count('id')
-        ).order_by('-count')[:10]
-        
-        bookings_by_room_list = [
-            {'name': item['desk__room__name'], 'count': item['count']}
-            for item in bookings_by_room
-        ]
-
-        # Bookings by period
-        bookings_by_period = {}
-        period_counts = bookings.values('period').annotate(count=Count('id'))
-        
-        for item in period_counts:
-            period_display = dict(Booking.PERIOD_CHOICES).get(item['period'], item['period'])
-            bookings_by_period[period_display] = item['count']
-
-        # Booking trend (in certain range)
-        booking_trend = []
-        for i in range(-30, -13, 1):
-            trend_date = end_date + timedelta(days=i)
-            count = bookings.filter(date=trend_date).count()
-            booking_trend.append({
-                'date': trend_date.strftime('%b %d'),
-                'count': count
-            })
-
-        # Calculate totals and averages
-        total_bookings = bookings.count()
-        total_users = bookings.values('user').distinct().count()
-        total_rooms = Room.objects.count()
-        
-        days_in_range = (end_date - start_date).days + 1
-        avg_bookings_per_day = round(total_bookings / days_in_range, 1) if days_in_range > 0 else 0
-
-        return Response({
-            'bookingsByDay': bookings_by_day,
-            'bookingsByUser': bookings_by_user_list,
-            'bookingsByRoom': bookings_by_room_list,
-            'bookingsByPeriod': bookings_by_period,
-            'bookingTrend': booking_trend,
-            'totalBookings': total_bookings,
-            'totalUsers': total_users,
-            'totalRooms': total_rooms,
-            'averageBookingsPerDay': avg_bookings_per_day,
-            'startDate': start_date.isoformat(),
-            'endDate': end_date.isoformat(),
-        })
+        try:
+            params = overview_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(analytics_overview(**params))
 
     @action(detail=False, methods=['get'], url_path='by-day')
+    @cache_analytics('by-day')
     def by_day(self, request):
         """Get bookings grouped by day of week"""
-        bookings = Booking.objects.all()
-        
-        bookings_by_day = {
-            'Monday': 0, 'Tuesday': 0, 'Wednesday': 0, 'Thursday': 0,
-            'Friday': 0, 'Saturday': 0, 'Sunday': 0
-        }
-        day_mapping = {
-            1: 'Sunday', 2: 'Monday', 3: 'Tuesday', 4: 'Wednesday',
-            5: 'Thursday', 6: 'Friday', 7: 'Saturday'
-        }
-        
-        day_counts = bookings.annotate(
-            weekday=ExtractWeekDay('date')
-        ).values('weekday').annotate(count=Count('id'))
-        
-        for item in day_counts:
-            day_name = day_mapping[item['weekday']]
-            bookings_by_day[day_name] = item['count']
-        
-        return Response(bookings_by_day)
+        return Response(bookings_by_weekday(daily_stats()))
 
     @action(detail=False, methods=['get'], url_path='by-user')
+    @cache_analytics('by-user')
     def by_user(self, request):
         """Get bookings grouped by user"""
         limit = int(request.query_params.get('limit', 10))
         
-        bookings_by_user = Booking.objects.values(
+        bookings_by_user = stat_models()[1].objects.values(
             'user__username', 'user__first_name', 'user__last_name'
         ).annotate(
-            count=Count('id')
-        ).order_by('-count')[:limit]
+            count=Sum('bookings')
+        ).filter(count__gt=0).order_by('-count')[:limit]
         
         result = [
             {
@@ -936,76 +1399,160 @@ class AnalyticsViewSet(viewsets.ViewSet):
         return Response(result)
 
     @action(detail=False, methods=['get'], url_path='by-room')
+    @cache_analytics('by-room')
     def by_room(self, request):
         """Get bookings grouped by room"""
-        bookings_by_room = Booking.objects.values(
-            'desk__room__id', 'desk__room__name'
-        ).annotate(
-            count=Count('id')
-        ).order_by('-count')
-        
         result = [
             {
-                'roomId': item['desk__room__id'],
-                'name': item['desk__room__name'],
+                'roomId': item['room_id'],
+                'name': item['room__name'],
                 'count': item['count']
             }
-            for item in bookings_by_room
+            for item in bookings_by_room(daily_stats())
         ]
         
         return Response(result)
 
     @action(detail=False, methods=['get'], url_path='by-period')
+    @cache_analytics('by-period')
     def by_period(self, request):
         """Get bookings grouped by period (AM/PM/Full)"""
-        bookings_by_period = {}
-        period_counts = Booking.objects.values('period').annotate(count=Count('id'))
-        
-        for item in period_counts:
-            period_display = dict(Booking.PERIOD_CHOICES).get(item['period'], item['period'])
-            bookings_by_period[period_display] = item['count']
-        
-        return Response(bookings_by_period)
+        return Response(bookings_by_period(daily_stats()))
 
     @action(detail=False, methods=['get'], url_path='trend')
+    @cache_analytics('trend')
     def trend(self, request):
-        """Get booking trend over time"""
-        days = int(request.query_params.get('days', 7))
-        end_date = date.today()
-        start_date = end_date - timedelta(days=days - 1)
-        
-        booking_trend = []
-        for i in range(days):
-            trend_date = start_date + timedelta(days=i)
-            count = Booking.objects.filter(date=trend_date).count()
-            booking_trend.append({
-                'date': trend_date.strftime('%b %d'),
-                'fullDate': trend_date.isoformat(),
-                'count': count
-            })
-        
-        return Response(booking_trend)
+        """
+        Get booking trend over time
+        GET /api/analytics/trend/?days=7
+        GET /api/analytics/trend/?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD
+        Optional params: granularity (day/week/month, default day), department
+        """
+        try:
+            if request.query_params.get('start_date') or request.query_params.get('end_date'):
+                end_date = datetime.strptime(request.query_params.get('end_date', date.today().isoformat()), '%Y-%m-%d').date()
+                start_date = datetime.strptime(request.query_params.get('start_date', end_date.isoformat()), '%Y-%m-%d').date()
+            else:
+                days = int(request.query_params.get('days', 7))
+                end_date = date.today()
+                start_date = end_date - timedelta(days=max(days, 1) - 1)
+        except ValueError:
+            return Response(
+                {'error': 'days must be an integer and dates must use YYYY-MM-DD.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if start_date > end_date:
+            return Response(
+                {'error': 'start_date cannot be after end_date.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        granularity = request.query_params.get('granularity', 'day')
+        try:
+            series = booking_time_series(start_date, end_date, granularity, request.query_params.get('department'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(time_series_points(series, granularity))
 
     @action(detail=False, methods=['get'], url_path='summary')
+    @cache_analytics('summary')
     def summary(self, request):
         """Get summary statistics"""
-        total_bookings = Booking.objects.count()
-        total_users = User.objects.count()
-        total_rooms = Room.objects.count()
-        total_desks = Desk.objects.filter(is_active=True).count()
-        
-        # Bookings in last 7 days
         seven_days_ago = date.today() - timedelta(days=7)
-        recent_bookings = Booking.objects.filter(date__gte=seven_days_ago).count()
-        
-        # Upcoming bookings
-        upcoming_bookings = Booking.objects.filter(date__gte=date.today()).count()
+        totals = daily_stats().aggregate(
+            total=Sum('bookings'),
+            # Bookings in last 7 days
+            recent=Sum('bookings', filter=Q(date__gte=seven_days_ago)),
+            # Upcoming bookings
+            upcoming=Sum('bookings', filter=Q(date__gte=date.today())),
+        )
         
         return Response({
-            'totalBookings': total_bookings,
-            'totalUsers': total_users,
-            'totalRooms': total_rooms,
-            'totalDesks': total_desks,
-            'recentBookings': recent_bookings,
-            'upcomingBookings': upcoming_bookings,
+            'totalBookings': totals['total'] or 0,
+            'totalUsers': User.objects.count(),
+            'totalRooms': Room.objects.count(),
+            'totalDesks': Desk.objects.filter(is_active=True).count(),
+            'recentBookings': totals['recent'] or 0,
+            'upcomingBookings': totals['upcoming'] or 0,
         })
+
+    @action(detail=False, methods=['get'], url_path='utilization')
+    @cache_analytics('utilization')
+    def utilization(self, request):
+        """
+        Desk utilization (booked slots / active desks x working days x slots)
+        per room, weekday, period and desk, plus a desk x date heatmap
+        GET /api/analytics/utilization/?start_date=2025-01-01&end_date=2025-12-31
+        Optional params: rooms (comma separated ids), weekdays (0=Monday, default 0,1,2,3,4)
+        """
+        try:
+            end_date = datetime.strptime(request.query_params.get('end_date', date.today().isoformat()), '%Y-%m-%d').date()
+            start_date = datetime.strptime(
+                request.query_params.get('start_date', (end_date - timedelta(days=29)).isoformat()), '%Y-%m-%d'
+            ).date()
+            room_ids = None
+            if request.query_params.get('rooms'):
+                room_ids = [int(room_id) for room_id in request.query_params['rooms'].split(',')]
+            weekdays = [int(day) for day in request.query_params.get('weekdays', '0,1,2,3,4').split(',')]
+        except ValueError:
+            return Response(
+                {'error': 'Dates must be YYYY-MM-DD; rooms and weekdays must be comma separated integers.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if start_date > end_date:
+            return Response(
+                {'error': 'start_date cannot be after end_date.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not weekdays or any(day not in range(7) for day in weekdays):
+            return Response(
+                {'error': 'weekdays must be between 0 (Monday) and 6 (Sunday).'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            report = booking_utilization(start_date, end_date, room_ids, weekdays)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'startDate': start_date.isoformat(), 'endDate': end_date.isoformat(), **report})
+
+    @action(detail=False, methods=['post'], url_path='jobs')
+    def jobs(self, request):
+        """
+        Compute the analytics overview in the background
+        POST /api/analytics/jobs/ with the params of GET /api/analytics/
+        Returns the job (202 while it is queued or running); poll
+        /api/analytics/jobs/{id}/ until status is done and read `result`.
+        An identical job that is pending or finished recently is returned
+        instead of queueing a new one.
+        """
+        try:
+            params = overview_params(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        job, created = enqueue_analytics_job(request.user, 'overview', params)
+        return Response(
+            AnalyticsJobSerializer(job).data,
+            status=status.HTTP_200_OK if job.status == 'done' else status.HTTP_202_ACCEPTED,
+        )
+
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})')
+    def job(self, request, job_id=None):
+        """
+        Status, progress (0-100) and, once done, result of an analytics job
+        GET /api/analytics/jobs/{id}/
+        """
+        job = get_object_or_404(AnalyticsJob.objects.select_related('created_by'), pk=job_id)
+        return Response(AnalyticsJobSerializer(job).data)
+
+    @action(detail=False, methods=['get'], url_path='cache-metrics',
+            permission_classes=[IsAuthenticated, IsAdminUser])
+    def cache_metrics(self, request):
+        """
+        Analytics response cache hit/miss counters per endpoint (admin only)
+        GET /api/analytics/cache-metrics/
+        """
+        return Response(analytics_cache_metrics())
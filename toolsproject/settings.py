@@ -20,6 +20,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Media files (uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# nginx location serving MEDIA_ROOT internally; Django checks permissions and
+# hands files over to it with X-Accel-Redirect (see nginx/nginx.conf)
+MEDIA_ACCEL_REDIRECT = '/protected-media/'
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
@@ -137,6 +140,11 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Analytics read from the incrementally maintained rollup tables ('rollups')
+# or from PostgreSQL materialized views ('views'), which need
+# `python manage.py analytics_views refresh --every 300` running
+ANALYTICS_SOURCE = os.environ.get('ANALYTICS_SOURCE', 'rollups')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
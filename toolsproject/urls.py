@@ -1,13 +1,12 @@
 from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from parcark.views import media_file
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", media_file, name='media'),
     path('', include('parcark.urls')),
     path('api/', include('parcark.urls')),
-]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+]
\ No newline at end of file